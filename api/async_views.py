@@ -0,0 +1,175 @@
+"""
+Native async versions of the read-heavy API views.
+
+Routed in place of the sync views when ASYNC_VIEWS is set (GUFF_ASYNC_VIEWS=1, opt-in for
+ASGI deployments), so the reads are served on the event loop instead of hopping to a thread
+per request. They use the async ORM and share the serializers, plan cache, pagination and
+conditional GET helpers with api/views.py. Anything but GET on the same route falls through
+to the sync view, which keeps the writes in one place.
+
+read_view applies the sync view's DRF policies: the session user is read with request.auser(),
+credentials in an Authorization header (BasicAuthentication and the like) are handed to the
+sync view for DRF to authenticate, and the view's throttle_classes run before the handler.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import Throttled
+
+from guff.middleware import aget_profile
+from guff.models import UserProfile, UserSubscription
+from .serializers import ProfileSerializer
+from .subscription_serializers import UserSubSerializer
+from . import plan_cache
+from . import views
+from .conditional import aconditional_response, make_etag, stamp_seconds
+from .pagination import InvalidPage, apaginate_queryset, paginate_list
+
+
+async def _throttled(request, throttle_classes):
+    """
+    Returns DRF's 429 response if one of throttle_classes refuses request, None otherwise
+    """
+    waits = []
+    for throttle in (cls() for cls in throttle_classes):
+        if not await sync_to_async(throttle.allow_request)(request, None):
+            waits.append(throttle.wait())
+    if not waits:
+        return None
+    exc = Throttled(max((w for w in waits if w is not None), default=None))
+    response = JsonResponse({"detail": str(exc.detail)}, status=exc.status_code)
+    if exc.wait is not None:
+        response["Retry-After"] = "%d" % exc.wait
+    return response
+
+
+def read_view(sync_view):
+    """
+    Turns an async GET handler into a view with sync_view's (an @api_view) authentication and
+    throttles: other methods go to sync_view, anonymous requests get the same 403 as DRF's
+    IsAuthenticated and Http404 the same json 404
+    """
+    policies = sync_view.cls
+    header_auth = any(not issubclass(cls, SessionAuthentication) for cls in policies.authentication_classes)
+
+    def decorator(handler):
+        @csrf_exempt
+        @functools.wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            user = await request.auser()
+            if not user.is_authenticated:
+                if header_auth and "HTTP_AUTHORIZATION" in request.META:
+                    return await sync_to_async(sync_view)(request, *args, **kwargs)
+                return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+            if policies.throttle_classes:
+                request.user = user
+                throttled = await _throttled(request, policies.throttle_classes)
+                if throttled is not None:
+                    return throttled
+            try:
+                return await handler(request, *args, **kwargs)
+            except Http404:
+                return JsonResponse({"detail": "Not found."}, status=404)
+        return view
+    return decorator
+
+
+@read_view(views.userprofile)
+async def userprofile(request):
+    """
+    Checks if user is authenticated and returns the username
+    """
+    user = await request.auser()
+
+    async def build():
+        return JsonResponse(ProfileSerializer(await aget_profile(request)).data, status=200)
+
+    return await aconditional_response(request, build, make_etag("me", user.pk, user.username))
+
+
+@read_view(views.getuser)
+async def getuser(request, username):
+    """
+    Gets username of requested user
+
+    :param username: username of the user passed in URL
+    """
+    user = await UserProfile.objects.select_related('user').filter(user__username=username).afirst()
+    if user is None:
+        raise Http404
+
+    async def build():
+        return JsonResponse(ProfileSerializer(user).data, status=200)
+
+    return await aconditional_response(request, build, make_etag("user", user.pk, user.user.username))
+
+
+@gzip_page
+@read_view(views.getplans)
+async def getplans(request, username):
+    """
+    Returns plans created by creator, a page at a time ordered by id
+
+    :param username: creator's username passed in URL
+    """
+    stamp = await plan_cache.aversion(plan_cache.creator_key(username))
+
+    async def build():
+        cached = await plan_cache.aget_creator_plans(username)
+        if cached is None:
+            raise Http404
+        if not cached["is_creator"]:
+            return JsonResponse({"error": "user is not a creator"}, status=403)
+        try:
+            plans, next_cursor = paginate_list(request, cached["plans"], key=lambda plan: plan["id"])
+        except InvalidPage as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        return JsonResponse({"plans": plans, "next": next_cursor}, status=200)
+
+    return await aconditional_response(
+        request, build,
+        make_etag("plans", username, stamp, request.GET.get('limit'), request.GET.get('cursor')),
+        stamp_seconds(stamp),
+    )
+
+
+@read_view(views.plan_details)
+async def plan_details(request, plan_id):
+    """
+    returns details of specified plan, PATCH goes to the sync view
+    """
+    if not str(plan_id).isdigit():
+        raise Http404
+    stamp = await plan_cache.aversion(plan_cache.plan_key(plan_id))
+
+    async def build():
+        data = await plan_cache.aget_plan(plan_id)
+        if data is None:
+            raise Http404
+        return JsonResponse(data, status=200)
+
+    return await aconditional_response(request, build, make_etag("plan", plan_id, stamp), stamp_seconds(stamp))
+
+
+@gzip_page
+@read_view(views.subscriptions)
+async def subscriptions(request):
+    """
+    returns a page of plans subscribed by the user, newest first, POST goes to the sync view
+    """
+    user = await aget_profile(request)
+    if user.is_creator:
+        return JsonResponse({"error": "trying to access using creator account"}, status=403)
+
+    plans = UserSubscription.objects.filter(buyer=user).select_related('buyer__user', 'plan__whatsapp')
+    try:
+        plans, next_cursor = await apaginate_queryset(request, plans, ("-start_date", "-id"))
+    except InvalidPage as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"plans": UserSubSerializer(plans, many=True).data, "next": next_cursor}, status=200)
@@ -0,0 +1,200 @@
+"""
+Several API calls in one round trip: POST /api/batch/
+
+    {"requests": [{"method": "GET", "path": "/api/plans/1/"},
+                  {"method": "DELETE", "path": "/api/integrations/whatsapp/unlink/"}],
+     "parallel": true}
+
+answers {"responses": [{"status": 200, "body": {...}}, ...]} in request order.
+
+Every sub-request is dispatched straight to the view its path resolves to, skipping the
+middleware stack: it shares the outer request's session, user and lazily resolved profile,
+and the outer POST already passed DRF's authentication and csrf check. With "parallel",
+runs of consecutive GETs go to a small thread pool, anything else runs on its own in order
+so a write is always seen by the reads after it.
+"""
+import contextvars
+import copy
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.db import close_old_connections
+from django.http import Http404, QueryDict
+from django.urls import Resolver404, resolve
+
+from guff.db import is_pinned, pin_primary
+
+API_PREFIX = "/api/"
+METHODS = ("GET", "POST", "PATCH", "DELETE")
+
+# headers of the outer request that don't apply to the sub-requests: bodies are json, responses
+# are collected uncompressed and always in full
+STRIPPED_META = (
+    "CONTENT_TYPE", "CONTENT_LENGTH", "HTTP_ACCEPT_ENCODING",
+    "HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE", "HTTP_IF_MATCH", "HTTP_IF_UNMODIFIED_SINCE",
+)
+# cached per request by django, recomputed for each sub-request
+CACHED_ATTRS = ("GET", "_post", "_files", "_body", "_stream", "headers", "content_type", "content_params")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def parse(data):
+    """
+    Validates the batch payload, returns [(method, path, body)]
+    """
+    items = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise InvalidBatch("requests must be a non-empty list")
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise InvalidBatch(f"at most {settings.BATCH_MAX_REQUESTS} requests per batch")
+
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise InvalidBatch("every request must be an object")
+        method = str(item.get("method", "GET")).upper()
+        path = item.get("path")
+        if method not in METHODS:
+            raise InvalidBatch(f"method must be one of {', '.join(METHODS)}")
+        if not isinstance(path, str) or not path.startswith(API_PREFIX):
+            raise InvalidBatch(f"path must start with {API_PREFIX}")
+        parsed.append((method, path, item.get("body")))
+    return parsed
+
+
+def sub_request(request, method, path, body):
+    """
+    Returns a copy of request for another API call, sharing its session, user and profile
+    """
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+
+    sub = copy.copy(request)
+    for attr in CACHED_ATTRS:
+        sub.__dict__.pop(attr, None)
+    sub.META = {k: v for k, v in request.META.items() if k not in STRIPPED_META}
+    sub.META.update(
+        REQUEST_METHOD=method, PATH_INFO=path, QUERY_STRING=query,
+        CONTENT_TYPE="application/json", CONTENT_LENGTH=str(len(payload)),
+    )
+    sub.method = method
+    sub.path = sub.path_info = path
+    sub.GET = QueryDict(query)
+    sub._stream = BytesIO(payload)
+    sub._read_started = False
+    # the batch itself passed the csrf check
+    sub._dont_enforce_csrf_checks = True
+    # async views ask for the user with auser(), which would authenticate it again
+    user = request.user
+
+    async def auser():
+        return user
+
+    sub.auser = auser
+    return sub
+
+
+def result(response):
+    if response.streaming:
+        response.close()
+        return {"status": 400, "body": {"error": "streaming responses can't be batched"}}
+    body = None
+    if response.content:
+        if response.get("Content-Type", "").startswith("application/json"):
+            body = json.loads(response.content)
+        else:
+            body = response.content.decode(response.charset)
+    return {"status": response.status_code, "body": body}
+
+
+def call(request, method, path, body):
+    """
+    Runs one sub-request through the view its path resolves to, returns {"status", "body"}
+    """
+    try:
+        match = resolve(path.partition("?")[0])
+    except Resolver404:
+        return {"status": 404, "body": {"detail": "Not found."}}
+    if getattr(match.func, "batch_view", False):
+        return {"status": 400, "body": {"error": "batches can't be nested"}}
+
+    sub = sub_request(request, method, path, body)
+    sub.resolver_match = match
+    try:
+        if iscoroutinefunction(match.func):
+            response = async_to_sync(match.func)(sub, *match.args, **match.kwargs)
+        else:
+            response = match.func(sub, *match.args, **match.kwargs)
+        if callable(getattr(response, "render", None)):
+            response = response.render()
+    except Exception as exc:
+        # same 404/403/400/500 handling and logging as a request of its own
+        response = response_for_exception(sub, exc)
+    return result(response)
+
+
+def _call_in_thread(args):
+    close_old_connections()
+    try:
+        return call(*args)
+    finally:
+        close_old_connections()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BATCH_CONCURRENCY, thread_name_prefix="batch")
+    return _executor
+
+
+def run(request, items, parallel=False):
+    """
+    Runs parsed items against request, returns their results in order
+
+    :param request: the outer django HttpRequest
+    :param parallel: run consecutive GETs concurrently
+    """
+    if parallel and request.user.is_authenticated:
+        # the lazy profile is shared by the sub-requests, resolve it before several threads race for it
+        try:
+            request.profile.pk
+        except Http404:
+            pass
+
+    results, reads = [], []
+
+    def flush_reads():
+        if len(reads) > 1:
+            # each read runs in a copy of this context, so it sees the request's replica pin and
+            # a write in one pins the rest of the batch without leaking into the pool thread
+            contexts = [contextvars.copy_context() for _ in reads]
+            results.extend(_pool().map(
+                lambda context, item: context.run(_call_in_thread, (request, *item)), contexts, reads,
+            ))
+            if any(context.run(is_pinned) for context in contexts):
+                pin_primary()
+        else:
+            results.extend(call(request, *item) for item in reads)
+        reads.clear()
+
+    for item in items:
+        if parallel and item[0] == "GET":
+            reads.append(item)
+            continue
+        flush_reads()
+        results.append(call(request, *item))
+    flush_reads()
+    return results
@@ -0,0 +1,54 @@
+"""
+Conditional GET for API reads.
+
+Views pass validators they can get without serializing anything (plan cache
+version stamps, ids) and a callable that builds the response. A client that
+already holds the current representation gets a bodyless 304 and the callable
+never runs. Validated responses are "private, no-cache" so browsers keep them
+but always revalidate.
+"""
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5("|".join(str(p) for p in parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def stamp_seconds(stamp):
+    """
+    Converts a plan cache version stamp (time_ns) to a Last-Modified timestamp
+    """
+    return stamp // 10**9
+
+
+def _validated(response, etag, last_modified):
+    if isinstance(response, HttpResponseNotModified) or 200 <= response.status_code < 300:
+        response.headers["ETag"] = etag
+        if last_modified is not None:
+            response.headers["Last-Modified"] = http_date(last_modified)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def conditional_response(request, build, etag, last_modified=None):
+    """
+    Returns 304 if the client's copy matches etag/last_modified, otherwise build() with validators set
+
+    :param build: returns the full response, only called on a miss
+    :param etag: quoted etag, see make_etag()
+    :param last_modified: unix timestamp of the last change or None
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return _validated(response if response is not None else build(), etag, last_modified)
+
+
+async def aconditional_response(request, build, etag, last_modified=None):
+    """
+    conditional_response() for async views, build is a coroutine function
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return _validated(response if response is not None else await build(), etag, last_modified)
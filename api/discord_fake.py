@@ -0,0 +1,178 @@
+"""
+Local fake of the Discord REST endpoints used by api.discord_sync, for tests and benchmarks.
+
+Serves member listing and member role PUT/DELETE for in-memory guilds, with per-guild
+fixed-window rate-limit buckets that answer with the same headers and 429 body as Discord.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MEMBERS_RE = re.compile(r"^/guilds/(\d+)/members$")
+ROLE_RE = re.compile(r"^/guilds/(\d+)/members/(\d+)/roles/(\d+)$")
+
+
+class _Window:
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.started = time.monotonic()
+        self.used = 0
+
+    def take(self):
+        """
+        Returns (allowed, remaining, reset_after)
+        """
+        now = time.monotonic()
+        if now - self.started >= self.period:
+            self.started, self.used = now, 0
+        reset_after = self.period - (now - self.started)
+        if self.used >= self.limit:
+            return False, 0, reset_after
+        self.used += 1
+        return True, self.limit - self.used, reset_after
+
+
+class FakeDiscord:
+    """
+    In-memory guild state: guilds[guild_id][user_id] = set(role_ids)
+    """
+
+    def __init__(self, rate_limit=50, rate_period=1.0, latency=0.0):
+        self.guilds = {}
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.stats = {"requests": 0, "rate_limited": 0}
+
+    def add_member(self, guild_id, user_id, *roles):
+        self.guilds.setdefault(str(guild_id), {})[str(user_id)] = set(map(str, roles))
+
+    def role_holders(self, guild_id, role_id):
+        return {u for u, roles in self.guilds.get(str(guild_id), {}).items() if str(role_id) in roles}
+
+    def take(self, bucket):
+        with self.lock:
+            self.stats["requests"] += 1
+            window = self.windows.get(bucket)
+            if window is None:
+                window = self.windows[bucket] = _Window(self.rate_limit, self.rate_period)
+            allowed, remaining, reset_after = window.take()
+            if not allowed:
+                self.stats["rate_limited"] += 1
+            return allowed, remaining, reset_after
+
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body, headers=()):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def limited(self, bucket):
+            allowed, remaining, reset_after = fake.take(bucket)
+            headers = [
+                ("X-RateLimit-Bucket", bucket.split(":")[0]),
+                ("X-RateLimit-Limit", str(fake.rate_limit)),
+                ("X-RateLimit-Remaining", str(remaining)),
+                ("X-RateLimit-Reset-After", f"{reset_after:.3f}"),
+            ]
+            if not allowed:
+                self.send_json(429, {
+                    "message": "You are being rate limited.",
+                    "retry_after": round(reset_after, 3),
+                    "global": False,
+                }, headers + [("Retry-After", f"{reset_after:.3f}")])
+                return None
+            if fake.latency:
+                time.sleep(fake.latency)
+            return headers
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            match = MEMBERS_RE.match(path)
+            if not match:
+                return self.send_json(404, {"message": "404: Not Found", "code": 0})
+            guild_id = match.group(1)
+            headers = self.limited(f"members:{guild_id}")
+            if headers is None:
+                return
+            params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+            limit = min(int(params.get("limit", 1)), 1000)
+            after = int(params.get("after", 0))
+            with fake.lock:
+                members = fake.guilds.get(guild_id, {})
+                ids = sorted((int(u) for u in members if int(u) > after))[:limit]
+                page = [{"user": {"id": str(u)}, "roles": sorted(members[str(u)])} for u in ids]
+            self.send_json(200, page, headers)
+
+        def set_role(self, present):
+            match = ROLE_RE.match(self.path)
+            if not match:
+                return self.send_json(404, {"message": "404: Not Found", "code": 0})
+            guild_id, user_id, role_id = match.groups()
+            headers = self.limited(f"roles:{guild_id}")
+            if headers is None:
+                return
+            with fake.lock:
+                roles = fake.guilds.get(guild_id, {}).get(user_id)
+                if roles is None:
+                    return self.send_json(404, {"message": "Unknown Member", "code": 10007}, headers)
+                if present:
+                    roles.add(role_id)
+                else:
+                    roles.discard(role_id)
+            self.send_response(204)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_PUT(self):
+            self.set_role(True)
+
+        def do_DELETE(self):
+            self.set_role(False)
+
+    return Handler
+
+
+class FakeDiscordServer:
+    """
+    Runs FakeDiscord on a background thread |
+    usage: with FakeDiscordServer(fake) as base_url: ...
+    """
+
+    def __init__(self, fake, host="127.0.0.1", port=0):
+        self.fake = fake
+        self.server = ThreadingHTTPServer((host, port), _handler(fake))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self.base_url
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
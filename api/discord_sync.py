@@ -0,0 +1,248 @@
+"""
+Reconciles Discord role membership with active subscriptions.
+
+For a plan with a DiscordIntegration the desired members are the discord ids of
+buyers with an active UserSubscription. Actual members are read from the guild
+member list, and only the difference is applied (role PUT/DELETE), concurrently,
+through a client that follows Discord's per-route rate-limit buckets.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from django.conf import settings
+
+from guff.models import UserSubscription
+
+MEMBERS_PAGE = 1000
+PROBE_TIMEOUT = 5.0
+
+
+@dataclass
+class SyncResult:
+    added: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    not_in_guild: int = 0
+    failed: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            "added": self.added,
+            "removed": self.removed,
+            "unchanged": self.unchanged,
+            "not_in_guild": self.not_in_guild,
+            "failed": len(self.failed),
+        }
+
+
+class _Bucket:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # one request at a time until the first response tells us the real limit
+        self.remaining = 1
+        self.reset_at = None
+        self.updated = asyncio.Event()
+
+
+class RateLimiter:
+    """
+    Tracks Discord rate-limit buckets |
+    routes are keyed by method + path template + major parameter (guild id) and mapped
+    to the bucket hash Discord returns in X-RateLimit-Bucket
+    """
+
+    def __init__(self):
+        self.route_buckets = {}
+        self.buckets = {}
+        self.global_reset_at = 0.0
+
+    def _bucket(self, route):
+        key = self.route_buckets.get(route, route)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = _Bucket()
+        return bucket
+
+    async def acquire(self, route):
+        bucket = self._bucket(route)
+        async with bucket.lock:
+            while True:
+                now = time.monotonic()
+                if self.global_reset_at > now:
+                    await asyncio.sleep(self.global_reset_at - now)
+                    continue
+                if bucket.remaining > 0:
+                    bucket.remaining -= 1
+                    return
+                if bucket.reset_at is None:
+                    # limit still unknown, wait for the probe's response (or give up on it)
+                    bucket.updated.clear()
+                    try:
+                        await asyncio.wait_for(bucket.updated.wait(), timeout=PROBE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        bucket.remaining = 1
+                elif bucket.reset_at > now:
+                    await asyncio.sleep(bucket.reset_at - now)
+                else:
+                    # window passed without a response refreshing it, probe again
+                    bucket.remaining = 1
+
+    def update(self, route, response):
+        headers = response.headers
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash:
+            major = route.rsplit(":", 1)[-1]
+            key = f"{bucket_hash}:{major}"
+            if self.route_buckets.get(route) != key:
+                self.route_buckets[route] = key
+                self.buckets.setdefault(key, self.buckets.get(route) or _Bucket())
+        bucket = self._bucket(route)
+
+        if response.status_code == 429:
+            try:
+                body = response.json()
+            except ValueError:
+                # a proxy's (e.g. cloudflare's) html page instead of discord's json
+                body = None
+            if not isinstance(body, dict):
+                body = {}
+            retry_after = float(
+                body.get("retry_after") or headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1
+            )
+            reset_at = time.monotonic() + retry_after
+            if body.get("global") or headers.get("X-RateLimit-Global"):
+                self.global_reset_at = reset_at
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = reset_at
+        elif "X-RateLimit-Remaining" in headers:
+            bucket.remaining = int(headers["X-RateLimit-Remaining"])
+            bucket.reset_at = time.monotonic() + float(headers.get("X-RateLimit-Reset-After", 0))
+        else:
+            # route without a limit
+            bucket.remaining = max(bucket.remaining, 1)
+            bucket.reset_at = bucket.reset_at or 0.0
+        bucket.updated.set()
+
+
+class DiscordClient:
+    """
+    Minimal async Discord REST client used by the role reconciliation
+    """
+
+    def __init__(self, token, base_url=None, concurrency=None, timeout=10.0, max_retries=5):
+        self.limiter = RateLimiter()
+        self.max_retries = max_retries
+        self.semaphore = asyncio.Semaphore(concurrency or settings.DISCORD_SYNC_CONCURRENCY)
+        self.http = httpx.AsyncClient(
+            base_url=base_url or settings.DISCORD_API_BASE,
+            headers={"Authorization": f"Bot {token}"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency or settings.DISCORD_SYNC_CONCURRENCY),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+
+    async def request(self, method, path, route, **kwargs):
+        async with self.semaphore:
+            for _ in range(self.max_retries):
+                await self.limiter.acquire(route)
+                response = await self.http.request(method, path, **kwargs)
+                self.limiter.update(route, response)
+                if response.status_code != 429:
+                    return response
+            return response
+
+    async def role_members(self, guild_id, role_id):
+        """
+        Returns (ids of every guild member, ids of members having role_id)
+        """
+        members, with_role = set(), set()
+        after = "0"
+        route = f"GET /guilds/{{guild_id}}/members:{guild_id}"
+        while True:
+            response = await self.request(
+                "GET", f"/guilds/{guild_id}/members", route,
+                params={"limit": MEMBERS_PAGE, "after": after},
+            )
+            response.raise_for_status()
+            page = response.json()
+            for member in page:
+                user_id = member["user"]["id"]
+                members.add(user_id)
+                if role_id in member.get("roles", ()):
+                    with_role.add(user_id)
+            if len(page) < MEMBERS_PAGE:
+                return members, with_role
+            after = max(page, key=lambda m: int(m["user"]["id"]))["user"]["id"]
+
+    async def set_role(self, guild_id, user_id, role_id, present):
+        route = f"PUT|DELETE /guilds/{{guild_id}}/members/{{user_id}}/roles/{{role_id}}:{guild_id}"
+        response = await self.request(
+            "PUT" if present else "DELETE",
+            f"/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+            route,
+        )
+        return response.status_code in (200, 204)
+
+
+async def reconcile(client, guild_id, role_id, desired):
+    """
+    Applies the difference between desired and actual role members
+
+    :param client: DiscordClient
+    :param desired: set of discord user ids that should have the role
+    """
+    members, actual = await client.role_members(guild_id, role_id)
+    to_add = (desired & members) - actual
+    to_remove = actual - desired
+    result = SyncResult(unchanged=len(desired & actual), not_in_guild=len(desired - members))
+
+    async def apply(user_id, present):
+        try:
+            ok = await client.set_role(guild_id, user_id, role_id, present)
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            if present:
+                result.added += 1
+            else:
+                result.removed += 1
+        else:
+            result.failed.append(user_id)
+
+    await asyncio.gather(
+        *(apply(u, True) for u in to_add),
+        *(apply(u, False) for u in to_remove),
+    )
+    return result
+
+
+def desired_members(plan):
+    """
+    Returns discord ids of buyers with an active subscription to plan
+    """
+    return set(
+        UserSubscription.objects
+        .filter(plan=plan, is_active=True)
+        .exclude(buyer__discord_id="0")
+        .values_list('buyer__discord_id', flat=True)
+        .iterator(chunk_size=5000)
+    )
+
+
+async def sync_plan(plan, desired, base_url=None, token=None):
+    """
+    Reconciles role membership of plan's DiscordIntegration with desired
+
+    :param desired: result of desired_members(plan), fetched outside the event loop
+    """
+    integration = plan.discord
+    async with DiscordClient(token or settings.DISCORD_BOT_TOKEN, base_url=base_url) as client:
+        return await reconcile(client, integration.guild_id, integration.role_id, desired)
@@ -0,0 +1,100 @@
+"""
+Local fake of the eSewa transaction status endpoint used by api.esewa_status, for tests and benchmarks.
+
+Answers GET /api/epay/transaction/status/?product_code=&total_amount=&transaction_uuid= with the
+status set for the transaction (NOT_FOUND for unknown ones), with optional latency and a
+503 on every n-th request to exercise retries.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STATUS_PATH = "/api/epay/transaction/status/"
+
+
+class FakeEsewa:
+    """
+    In-memory transaction state: transactions[transaction_uuid] = status
+    """
+
+    def __init__(self, latency=0.0, fail_every=0):
+        self.transactions = {}
+        self.latency = latency
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "failed": 0}
+
+    def set_status(self, transaction_uuid, status):
+        self.transactions[transaction_uuid] = status
+
+    def answer(self, transaction_uuid):
+        """
+        Returns (http status, body)
+        """
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.fail_every and self.stats["requests"] % self.fail_every == 0:
+                self.stats["failed"] += 1
+                return 503, {"code": 0, "error_message": "Service is currently unavailable"}
+        if self.latency:
+            time.sleep(self.latency)
+        return 200, {
+            "transaction_uuid": transaction_uuid,
+            "status": self.transactions.get(transaction_uuid, "NOT_FOUND"),
+            "ref_id": None,
+        }
+
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes, don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            if url.path != STATUS_PATH or "transaction_uuid" not in params:
+                return self.send_json(400, {"code": 0, "error_message": "Invalid request"})
+            self.send_json(*fake.answer(params["transaction_uuid"][0]))
+
+    return Handler
+
+
+class FakeEsewaServer:
+    """
+    Runs FakeEsewa on a background thread |
+    usage: with FakeEsewaServer(fake) as status_url: ...
+    """
+
+    def __init__(self, fake, host="127.0.0.1", port=0):
+        self.fake = fake
+        self.server = ThreadingHTTPServer((host, port), _handler(fake))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def status_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{STATUS_PATH}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self.status_url
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
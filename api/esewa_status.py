@@ -0,0 +1,150 @@
+"""
+Reconciles stale PENDING payments against the eSewa transaction status API.
+
+A payment only leaves PENDING when the buyer's browser reaches esewa_hook, so a
+closed tab leaves a paid payment unactivated. The reconciler walks PENDING rows
+older than a cutoff on the (status, created_at) index, asks eSewa for their status
+concurrently over one pooled keep-alive client, and applies each batch of answers
+in a single transaction.
+"""
+import asyncio
+from datetime import timedelta
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from guff.models import Payment
+from .payments import apply_esewa_result, fail_pending
+
+# eSewa statuses meaning the buyer never paid (or got the money back)
+FAILED_STATUSES = ("CANCELED", "FULL_REFUND")
+# no record on eSewa's side, which is also what a payment still being made looks like: it only
+# fails ESEWA_NOT_FOUND_FAIL_AFTER_HOURS after it was initiated, so a late COMPLETE still applies
+NOT_FOUND = "NOT_FOUND"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class EsewaStatusClient:
+    """
+    Async client for the eSewa transaction status endpoint with bounded parallelism, timeouts and retries
+    """
+
+    def __init__(self, url=None, product_code=None, concurrency=None, timeout=10.0, max_retries=3, backoff=0.2):
+        concurrency = concurrency or settings.ESEWA_RECONCILE_CONCURRENCY
+        self.url = url or settings.ESEWA_STATUS_URL
+        self.product_code = product_code or settings.ESEWA_PRODUCT_CODE
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+
+    async def status(self, transaction_uuid, total_amount):
+        """
+        Returns eSewa status of the transaction ("COMPLETE", "PENDING", "NOT_FOUND", ...) or None if unreachable
+        """
+        params = {
+            "product_code": self.product_code,
+            "total_amount": str(total_amount),
+            "transaction_uuid": transaction_uuid,
+        }
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                try:
+                    response = await self.http.get(self.url, params=params)
+                except httpx.TransportError:
+                    continue
+                if response.status_code in RETRY_STATUSES:
+                    continue
+                if response.status_code != 200:
+                    return None
+                try:
+                    return response.json().get("status")
+                except ValueError:
+                    return None
+        return None
+
+    async def statuses(self, payments):
+        """
+        Returns [(transaction_id, status or None)] for payments as (transaction_id, amount) pairs
+        """
+        answers = await asyncio.gather(*(self.status(tx, amount) for tx, amount in payments))
+        return [(tx, answer) for (tx, _), answer in zip(payments, answers)]
+
+
+def stale_pending(cutoff, after, limit):
+    """
+    Returns up to limit (created_at, id, transaction_id, amount) of PENDING payments created before cutoff |
+    keyset walk on the (status, created_at) index, after is the (created_at, id) of the previous batch
+    """
+    payments = Payment.objects.filter(status='PENDING', created_at__lt=cutoff)
+    if after is not None:
+        payments = payments.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1]))
+    return list(
+        payments.order_by('created_at', 'id')
+        .values_list('created_at', 'id', 'transaction_id', 'amount')[:limit]
+    )
+
+
+def apply_statuses(results, now=None):
+    """
+    Applies a batch of [(transaction_id, status)] in one transaction | returns {outcome: count}
+    """
+    outcomes = {}
+
+    def count(outcome, n=1):
+        if n:
+            outcomes[outcome] = outcomes.get(outcome, 0) + n
+
+    failed, not_found = [], []
+    with transaction.atomic():
+        for transaction_id, status in results:
+            if status == 'COMPLETE':
+                count(apply_esewa_result(transaction_id, status))
+            elif status in FAILED_STATUSES:
+                failed.append(transaction_id)
+            elif status == NOT_FOUND:
+                not_found.append(transaction_id)
+            else:
+                # still PENDING / AMBIENT on eSewa's side, or eSewa unreachable
+                count("unresolved" if status else "unreachable")
+        if failed:
+            count("failed", fail_pending(failed))
+        if not_found:
+            window = timedelta(hours=settings.ESEWA_NOT_FOUND_FAIL_AFTER_HOURS)
+            gone = fail_pending(not_found, created_before=(now or timezone.now()) - window)
+            count("failed", gone)
+            count("unresolved", len(not_found) - gone)
+    return outcomes
+
+
+async def reconcile_pending(client, older_than=None, batch_size=500):
+    """
+    Reconciles PENDING payments older than older_than batch by batch | yields {outcome: count} per batch
+
+    :param client: EsewaStatusClient
+    :param older_than: timedelta, payments younger than this are left to the webhook
+    """
+    cutoff = timezone.now() - (older_than or timedelta(minutes=30))
+    after = None
+    while True:
+        rows = await sync_to_async(stale_pending)(cutoff, after, batch_size)
+        if not rows:
+            return
+        after = rows[-1][:2]
+        results = await client.statuses([(tx, amount) for _, _, tx, amount in rows])
+        yield await sync_to_async(apply_statuses)(results)
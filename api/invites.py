@@ -0,0 +1,112 @@
+"""
+Signed WhatsApp invites: GET /api/integrations/whatsapp/invite/<token>/ redirects to the plan's
+group link without looking up the subscription.
+
+The token is django.core.signing over {"p": plan id, "b": buyer id, "e": expiry}, issued for an
+active subscription (on the success page right after it activates, and in GET /api/subscriptions/).
+It expires at the end of the paid period or WHATSAPP_INVITE_MAX_AGE after issue, whichever
+comes first, so a cancelled subscription's links die out on their own.
+
+Group links come from a small in-process map keyed by plan id. Entries carry the plan's
+plan_cache version stamp, which linkwhatsapp/unlinkwhatsapp bump, so every process drops a
+changed link on its next read; the process that made the change drops it right away.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from guff.models import WhatsAppIntegration
+from . import plan_cache
+
+SALT = "guff.whatsapp-invite"
+
+_links = OrderedDict()
+_lock = threading.Lock()
+
+
+class InvalidInvite(Exception):
+    pass
+
+
+def expiry(end_date, now=None):
+    """
+    Returns the unix time an invite issued now stops working
+
+    :param end_date: last day of the subscription's paid period or None
+    """
+    now = time.time() if now is None else now
+    expires = now + settings.WHATSAPP_INVITE_MAX_AGE
+    if end_date is not None:
+        period_end = datetime.datetime.combine(
+            end_date + datetime.timedelta(days=1), datetime.time(), timezone.get_current_timezone()
+        )
+        expires = min(expires, period_end.timestamp())
+    return int(expires)
+
+
+def issue(subscription, now=None):
+    """
+    Returns a signed invite token for an active subscription
+    """
+    payload = {"p": subscription.plan_id, "b": subscription.buyer_id, "e": expiry(subscription.end_date, now)}
+    return signing.dumps(payload, salt=SALT)
+
+
+def invite_path(subscription):
+    return reverse("whatsapp_invite", args=[issue(subscription)])
+
+
+def read(token, now=None):
+    """
+    Returns the plan id the token grants, raises InvalidInvite if it is forged or expired
+    """
+    try:
+        payload = signing.loads(token, salt=SALT)
+    except signing.BadSignature as exc:
+        raise InvalidInvite("invalid invite") from exc
+    if payload["e"] <= (time.time() if now is None else now):
+        raise InvalidInvite("invite expired")
+    return payload["p"]
+
+
+def group_link(plan_id):
+    """
+    Returns the plan's WhatsApp group link or None, from the local map when it is current
+    """
+    stamp = plan_cache.version(plan_cache.plan_key(plan_id))
+    with _lock:
+        entry = _links.get(plan_id)
+        if entry is not None and entry[0] == stamp:
+            _links.move_to_end(plan_id)
+            return entry[1]
+
+    link = WhatsAppIntegration.objects.filter(plan_id=plan_id).values_list('group_link', flat=True).first()
+    with _lock:
+        _links[plan_id] = (stamp, link)
+        _links.move_to_end(plan_id)
+        while len(_links) > settings.WHATSAPP_LINKS_LOCAL_SIZE:
+            _links.popitem(last=False)
+    return link
+
+
+def forget_group_link(plan_id):
+    """
+    Drops the plan's link from this process's map once the current transaction commits
+    """
+    def drop():
+        with _lock:
+            _links.pop(int(plan_id), None)
+
+    transaction.on_commit(drop)
+
+
+def clear_local():
+    with _lock:
+        _links.clear()
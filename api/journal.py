@@ -0,0 +1,241 @@
+"""
+Append-only on-disk journal used to ingest webhooks without touching the database.
+
+Every process appends to its own segment file ("<created_ns>-<pid>.open"), one record
+per line as "<crc32 hex>\\t<json>\\n". Writes go straight to the file descriptor, so
+a crashed process loses nothing that was appended; fsync is batched (every
+`fsync_every` records or `fsync_interval` seconds, whichever comes first), which
+bounds what a power loss can lose. A full segment is fsynced and renamed to
+"<created_ns>-<pid>.log" (sealed) before the next one is opened.
+
+JournalReader walks segments in name order and remembers how far it got in a
+checkpoint file that is replaced atomically, so a replay worker can stop at any
+point and resume without skipping records.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".log"
+CHECKPOINT = "checkpoint.json"
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b"%08x\t%s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line):
+    crc, _, payload = line.rstrip(b"\n").partition(b"\t")
+    if int(crc, 16) != zlib.crc32(payload):
+        raise ValueError("checksum mismatch")
+    return json.loads(payload)
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    Appends records to segment files owned by the current process
+    """
+
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, fsync_every=32, fsync_interval=0.05):
+        self.directory = str(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._path = None
+        self._size = 0
+        self._pending = 0
+        self._timer = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, record):
+        """
+        Appends record (json serializable) to the current segment
+        """
+        entry = _encode(record)
+        with self._lock:
+            if self._fd is None or self._size + len(entry) > self.segment_bytes:
+                self._roll()
+            os.write(self._fd, entry)
+            self._size += len(entry)
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                self._sync()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        """
+        Flushes and seals the current segment
+        """
+        with self._lock:
+            self._seal()
+
+    def _sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._fd is not None and self._pending:
+            os.fsync(self._fd)
+            self._pending = 0
+
+    def _seal(self):
+        if self._fd is None:
+            return
+        self._sync()
+        os.close(self._fd)
+        os.rename(self._path, self._path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        _fsync_dir(self.directory)
+        self._fd = None
+        self._path = None
+
+    def _roll(self):
+        self._seal()
+        name = f"{time.time_ns():020d}-{os.getpid()}{OPEN_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._size = 0
+        _fsync_dir(self.directory)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JournalReader:
+    """
+    Reads journal records in batches and checkpoints consumed positions
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.checkpoint_path = os.path.join(self.directory, CHECKPOINT)
+        self.offsets = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)["offsets"]
+        except FileNotFoundError:
+            return {}
+
+    def segments(self):
+        names = [
+            n for n in os.listdir(self.directory)
+            if n.endswith(OPEN_SUFFIX) or n.endswith(SEALED_SUFFIX)
+        ]
+        return sorted(names, key=lambda n: n.rsplit(".", 1)[0])
+
+    @staticmethod
+    def _segment_id(name):
+        return name.rsplit(".", 1)[0]
+
+    def read_batch(self, limit):
+        """
+        Returns up to limit records as [(segment_id, end_offset, record)]
+        """
+        batch = []
+        for name in self.segments():
+            if len(batch) >= limit:
+                break
+            segment_id = self._segment_id(name)
+            offset = self.offsets.get(segment_id, 0)
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                f.seek(offset)
+                while len(batch) < limit:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        # end of segment, or a record that is still being written
+                        break
+                    offset += len(line)
+                    try:
+                        record = _decode(line)
+                    except ValueError:
+                        logger.error("skipping corrupt journal record in %s at %d", name, offset - len(line))
+                        record = None
+                    batch.append((segment_id, offset, record))
+        return batch
+
+    def commit(self, batch):
+        """
+        Records batch as consumed and removes segments that are fully consumed and sealed
+        """
+        for segment_id, offset, _ in batch:
+            self.offsets[segment_id] = offset
+        self._remove_consumed()
+        self._write_checkpoint()
+
+    def compact(self):
+        """
+        Removes fully consumed segments whose writers have finished
+        """
+        if self._remove_consumed():
+            self._write_checkpoint()
+
+    def _remove_consumed(self):
+        removed = False
+        for name in self.segments():
+            segment_id = self._segment_id(name)
+            path = os.path.join(self.directory, name)
+            finished = name.endswith(SEALED_SUFFIX) or not _pid_alive(int(segment_id.rsplit("-", 1)[1]))
+            if finished and self.offsets.get(segment_id, 0) >= os.path.getsize(path):
+                os.remove(path)
+                self.offsets.pop(segment_id, None)
+                removed = True
+        return removed
+
+    def _write_checkpoint(self):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"offsets": self.offsets}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+        _fsync_dir(self.directory)
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(directory, **options):
+    """
+    Returns the process-wide journal for directory, sealed at interpreter exit
+    """
+    directory = str(directory)
+    with _journals_lock:
+        journal = _journals.get(directory)
+        if journal is None:
+            journal = _journals[directory] = Journal(directory, **options)
+            atexit.register(journal.close)
+        return journal
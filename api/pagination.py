@@ -0,0 +1,133 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A page is requested with ?limit=<n>&cursor=<token>. The cursor is an opaque token
+holding the ordering values of the last row of the previous page, so the next page
+is a range read on an index instead of an OFFSET scan: deep pages cost the same as
+the first one. Responses carry the token for the following page as "next" (None on
+the last page).
+"""
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, size):
+    """
+    Returns the list of ordering values in token, raises InvalidPage if it is malformed
+
+    :param size: number of ordering fields the cursor must hold
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidPage("invalid cursor") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPage("invalid cursor")
+    return values
+
+
+def page_params(request, default_limit=DEFAULT_LIMIT, max_limit=MAX_LIMIT):
+    """
+    Returns (limit, cursor token or None) from the query string, raises InvalidPage for a bad limit
+    """
+    try:
+        limit = int(request.GET.get('limit', default_limit))
+    except ValueError as exc:
+        raise InvalidPage("limit must be a number") from exc
+    return min(max(limit, 1), max_limit), request.GET.get('cursor') or None
+
+
+def _after(ordering, values):
+    """
+    Builds the filter for rows strictly after values in ordering, e.g. for ("-start_date", "-id"):
+    start_date < d OR (start_date = d AND id < i)
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for prior, value in zip(ordering[:i], values):
+            step &= Q(**{prior.lstrip("-"): value})
+        condition |= step
+    return condition
+
+
+def _page_queryset(request, queryset, ordering, **limits):
+    """
+    Returns (queryset of the page plus one row, limit)
+    """
+    limit, token = page_params(request, **limits)
+    queryset = queryset.order_by(*ordering)
+    if token is not None:
+        try:
+            queryset = queryset.filter(_after(ordering, decode_cursor(token, len(ordering))))
+        except (ValidationError, TypeError, ValueError) as exc:
+            # values of a tampered cursor that don't fit the fields
+            raise InvalidPage("invalid cursor") from exc
+    # one extra row tells whether there is a next page
+    return queryset[:limit + 1], limit
+
+
+def _page(rows, limit, ordering):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, field.lstrip("-")) for field in ordering])
+
+
+def paginate_queryset(request, queryset, ordering, **limits):
+    """
+    Returns (rows of the requested page, next cursor or None) |
+    ordering must be unique (end with the primary key) and backed by an index
+
+    :param ordering: tuple of field names, "-" prefix for descending
+    """
+    queryset, limit = _page_queryset(request, queryset, ordering, **limits)
+    return _page(list(queryset), limit, ordering)
+
+
+async def apaginate_queryset(request, queryset, ordering, **limits):
+    """
+    paginate_queryset() for async views
+    """
+    queryset, limit = _page_queryset(request, queryset, ordering, **limits)
+    return _page([row async for row in queryset], limit, ordering)
+
+
+def paginate_list(request, items, key, **limits):
+    """
+    Same as paginate_queryset() for an already loaded list sorted ascending by key(item)
+
+    :param key: returns the unique, json serializable sort value of an item
+    """
+    limit, token = page_params(request, **limits)
+    if token is not None:
+        after = decode_cursor(token, 1)[0]
+        try:
+            items = [item for item in items if key(item) > after]
+        except TypeError as exc:
+            raise InvalidPage("invalid cursor") from exc
+
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor([key(items[-1])])
@@ -0,0 +1,98 @@
+"""
+Payment confirmation shared by the eSewa webhook and the journal replay worker
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from guff import insights
+from guff.models import UserSubscription, Payment
+
+
+def decode_esewa_data(data):
+    """
+    Decodes eSewa v2 base64 'data' parameter, raises ValueError if it is malformed
+
+    :param data: base64 encoded json sent by eSewa
+    """
+    try:
+        decoded = json.loads(base64.b64decode(data, validate=True).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("malformed eSewa data") from exc
+
+    if not isinstance(decoded, dict):
+        raise ValueError("malformed eSewa data")
+    if not decoded.get('transaction_uuid') or not decoded.get('status'):
+        raise ValueError("transaction_uuid and status are required")
+    return decoded
+
+
+def apply_esewa_result(transaction_uuid, status):
+    """
+    Applies eSewa result to the payment and activates the subscription |
+    returns "applied", "skipped" (payment no longer pending), "ignored" (not complete) or "missing"
+
+    Safe to call any number of times for the same payment: the payment is claimed with a
+    conditional UPDATE so exactly one caller activates the subscription, and a payment that
+    is already confirmed costs one read and no writes.
+    """
+    payment = (
+        Payment.objects.select_related('plan')
+        .only('id', 'status', 'buyer_id', 'amount', 'created_at', 'plan__id', 'plan__creator_id')
+        .filter(transaction_id=transaction_uuid).first()
+    )
+    if payment is None:
+        return "missing"
+    if status != 'COMPLETE':
+        return "ignored"
+    if payment.status != 'PENDING':
+        return "skipped"
+
+    with transaction.atomic():
+        # claim the payment, a concurrent or retried confirmation matches no row here
+        if not Payment.objects.filter(id=payment.id, status='PENDING').update(status='SUCCESS'):
+            return "skipped"
+
+        today = timezone.localdate()
+        # Calculate end_date (e.g., 30 days)
+        end_date = timezone.now() + timedelta(days=30)
+        subscriptions = UserSubscription.objects.filter(buyer_id=payment.buyer_id, plan_id=payment.plan_id)
+
+        # renewal keeps the running period's start_date
+        was_active = bool(subscriptions.filter(is_active=True).update(end_date=end_date))
+        if not was_active and not subscriptions.update(is_active=True, start_date=today, end_date=end_date):
+            try:
+                with transaction.atomic():
+                    UserSubscription.objects.create(
+                        buyer_id=payment.buyer_id, plan_id=payment.plan_id,
+                        is_active=True, start_date=today, end_date=end_date,
+                    )
+            except IntegrityError:
+                # subscribed (inactive) concurrently, its row exists now
+                subscriptions.update(is_active=True, start_date=today, end_date=end_date)
+
+        insights.subscription_activated(
+            plan_id=payment.plan_id,
+            creator_id=payment.plan.creator_id,
+            start_date=today,
+            amount=payment.amount,
+            paid_on=timezone.localdate(payment.created_at),
+            was_active=was_active,
+        )
+    return "applied"
+
+
+def fail_pending(transaction_ids, created_before=None):
+    """
+    Marks still PENDING payments of transaction_ids as FAILED | returns number of rows changed
+
+    :param created_before: only payments initiated before this datetime
+    """
+    payments = Payment.objects.filter(transaction_id__in=transaction_ids, status='PENDING')
+    if created_before is not None:
+        payments = payments.filter(created_at__lt=created_before)
+    return payments.update(status='FAILED')
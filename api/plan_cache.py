@@ -0,0 +1,246 @@
+"""
+Read-through cache for plan reads.
+
+Two tiers: a small in-process LRU sits in front of django's cache framework.
+Entries are keyed by plan id ("id:<plan_id>") and by creator username
+("creator:<username>"), and every entry carries the version stamp it was
+built from. Writes bump the version stamp in the shared cache, so a stale copy
+in any process is dropped on its next read instead of waiting for a timeout.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from guff.models import UserProfile, SubscriptionPlan
+from .subscription_serializers import PlanSerializer
+
+VERSION_PREFIX = "plancache:v:"
+DATA_PREFIX = "plancache:d:"
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _local_size():
+    return getattr(settings, 'PLAN_CACHE_LOCAL_SIZE', 1024)
+
+
+def _timeout():
+    return getattr(settings, 'PLAN_CACHE_TIMEOUT', 60 * 15)
+
+
+def _version_timeout():
+    # outlives every data entry built from the stamp, and lets the stamps of plans nobody reads
+    # expire instead of filling the cache | a new stamp just means one more miss
+    return 2 * _timeout()
+
+
+def plan_key(plan_id):
+    return f"id:{plan_id}"
+
+
+def creator_key(username):
+    return f"creator:{username}"
+
+
+def version(key):
+    """
+    Returns the current version stamp of key, creating one if the shared cache lost it
+    """
+    vkey = VERSION_PREFIX + key
+    stamp = cache.get(vkey)
+    if stamp is None:
+        cache.add(vkey, time.time_ns(), _version_timeout())
+        stamp = cache.get(vkey)
+    return stamp
+
+
+async def aversion(key):
+    """
+    version() for async views
+    """
+    vkey = VERSION_PREFIX + key
+    stamp = await cache.aget(vkey)
+    if stamp is None:
+        await cache.aadd(vkey, time.time_ns(), _version_timeout())
+        stamp = await cache.aget(vkey)
+    return stamp
+
+
+def _lookup(key):
+    """
+    Returns (stamp, cached data or None)
+    """
+    stamp = version(key)
+
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None and entry[0] == stamp:
+            _local.move_to_end(key)
+            return stamp, entry[1]
+
+    data = cache.get(f"{DATA_PREFIX}{key}:{stamp}")
+    if data is not None:
+        _store_local(key, stamp, data)
+    return stamp, data
+
+
+async def _alookup(key):
+    stamp = await aversion(key)
+
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None and entry[0] == stamp:
+            _local.move_to_end(key)
+            return stamp, entry[1]
+
+    data = await cache.aget(f"{DATA_PREFIX}{key}:{stamp}")
+    if data is not None:
+        _store_local(key, stamp, data)
+    return stamp, data
+
+
+def _store_local(key, stamp, data):
+    with _lock:
+        _local[key] = (stamp, data)
+        _local.move_to_end(key)
+        while len(_local) > _local_size():
+            _local.popitem(last=False)
+
+
+def _read_through(key, loader):
+    stamp, data = _lookup(key)
+    if data is None:
+        data = loader()
+        if data is None:
+            return None
+        cache.set(f"{DATA_PREFIX}{key}:{stamp}", data, _timeout())
+        _store_local(key, stamp, data)
+    return data
+
+
+async def _aread_through(key, loader):
+    stamp, data = await _alookup(key)
+    if data is None:
+        data = await loader()
+        if data is None:
+            return None
+        await cache.aset(f"{DATA_PREFIX}{key}:{stamp}", data, _timeout())
+        _store_local(key, stamp, data)
+    return data
+
+
+def _plan_queryset():
+    # discord/whatsapp are joined so the serializer's hasattr() checks never query
+    return SubscriptionPlan.objects.select_related('creator__user', 'discord', 'whatsapp')
+
+
+def _load_plan(plan_id):
+    plan = _plan_queryset().filter(id=plan_id).first()
+    if plan is None:
+        return None
+    return dict(PlanSerializer(plan).data)
+
+
+def _load_creator_plans(username):
+    creator = UserProfile.objects.filter(user__username=username).only('id', 'is_creator').first()
+    if creator is None:
+        return None
+    if not creator.is_creator:
+        return {"is_creator": False, "plans": []}
+    plans = _plan_queryset().filter(creator=creator).order_by('id')
+    return {
+        "is_creator": True,
+        "plans": [dict(p) for p in PlanSerializer(plans, many=True).data],
+    }
+
+
+async def _aload_plan(plan_id):
+    plan = await _plan_queryset().filter(id=plan_id).afirst()
+    if plan is None:
+        return None
+    return dict(PlanSerializer(plan).data)
+
+
+async def _aload_creator_plans(username):
+    creator = await UserProfile.objects.filter(user__username=username).only('id', 'is_creator').afirst()
+    if creator is None:
+        return None
+    if not creator.is_creator:
+        return {"is_creator": False, "plans": []}
+    plans = [plan async for plan in _plan_queryset().filter(creator=creator).order_by('id')]
+    return {
+        "is_creator": True,
+        "plans": [dict(p) for p in PlanSerializer(plans, many=True).data],
+    }
+
+
+def get_plan(plan_id):
+    """
+    Returns serialized plan or None if it doesn't exist
+
+    :param plan_id: id of the plan, as passed in URL
+    """
+    plan_id = str(plan_id)
+    if not plan_id.isdigit():
+        return None
+    return _read_through(plan_key(plan_id), lambda: _load_plan(plan_id))
+
+
+def get_creator_plans(username):
+    """
+    Returns {"is_creator": bool, "plans": [...]} for creator or None if user doesn't exist
+
+    :param username: creator's username
+    """
+    return _read_through(creator_key(username), lambda: _load_creator_plans(username))
+
+
+async def aget_plan(plan_id):
+    """
+    get_plan() for async views
+    """
+    plan_id = str(plan_id)
+    if not plan_id.isdigit():
+        return None
+    return await _aread_through(plan_key(plan_id), lambda: _aload_plan(plan_id))
+
+
+async def aget_creator_plans(username):
+    """
+    get_creator_plans() for async views
+    """
+    return await _aread_through(creator_key(username), lambda: _aload_creator_plans(username))
+
+
+def invalidate(*keys):
+    """
+    Bumps version stamp of keys once the current transaction commits
+    """
+    def bump():
+        stamp = time.time_ns()
+        cache.set_many({VERSION_PREFIX + key: stamp for key in keys}, _version_timeout())
+        with _lock:
+            for key in keys:
+                _local.pop(key, None)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_plan(plan_id, username):
+    """
+    Drops cached reads of plan and its creator's plan list
+
+    :param plan_id: id of the changed plan
+    :param username: username of the plan's creator
+    """
+    invalidate(plan_key(plan_id), creator_key(username))
+
+
+def clear_local():
+    with _lock:
+        _local.clear()
@@ -17,4 +17,19 @@ class WhatsAppSerializer(serializers.ModelSerializer):
     plan_id = serializers.CharField(source="plan.id", read_only=True)
     class Meta:
         model = WhatsAppIntegration 
-        fields = ['plan_id', 'group_link']
\ No newline at end of file
+        fields = ['plan_id', 'group_link']
+
+class PlanStatsSerializer(serializers.Serializer):
+    plan_id = serializers.IntegerField()
+    active_subscribers = serializers.IntegerField()
+
+class DailyStatsSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    new_subscribers = serializers.IntegerField()
+    churned_subscribers = serializers.IntegerField()
+
+class InsightsSerializer(serializers.Serializer):
+    active_subscribers = serializers.IntegerField()
+    plans = PlanStatsSerializer(many=True)
+    daily = DailyStatsSerializer(many=True)
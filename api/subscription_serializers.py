@@ -1,11 +1,12 @@
 from rest_framework import serializers
-from guff.models import UserSubscription, SubscriptionPlan, Payment
+from guff.models import UserSubscription, SubscriptionPlan, Payment, ArchivedPayment
 
 class UserSubSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='buyer.user.username', read_only=True)
     plan_name = serializers.CharField(source='plan.name', read_only=True)
     price = serializers.DecimalField(source='plan.price', max_digits=10, decimal_places=2, read_only=True)
     interval = serializers.CharField(source='plan.interval', read_only=True)
+    whatsapp_invite = serializers.SerializerMethodField()
 
     class Meta:
         model = UserSubscription
@@ -16,8 +17,20 @@ class UserSubSerializer(serializers.ModelSerializer):
             'plan_name',
             'price',
             'interval',
+            'whatsapp_invite',
         ]
-        read_only_fields = ['username', 'plan_name', 'price', 'interval']
+        read_only_fields = ['username', 'plan_name', 'price', 'interval', 'whatsapp_invite']
+
+    def get_whatsapp_invite(self, obj):
+        """
+        Signed invite path of an active subscription to a plan with a WhatsApp group (api/invites.py),
+        list queries select_related plan__whatsapp
+        """
+        # api.invites imports plan_cache, which imports this module
+        from . import invites
+        if not obj.is_active or not hasattr(obj.plan, 'whatsapp'):
+            return None
+        return invites.invite_path(obj)
 
     def validate(self, attrs):
         buyer = self.context['buyer']
@@ -79,3 +92,8 @@ class PaymentSerializer(serializers.ModelSerializer):
             'status', 
             'created_at'
         ]
+
+
+class ArchivedPaymentSerializer(PaymentSerializer):
+    class Meta(PaymentSerializer.Meta):
+        model = ArchivedPayment
@@ -0,0 +1,715 @@
+import asyncio
+import base64
+import contextvars
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+import httpx
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path
+from rest_framework.decorators import api_view, throttle_classes
+from rest_framework.throttling import BaseThrottle
+from django.utils import timezone
+
+from guff import async_views as async_pages
+from guff.db import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinMiddleware, is_pinned
+from guff.models import (
+    UserProfile, SubscriptionPlan, UserSubscription, DiscordIntegration, WhatsAppIntegration, Payment, ArchivedPayment
+)
+from guff.querybudget import QueryBudget
+from . import async_views
+from . import batch
+from . import invites
+from . import journal
+from . import plan_cache
+from . import views
+from .discord_fake import FakeDiscord, FakeDiscordServer
+from .esewa_fake import FakeEsewa, FakeEsewaServer
+from .esewa_status import EsewaStatusClient, reconcile_pending
+from .journal import Journal, JournalReader
+from .payments import apply_esewa_result
+from .discord_sync import DiscordClient, RateLimiter, reconcile
+
+# AsyncViewTests: async views under /async/ next to the regular routes
+urlpatterns = [
+    path("async/api/me/", async_views.userprofile),
+    path("async/api/users/<str:username>/", async_views.getuser),
+    path("async/api/creators/<str:username>/plans/", async_views.getplans),
+    path("async/api/plans/<str:plan_id>/", async_views.plan_details),
+    path("async/api/subscriptions/", async_views.subscriptions),
+    path("async/profile/<str:username>/", async_pages.creator_profile),
+    path("async/user/dashboard/", async_pages.user_dashboard),
+    path("async/login/", async_pages.login_view),
+    path("async/signup/", async_pages.signup),
+    path("", include("guffgaff.urls")),
+]
+
+
+class DiscordReconcileTests(SimpleTestCase):
+    def sync(self, fake, desired):
+        async def run():
+            async with DiscordClient("test", base_url=base_url, concurrency=8) as client:
+                return await reconcile(client, "1", "9", desired)
+
+        with FakeDiscordServer(fake) as base_url:
+            return asyncio.run(run())
+
+    def test_applies_only_the_delta_within_rate_limits(self):
+        fake = FakeDiscord(rate_limit=10, rate_period=0.2)
+        for user_id in range(1, 41):
+            fake.add_member("1", user_id, *(["9"] if user_id <= 20 else []))
+        desired = {str(u) for u in range(11, 31)} | {"99"}
+
+        result = self.sync(fake, desired)
+
+        self.assertEqual(fake.role_holders("1", "9"), {str(u) for u in range(11, 31)})
+        self.assertEqual((result.added, result.removed, result.unchanged, result.not_in_guild), (10, 10, 10, 1))
+        self.assertEqual(result.failed, [])
+
+        fake.stats.update(requests=0)
+        result = self.sync(fake, desired)
+        self.assertEqual((result.added, result.removed), (0, 0))
+        self.assertEqual(fake.stats["requests"], 1)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_429_without_a_json_body_falls_back_to_headers(self):
+        limiter = RateLimiter()
+        for headers, wait in [({"Retry-After": "3"}, 3), ({"X-RateLimit-Reset-After": "2.5"}, 2.5), ({}, 1)]:
+            before = time.monotonic()
+            limiter.update("GET:/guilds/1", httpx.Response(429, text="<html>rate limited</html>", headers=headers))
+            bucket = limiter._bucket("GET:/guilds/1")
+            self.assertEqual(bucket.remaining, 0)
+            self.assertAlmostEqual(bucket.reset_at - before, wait, delta=0.5)
+
+        limiter.update("GET:/guilds/1", httpx.Response(429, json={"retry_after": 4, "global": True}))
+        self.assertAlmostEqual(limiter.global_reset_at - time.monotonic(), 4, delta=0.5)
+
+
+class SyncDiscordViewTests(TestCase):
+    def test_syncs_active_subscribers(self):
+        creator = User.objects.create_user("creator", password="pass")
+        profile = UserProfile.objects.create(user=creator, is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=profile, name="club", price=100, interval="M")
+        DiscordIntegration.objects.create(plan=plan, guild_id="1", role_id="9")
+        for i, active in enumerate([True, True, False], start=1):
+            buyer = UserProfile.objects.create(user=User.objects.create(username=f"b{i}"), discord_id=str(i))
+            UserSubscription.objects.create(buyer=buyer, plan=plan, is_active=active)
+
+        fake = FakeDiscord()
+        for user_id in (1, 2, 3):
+            fake.add_member("1", user_id, *(["9"] if user_id == 3 else []))
+
+        self.client.force_login(creator)
+        with FakeDiscordServer(fake) as base_url, override_settings(DISCORD_API_BASE=base_url, DISCORD_BOT_TOKEN="t"):
+            response = self.client.post("/api/integrations/discord/sync/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["added"], 2)
+        self.assertEqual(response.json()["removed"], 1)
+        self.assertEqual(fake.role_holders("1", "9"), {"1", "2"})
+
+
+class SubscriptionPaginationTests(TestCase):
+    def setUp(self):
+        self.buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        today = timezone.localdate()
+        for i in range(7):
+            creator = UserProfile.objects.create(user=User.objects.create(username=f"c{i}"), is_creator=True)
+            plan = SubscriptionPlan.objects.create(creator=creator, name=f"p{i}", price=10, interval="M")
+            # pairs share a start_date so the id tiebreak is exercised
+            UserSubscription.objects.create(buyer=self.buyer, plan=plan, start_date=today - timedelta(days=i // 2))
+        self.client.force_login(self.buyer.user)
+
+    def test_walks_every_page_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            data = self.client.get("/api/subscriptions/", params).json()
+            seen += [sub["id"] for sub in data["plans"]]
+            cursor = data["next"]
+            if cursor is None:
+                break
+
+        expected = UserSubscription.objects.order_by("-start_date", "-id").values_list("id", flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_rejects_bad_cursor(self):
+        for cursor in ("!!", "WyJ4Il0", "WyJ4IiwxXQ"):
+            response = self.client.get("/api/subscriptions/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = User.objects.create(username="creator")
+        profile = UserProfile.objects.create(user=self.creator, is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=profile, name="club", price=100, interval="M")
+        self.client.force_login(self.creator)
+
+    def test_plan_revalidates_until_it_changes(self):
+        url = f"/api/plans/{self.plan.id}/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+        # only the session lookup and the user's auth columns, the plan is never loaded or serialized
+        with QueryBudget(max_queries=2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {"name": "renamed"}, content_type="application/json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "renamed")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_me_etag(self):
+        etag = self.client.get("/api/me/")["ETag"]
+        self.assertEqual(self.client.get("/api/me/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_large_lists_are_gzipped(self):
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        for i in range(5):
+            creator = UserProfile.objects.create(user=User.objects.create(username=f"c{i}"), is_creator=True)
+            plan = SubscriptionPlan.objects.create(creator=creator, name=f"p{i}", price=10, interval="M")
+            UserSubscription.objects.create(buyer=buyer, plan=plan)
+        self.client.force_login(buyer.user)
+
+        response = self.client.get("/api/subscriptions/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertNotIn("Content-Encoding", self.client.get("/api/subscriptions/"))
+
+
+class PlanCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        plan_cache.clear_local()
+
+    def test_version_stamps_outlive_the_data_and_then_expire(self):
+        key = plan_cache.plan_key(1)
+        stamp = plan_cache.version(key)
+        later = time.time() + settings.PLAN_CACHE_TIMEOUT + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(plan_cache.version(key), stamp)
+        with mock.patch("time.time", return_value=later + settings.PLAN_CACHE_TIMEOUT):
+            self.assertNotEqual(plan_cache.version(key), stamp)
+
+    def test_becoming_a_creator_drops_the_cached_403(self):
+        profile = UserProfile.objects.create(user=User.objects.create(username="soon"))
+        self.client.force_login(profile.user)
+        self.assertEqual(self.client.get("/api/creators/soon/plans/").status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.is_creator = True
+            profile.save(update_fields=["is_creator"])
+        self.assertEqual(self.client.get("/api/creators/soon/plans/").status_code, 200)
+
+    def test_renaming_a_creator_drops_both_usernames(self):
+        creator = UserProfile.objects.create(user=User.objects.create(username="old"), is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        self.client.force_login(creator.user)
+        self.assertEqual(self.client.get("/api/creators/old/plans/").status_code, 200)
+        self.assertEqual(self.client.get("/api/creators/new/plans/").status_code, 404)
+        self.assertEqual(plan_cache.get_plan(plan.id)["creator"], "old")
+        with self.captureOnCommitCallbacks(execute=True):
+            creator.user.username = "new"
+            creator.user.save()
+        self.assertEqual(self.client.get("/api/creators/old/plans/").status_code, 404)
+        self.assertEqual(self.client.get("/api/creators/new/plans/").status_code, 200)
+        self.assertEqual(plan_cache.get_plan(plan.id)["creator"], "new")
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=self.creator, name="club", price=100, interval="M")
+        self.buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        UserSubscription.objects.create(buyer=self.buyer, plan=plan, is_active=True)
+        Payment.objects.create(buyer=self.buyer, plan=plan, amount=100, gateway="ES", transaction_id="hot")
+        ArchivedPayment.objects.create(
+            id=10**6, buyer=self.buyer, plan=plan, amount=100, gateway="ES", transaction_id="cold",
+            status="SUCCESS", created_at=timezone.now() - timedelta(days=400),
+        )
+        self.client.force_login(self.creator.user)
+
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_subscribers_csv(self):
+        response = self.client.get("/api/exports/subscribers.csv")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = self.body(response).splitlines()
+        self.assertEqual(lines[0], "id,username,start_date,end_date,is_active")
+        self.assertEqual(len(lines), 2)
+        self.assertIn(",buyer,", lines[1])
+
+    def test_payments_ndjson_include_archive(self):
+        rows = [json.loads(line) for line in self.body(self.client.get("/api/exports/payments.ndjson")).splitlines()]
+        self.assertEqual([row["transaction_id"] for row in rows], ["cold", "hot"])
+        self.assertEqual(rows[0]["amount"], "100.00")
+
+    def test_streams_asynchronously_under_asgi(self):
+        async def download():
+            response = await self.async_client.get("/api/exports/payments.ndjson")
+            return response.is_async, b"".join([chunk async for chunk in response.streaming_content])
+
+        self.async_client.force_login(self.creator.user)
+        is_async, body = async_to_sync(download)()
+        self.assertTrue(is_async)
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row["transaction_id"] for row in rows], ["cold", "hot"])
+        self.assertFalse(self.client.get("/api/exports/payments.ndjson").is_async)
+
+    def test_rejects_subscribers_and_unknown_formats(self):
+        self.assertEqual(self.client.get("/api/exports/payments.xml").status_code, 400)
+        self.client.force_login(self.buyer.user)
+        self.assertEqual(self.client.get("/api/exports/payments.csv").status_code, 403)
+
+
+class ReconcilePaymentsTests(TestCase):
+    def setUp(self):
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        self.buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+
+    def pending(self, transaction_id, minutes):
+        payment = Payment.objects.create(
+            buyer=self.buyer, plan=self.plan, amount=100, gateway="ES", transaction_id=transaction_id
+        )
+        Payment.objects.filter(id=payment.id).update(created_at=timezone.now() - timedelta(minutes=minutes))
+
+    def reconcile(self, fake):
+        async def run():
+            async with EsewaStatusClient(url=status_url, product_code="EPAYTEST", concurrency=4, backoff=0) as client:
+                return [outcomes async for outcomes in reconcile_pending(client, timedelta(minutes=30), 2)]
+
+        with FakeEsewaServer(fake) as status_url:
+            return async_to_sync(run)()
+
+    def test_resolves_stale_payments_only(self):
+        fake = FakeEsewa(fail_every=2)
+        for transaction_id, status in [("paid", "COMPLETE"), ("waiting", "PENDING"), ("paying", "NOT_FOUND")]:
+            self.pending(transaction_id, 60)
+            fake.set_status(transaction_id, status)
+        self.pending("fresh", 5)
+        fake.set_status("fresh", "COMPLETE")
+        # eSewa still doesn't know it a day later
+        self.pending("gone", 25 * 60)
+        fake.set_status("gone", "NOT_FOUND")
+
+        batches = self.reconcile(fake)
+
+        self.assertEqual(len(batches), 2)
+        statuses = dict(Payment.objects.values_list('transaction_id', 'status'))
+        self.assertEqual(statuses["waiting"], "PENDING")
+        self.assertEqual(statuses["gone"], "FAILED")
+        self.assertEqual(statuses["paying"], "PENDING")
+        self.assertEqual(statuses["fresh"], "PENDING")
+        self.assertEqual(statuses["paid"], "SUCCESS")
+        self.assertTrue(UserSubscription.objects.get(buyer=self.buyer).is_active)
+        # every other request failed with 503 and was retried
+        self.assertGreater(fake.stats["failed"], 0)
+
+        # the buyer finished paying after the first pass
+        fake.set_status("paying", "COMPLETE")
+        self.reconcile(fake)
+        self.assertEqual(Payment.objects.get(transaction_id="paying").status, "SUCCESS")
+
+
+class ConfirmPaymentTests(TestCase):
+    def setUp(self):
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        self.buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+
+    def pay(self, transaction_id):
+        Payment.objects.create(buyer=self.buyer, plan=self.plan, amount=100, gateway="ES", transaction_id=transaction_id)
+        return apply_esewa_result(transaction_id, "COMPLETE")
+
+    def test_confirms_once_and_retries_write_nothing(self):
+        self.assertEqual(self.pay("t1"), "applied")
+        self.assertEqual(Payment.objects.get(transaction_id="t1").status, "SUCCESS")
+
+        with QueryBudget(max_queries=1):
+            self.assertEqual(apply_esewa_result("t1", "COMPLETE"), "skipped")
+
+    def test_renewal_keeps_start_date(self):
+        self.pay("t1")
+        start = timezone.localdate() - timedelta(days=20)
+        UserSubscription.objects.update(start_date=start)
+
+        self.assertEqual(self.pay("t2"), "applied")
+        subscription = UserSubscription.objects.get()
+        self.assertEqual(subscription.start_date, start)
+        self.assertTrue(subscription.is_active)
+
+    def test_reactivates_inactive_subscription(self):
+        UserSubscription.objects.create(buyer=self.buyer, plan=self.plan, is_active=False)
+        self.assertEqual(self.pay("t1"), "applied")
+        self.assertTrue(UserSubscription.objects.get().is_active)
+
+
+class JournalTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_fsync_every_n_records_or_after_the_interval(self):
+        log = Journal(self.directory, fsync_every=2, fsync_interval=60)
+        with mock.patch.object(journal.os, "fsync", wraps=os.fsync) as fsync:
+            log.append({"n": 1})
+            segment_syncs = lambda: [c for c in fsync.call_args_list if c.args == (log._fd,)]  # noqa: E731
+            self.assertEqual(segment_syncs(), [])
+            log.append({"n": 2})
+            self.assertEqual(len(segment_syncs()), 1)
+        log.close()
+
+        log = Journal(self.directory, fsync_interval=0.01)
+        log.append({"n": 3})
+        deadline = time.monotonic() + 5
+        while log._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(log._pending, 0)
+        log.close()
+        self.assertEqual([n for n in os.listdir(self.directory) if n.endswith(journal.OPEN_SUFFIX)], [])
+
+    def test_reader_stops_at_a_torn_tail_and_resumes_from_the_checkpoint(self):
+        log = Journal(self.directory)
+        for n in range(3):
+            log.append({"n": n})
+        # a crash mid-write leaves part of a line | a bad checksum is returned as None
+        with open(log._path, "ab") as f:
+            f.write(b"00000000\t{\"n\":99}\n")
+            f.write(b"1234abcd\t{\"n\":")
+        os.close(log._fd)
+        log._fd = None
+
+        reader = JournalReader(self.directory)
+        batch = reader.read_batch(10)
+        self.assertEqual([record for _, _, record in batch], [{"n": 0}, {"n": 1}, {"n": 2}, None])
+        reader.commit(batch[:2])
+
+        # records of the process restarted after the crash go to a segment of their own
+        log = Journal(self.directory)
+        log.append({"n": 3})
+        log.close()
+        reader = JournalReader(self.directory)
+        self.assertEqual([record for _, _, record in reader.read_batch(10)], [{"n": 2}, None, {"n": 3}])
+
+
+@override_settings(ESEWA_INGEST_MODE="journal")
+class JournalReplayTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(ESEWA_JOURNAL_DIR=directory))
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        self.buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        Payment.objects.create(buyer=self.buyer, plan=self.plan, amount=100, gateway="ES", transaction_id="t1")
+
+    def webhook(self, transaction_id, status="COMPLETE"):
+        data = base64.b64encode(json.dumps({"transaction_uuid": transaction_id, "status": status}).encode()).decode()
+        return self.client.get("/api/webhook/esewa/", {"data": data})
+
+    def replay(self):
+        out = io.StringIO()
+        call_command("replay_esewa_journal", stdout=out)
+        return out.getvalue()
+
+    def test_crash_and_replay_apply_each_payment_once(self):
+        # eSewa retries the redirect, and the process dies halfway through a third record
+        self.assertEqual(self.webhook("t1").status_code, 302)
+        self.assertEqual(self.webhook("t1").status_code, 302)
+        self.assertFalse(UserSubscription.objects.exists())
+        log = views.esewa_journal()
+        with open(log._path, "ab") as f:
+            f.write(b"1234abcd\t{\"data\":")
+        log.close()
+
+        # the records are applied but the worker dies before the checkpoint is written
+        with mock.patch.object(JournalReader, "commit", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.replay()
+        subscription = UserSubscription.objects.get()
+        self.assertEqual(Payment.objects.get(transaction_id="t1").status, "SUCCESS")
+
+        self.assertIn("{'skipped': 2}", self.replay())
+        self.assertEqual(UserSubscription.objects.get().end_date, subscription.end_date)
+        self.assertIn("done {}", self.replay())
+
+
+class WhatsAppInviteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invites.clear_local()
+        self.creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=self.creator, name="club", price=100, interval="M")
+        WhatsAppIntegration.objects.create(plan=self.plan, group_link="https://chat.whatsapp.com/x")
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        self.subscription = UserSubscription.objects.create(
+            buyer=buyer, plan=self.plan, is_active=True, end_date=timezone.localdate() + timedelta(days=30)
+        )
+
+    def invite(self, token):
+        return self.client.get(f"/api/integrations/whatsapp/invite/{token}/")
+
+    def test_success_page_issues_an_invite_checked_without_queries(self):
+        self.client.force_login(self.subscription.buyer.user)
+        path = self.client.get("/success/").context["whatsapp_invite"]
+        self.client.logout()
+
+        self.assertRedirects(self.client.get(path), "https://chat.whatsapp.com/x", fetch_redirect_response=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(path).status_code, 302)
+
+    def test_subscriptions_list_issues_invites(self):
+        other = SubscriptionPlan.objects.create(
+            creator=UserProfile.objects.create(user=User.objects.create(username="other"), is_creator=True),
+            name="no group", price=50, interval="M",
+        )
+        UserSubscription.objects.create(buyer=self.subscription.buyer, plan=other, is_active=True)
+        self.client.force_login(self.subscription.buyer.user)
+        plans = {plan["plan"]: plan for plan in self.client.get("/api/subscriptions/").json()["plans"]}
+        self.assertIsNone(plans[other.id]["whatsapp_invite"])
+        self.assertRedirects(
+            self.client.get(plans[self.plan.id]["whatsapp_invite"]), "https://chat.whatsapp.com/x",
+            fetch_redirect_response=False,
+        )
+
+    def test_expired_and_forged_tokens(self):
+        token = invites.issue(self.subscription)
+        self.assertEqual(self.invite(token + "x").status_code, 403)
+        self.assertEqual(self.invite(token.replace(":", "", 1)).status_code, 403)
+
+        # the paid period ends before the max age
+        self.subscription.end_date = timezone.localdate()
+        ends = invites.expiry(self.subscription.end_date)
+        self.assertLessEqual(ends - timezone.now().timestamp(), 24 * 3600)
+        with self.assertRaises(invites.InvalidInvite):
+            invites.read(invites.issue(self.subscription), now=ends)
+        self.assertEqual(invites.read(invites.issue(self.subscription), now=ends - 1), self.plan.id)
+
+    def test_unlink_and_relink_invalidate_the_link(self):
+        token = invites.issue(self.subscription)
+        self.assertEqual(self.invite(token).status_code, 302)
+
+        self.client.force_login(self.creator.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete("/api/integrations/whatsapp/unlink/")
+        self.assertEqual(self.invite(token).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/integrations/whatsapp/link/", {
+                "plan_id": self.plan.id, "group_link": "https://chat.whatsapp.com/y",
+            }, content_type="application/json")
+        self.assertRedirects(self.invite(token), "https://chat.whatsapp.com/y", fetch_redirect_response=False)
+
+
+@override_settings(ROOT_URLCONF="api.tests")
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        self.buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        UserSubscription.objects.create(buyer=self.buyer, plan=self.plan, is_active=True)
+
+    def test_same_responses_as_sync_views(self):
+        self.client.force_login(self.buyer.user)
+        for path in [
+            "/api/me/", "/api/users/creator/", "/api/creators/creator/plans/",
+            f"/api/plans/{self.plan.id}/", "/api/subscriptions/?limit=1", "/api/plans/404/",
+        ]:
+            sync_response = self.client.get(path)
+            async_response = self.client.get("/async" + path)
+            self.assertEqual(async_response.status_code, sync_response.status_code, path)
+            self.assertEqual(async_response.json(), sync_response.json(), path)
+            self.assertEqual(async_response.get("ETag"), sync_response.get("ETag"), path)
+
+    def test_same_authentication_and_throttles_as_sync_views(self):
+        self.buyer.user.set_password("secret")
+        self.buyer.user.save()
+        basic = "Basic " + base64.b64encode(b"buyer:secret").decode()
+        for path in ["/api/me/", "/async/api/me/"]:
+            response = self.client.get(path, HTTP_AUTHORIZATION=basic)
+            self.assertEqual((response.status_code, response.json()["username"]), (200, "buyer"), path)
+
+        class Refuse(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 7
+
+        @api_view(['GET'])
+        @throttle_classes([Refuse])
+        def sync_view(request):
+            raise AssertionError("GETs are served by the async handler")
+
+        @async_views.read_view(sync_view)
+        async def handler(request):
+            return JsonResponse({})
+
+        request = RequestFactory().get("/")
+        request.auser = lambda: sync_to_async(lambda: self.buyer.user)()
+        response = async_to_sync(handler)(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(json.loads(response.content), {"detail": "Request was throttled. Expected available in 7 seconds."})
+
+    def test_pages(self):
+        self.client.force_login(self.buyer.user)
+        self.assertContains(self.client.get("/async/user/dashboard/"), "club")
+        self.assertEqual(self.client.get("/async/profile/creator/").status_code, 200)
+        self.assertRedirects(self.client.get("/async/profile/buyer/"), "/user/dashboard/", fetch_redirect_response=False)
+
+    def test_writes_and_anonymous(self):
+        self.assertEqual(self.client.get("/async/api/me/").status_code, 403)
+        self.client.force_login(self.buyer.user)
+        response = self.client.delete(f"/async/api/plans/{self.plan.id}/")
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_login_and_signup_hash_in_the_pool(self):
+        response = self.client.post("/async/signup/", {
+            "username": "newbuyer", "password": "secret", "confirmed_password": "secret", "phone": "9800000000",
+        })
+        self.assertRedirects(response, "/user/dashboard/", fetch_redirect_response=False)
+        user = User.objects.get(username="newbuyer")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(user.check_password("secret"))
+
+        self.client.logout()
+        signup = {"username": "newbuyer", "password": "x", "confirmed_password": "x"}
+        self.assertEqual(self.client.post("/async/signup/", signup).status_code, 400)
+        # the user and its profile are created together
+        with mock.patch.object(UserProfile.objects, "create", side_effect=IntegrityError):
+            self.assertEqual(self.client.post("/async/signup/", {**signup, "username": "other"}).status_code, 400)
+        self.assertFalse(User.objects.filter(username="other").exists())
+
+        self.assertEqual(self.client.post("/async/login/", {"username": "newbuyer", "password": "nope"}).status_code, 401)
+        response = self.client.post("/async/login/", {"username": "newbuyer", "password": "secret"})
+        self.assertRedirects(response, "/user/dashboard/", fetch_redirect_response=False)
+        self.assertEqual(self.client.get("/async/api/me/").status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=["replica0"])
+class BatchRoutingTests(SimpleTestCase):
+    def run_batch(self, paths, pinned=False):
+        """
+        Runs GETs of paths in parallel in a fresh request context, returns (read alias per path,
+        pinned after the batch)
+        """
+        router = PrimaryReplicaRouter()
+
+        def call(request, method, path, body):
+            if path == "/write/":
+                router.db_for_write(User)
+            return router.db_for_read(User)
+
+        outcome = []
+
+        def view(request):
+            request.user = AnonymousUser()
+            with mock.patch.object(batch, "call", call):
+                outcome.append(batch.run(request, [("GET", path, None) for path in paths], parallel=True))
+            outcome.append(is_pinned())
+            return HttpResponse()
+
+        request = RequestFactory().post("/api/batch/")
+        if pinned:
+            request.COOKIES[PIN_COOKIE] = "1"
+        contextvars.copy_context().run(ReplicaPinMiddleware(view), request)
+        return tuple(outcome)
+
+    def test_pool_threads_follow_the_request_pin(self):
+        self.assertEqual(self.run_batch(["/a/", "/b/"], pinned=True), (["default", "default"], True))
+        self.assertEqual(self.run_batch(["/a/", "/b/"]), (["replica0", "replica0"], False))
+        # a write pins the request, not the pool thread it ran in
+        self.assertEqual(self.run_batch(["/write/", "/write/"]), (["default", "default"], True))
+        self.assertEqual(self.run_batch(["/a/", "/b/", "/c/", "/d/"]), (["replica0"] * 4, False))
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=self.creator, name="club", price=100, interval="M")
+        self.client.force_login(self.creator.user)
+
+    def batch(self, client=None, **payload):
+        return (client or self.client).post("/api/batch/", json.dumps(payload), content_type="application/json")
+
+    def test_runs_sub_requests_in_order_with_shared_auth(self):
+        response = self.batch(requests=[
+            {"path": f"/api/plans/{self.plan.id}/"},
+            {"method": "POST", "path": "/api/integrations/whatsapp/link/",
+             "body": {"plan_id": self.plan.id, "group_link": "https://chat.whatsapp.com/x"}},
+            {"path": f"/api/plans/{self.plan.id}/"},
+            {"path": "/api/creators/creator/plans/?limit=1"},
+            {"path": "/api/plans/404/"},
+            {"path": "/api/nope/"},
+            {"method": "POST", "path": "/api/batch/", "body": {"requests": []}},
+            {"path": "/api/exports/subscribers.csv"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["responses"]
+        self.assertEqual([r["status"] for r in results], [200, 201, 200, 200, 404, 404, 400, 400])
+        self.assertTrue(WhatsAppIntegration.objects.filter(plan=self.plan).exists())
+        self.assertEqual([p["id"] for p in results[3]["body"]["plans"]], [self.plan.id])
+
+    def test_rejects_bad_payloads_anonymous_and_missing_csrf(self):
+        self.assertEqual(self.batch(requests=[]).status_code, 400)
+        self.assertEqual(self.batch(requests=[{"path": "/admin/"}]).status_code, 400)
+        self.assertEqual(self.batch(requests=[{"path": "/api/me/"}] * 21).status_code, 400)
+        self.assertEqual(self.batch(Client(), requests=[{"path": "/api/me/"}]).status_code, 403)
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.creator.user)
+        self.assertEqual(self.batch(client, requests=[{"path": "/api/me/"}]).status_code, 403)
+
+
+class ParallelBatchTests(TransactionTestCase):
+    # pool threads use their own connections and only see committed rows, plan cache
+    # invalidations only run on commit too
+    def test_parallel_reads_match_sequential(self):
+        cache.clear()
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        WhatsAppIntegration.objects.create(plan=plan, group_link="https://chat.whatsapp.com/x")
+        self.client.force_login(creator.user)
+        requests = [{"path": "/api/me/"}, {"path": f"/api/plans/{plan.id}/"}, {"path": "/api/users/creator/"},
+                    {"method": "DELETE", "path": "/api/integrations/whatsapp/unlink/"},
+                    {"path": f"/api/plans/{plan.id}/"}]
+
+        results = {}
+        for parallel in (False, True):
+            WhatsAppIntegration.objects.get_or_create(plan=plan, defaults={"group_link": "https://chat.whatsapp.com/x"})
+            cache.clear()
+            response = self.client.post(
+                "/api/batch/", json.dumps({"requests": requests, "parallel": parallel}), content_type="application/json"
+            )
+            results[parallel] = response.json()["responses"]
+        self.assertEqual(results[True], results[False])
+        self.assertEqual([r["status"] for r in results[True]], [200, 200, 200, 200, 200])
+        self.assertTrue(results[True][1]["body"]["whatsapp_state"])
+        self.assertFalse(results[True][4]["body"]["whatsapp_state"])
@@ -1,16 +1,30 @@
+from django.conf import settings
 from django.urls import path
 from . import views 
+from . import async_views
+
+# async versions of the hot reads under ASGI (api/async_views.py)
+reads = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('test/', views.test),
+    path('batch/', views.batch),
+    path('throttles/', views.throttles),
     #auth/user
-    path("me/", views.userprofile),
-    path("users/<str:username>/", views.getuser),
+    path("me/", reads.userprofile),
+    path("users/<str:username>/", reads.getuser),
+    #creator discovery
+    path("search/", views.search),
+    path("search/complete/", views.search_complete),
     #creator plans
-    path("creators/<str:username>/plans/", views.getplans),
+    path("creators/<str:username>/plans/", reads.getplans),
+    path("creators/<str:username>/insights/", views.creator_insights),
+    path("exports/subscribers.<str:fmt>", views.export_subscribers),
+    path("exports/payments.<str:fmt>", views.export_payments),
     path("plans/", views.plans),
-    path("plans/<str:plan_id>/", views.plan_details),
+    path("plans/<str:plan_id>/", reads.plan_details),
     #subscriptions
-    path('subscriptions/', views.subscriptions),
+    path('subscriptions/', reads.subscriptions),
     path('subscriptions/<str:id>/', views.cancel_sub),
     #payment 
     path("payments/initiate/", views.initiate_payment),
@@ -22,7 +36,7 @@ urlpatterns = [
     path("integrations/discord/unlink/", views.unlinkdiscord),
     path("integrations/whatsapp/link/", views.linkwhatsapp),
     path("integrations/whatsapp/unlink/", views.unlinkwhatsapp),
-   # path("integrations/whatsapp/invite/<str:subscription_id>/", views.getinvite),
+    path("integrations/whatsapp/invite/<str:token>/", views.whatsapp_invite, name="whatsapp_invite"),
     #payment webhooks
     path("webhook/esewa/", views.esewa_hook),
   #  path('webhook/khalti/', views.khalti_hook)
@@ -1,19 +1,35 @@
 from rest_framework.response import Response 
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from guff.models import UserProfile, SubscriptionPlan, UserSubscription, Payment
-from django.contrib.auth.models import User
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from guff.models import UserProfile, SubscriptionPlan, UserSubscription, Payment, ArchivedPayment
+from guff import insights
+from guff import search as creator_search
+from guff import throttling
 from django.shortcuts import get_object_or_404, redirect
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404
+from django.db import transaction
 from django.utils import timezone
-from .serializers import ProfileSerializer, DiscordSerializer, WhatsAppSerializer
-from .subscription_serializers import UserSubSerializer, PlanSerializer, PaymentSerializer 
+from django.conf import settings
+from django.views.decorators.gzip import gzip_page
+from asgiref.sync import async_to_sync
+from .serializers import ProfileSerializer, DiscordSerializer, WhatsAppSerializer, InsightsSerializer
+from .subscription_serializers import UserSubSerializer, PlanSerializer, PaymentSerializer, ArchivedPaymentSerializer
+from . import plan_cache
+from . import exports
+from . import batch as batches
+from . import invites
+from .conditional import conditional_response, make_etag, stamp_seconds
+from .pagination import InvalidPage, paginate_queryset, paginate_list
+from .journal import get_journal
+from .payments import decode_esewa_data, apply_esewa_result
+from .discord_sync import desired_members, sync_plan
 
 import hmac
 import hashlib
 import base64
 import uuid
-import json
-from datetime import timedelta
+import httpx
 
 @api_view(['GET'])
 def test(request):
@@ -25,8 +41,12 @@ def userprofile(request):
     """
     Checks if user is authenticated and returns the username
     """
-    user = get_object_or_404(UserProfile, user=request.user)
-    return Response(ProfileSerializer(user).data, status=200)
+    # request.user comes from the auth cache, so a revalidation costs no profile query
+    return conditional_response(
+        request,
+        lambda: Response(ProfileSerializer(request.profile).data, status=200),
+        make_etag("me", request.user.pk, request.user.username),
+    )
         
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -36,23 +56,96 @@ def getuser(request, username):
     
     :param username: username of the user passed in URL
     """
-    user_obj = get_object_or_404(User, username=username)
-    user = get_object_or_404(UserProfile, user=user_obj)
-    return Response(ProfileSerializer(user).data, status=200)
+    user = get_object_or_404(UserProfile.objects.select_related('user'), user__username=username)
+    return conditional_response(
+        request,
+        lambda: Response(ProfileSerializer(user).data, status=200),
+        make_etag("user", user.pk, user.user.username),
+    )
 
+@gzip_page
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def getplans(request, username):
     """
-    Returns plans created by creator
+    Returns plans created by creator, a page at a time ordered by id
 
     :param username: creator's username passed in URL
+    :param limit: page size, passed as query param
+    :param cursor: "next" of the previous page, passed as query param
     """
-    creator = get_object_or_404(UserProfile, user__username=username)
+    stamp = plan_cache.version(plan_cache.creator_key(username))
+
+    def build():
+        cached = plan_cache.get_creator_plans(username)
+        if cached is None:
+            raise Http404
+        if not cached["is_creator"]:
+            return Response({"error": "user is not a creator"}, status=403)
+        try:
+            plans, next_cursor = paginate_list(request, cached["plans"], key=lambda plan: plan["id"])
+        except InvalidPage as exc:
+            return Response({"error": str(exc)}, status=400)
+        return Response({"plans": plans, "next": next_cursor}, status=200)
+
+    return conditional_response(
+        request, build,
+        make_etag("plans", username, stamp, request.GET.get('limit'), request.GET.get('cursor')),
+        stamp_seconds(stamp),
+    )
+
+@gzip_page
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def creator_insights(request, username):
+    """
+    Returns subscriber and revenue rollups of creator, only to the creator
+
+    :param username: creator's username passed in URL
+    :param days: number of days of daily stats, passed as query param (default 30, max 365)
+    """
+    if request.user.username != username:
+        return Response({"error": "not authorized"}, status=403)
+    creator = request.profile
     if not creator.is_creator:
         return Response({"error": "user is not a creator"}, status=403)
-    plans = SubscriptionPlan.objects.filter(creator=creator).select_related('creator__user')
-    return Response({"plans": PlanSerializer(plans, many=True).data}, status=200)
+
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except ValueError:
+        return Response({"error": "days must be a number"}, status=400)
+    return Response(InsightsSerializer(insights.creator_insights(creator, days)).data, status=200)
+
+def _export(request, fmt, kind, fields, rows):
+    creator = request.profile
+    if not creator.is_creator:
+        return Response({"error": "user is not a creator"}, status=403)
+    if fmt not in exports.FORMATS:
+        return Response({"error": f"format must be one of {', '.join(exports.FORMATS)}"}, status=400)
+    return exports.stream(
+        fields, rows(creator), fmt, f"{request.user.username}-{kind}",
+        asynchronous=isinstance(request._request, ASGIRequest),
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_subscribers(request, fmt):
+    """
+    Streams creator's subscribers as csv or ndjson
+
+    :param fmt: "csv" or "ndjson", the extension in URL
+    """
+    return _export(request, fmt, "subscribers", exports.SUBSCRIBER_FIELDS, exports.subscriber_rows)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_payments(request, fmt):
+    """
+    Streams creator's payment history, archived payments included, as csv or ndjson
+
+    :param fmt: "csv" or "ndjson", the extension in URL
+    """
+    return _export(request, fmt, "payments", exports.PAYMENT_FIELDS, exports.payment_rows)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -60,7 +153,7 @@ def plans(request):
     """
     Allows creator to create a new plan if authenticated
     """
-    creator_profile = get_object_or_404(UserProfile, user=request.user)
+    creator_profile = request.profile
 
     if not creator_profile.is_creator:
         return Response({'error': 'user is not a creator'}, status=403)
@@ -68,6 +161,7 @@ def plans(request):
     serializer = PlanSerializer(data=request.data, context={'creator': creator_profile})
     if serializer.is_valid():
         serializer.save(creator=creator_profile)  
+        plan_cache.invalidate_plan(serializer.instance.id, request.user.username)
         return Response(serializer.data, status=201)
     else:
         return Response(serializer.errors, status=400)
@@ -79,34 +173,53 @@ def plan_details(request, plan_id):
     """
     returns details of specified plan or updates it
     """
-    plan = get_object_or_404(SubscriptionPlan, id=plan_id)
-    
     if request.method == 'GET':
-        return Response(PlanSerializer(plan).data, status=200)
+        if not str(plan_id).isdigit():
+            raise Http404
+        stamp = plan_cache.version(plan_cache.plan_key(plan_id))
+
+        def build():
+            data = plan_cache.get_plan(plan_id)
+            if data is None:
+                raise Http404
+            return Response(data, status=200)
+
+        return conditional_response(request, build, make_etag("plan", plan_id, stamp), stamp_seconds(stamp))
     
     if request.method == 'PATCH':
-        if plan.creator.user != request.user:
+        plan = get_object_or_404(
+            SubscriptionPlan.objects.select_related('creator__user', 'discord', 'whatsapp'),
+            id=plan_id
+        )
+        if plan.creator.user_id != request.user.id:
             return Response({"error": "not authorized"}, status=403)
             
         serializer = PlanSerializer(plan, data=request.data, partial=True, context={'creator': plan.creator})
         if serializer.is_valid():
             serializer.save()
+            plan_cache.invalidate_plan(plan.id, request.user.username)
             return Response(serializer.data, status=200)
         return Response(serializer.errors, status=400)
 
+@gzip_page
 @api_view(['POST', 'GET'])
 @permission_classes([IsAuthenticated])
 def subscriptions(request):
     """
-    adds or returns plans subscribed by the user for respective method
+    adds or returns plans subscribed by the user for respective method |
+    GET returns a page at a time, newest subscription first, see api/pagination.py
     """
-    user = get_object_or_404(UserProfile, user=request.user)
+    user = request.profile
     if user.is_creator:
         return Response({"error": "trying to access using creator account"}, status=403)
     
     if request.method == 'GET':
-        plans = UserSubscription.objects.filter(buyer=user).select_related('buyer__user', 'plan')
-        return Response({"plans":UserSubSerializer(plans, many=True).data}, status=200)
+        plans = UserSubscription.objects.filter(buyer=user).select_related('buyer__user', 'plan__whatsapp')
+        try:
+            plans, next_cursor = paginate_queryset(request, plans, ("-start_date", "-id"))
+        except InvalidPage as exc:
+            return Response({"error": str(exc)}, status=400)
+        return Response({"plans":UserSubSerializer(plans, many=True).data, "next": next_cursor}, status=200)
     
     if request.method == "POST":
         serializer = UserSubSerializer(data=request.data, context={"buyer": user})
@@ -123,19 +236,27 @@ def cancel_sub(request, id):
     Disable user subscription
     :param id: id of plan to be disabled, passed in url
     """
-    buyer = get_object_or_404(UserProfile, user=request.user)
+    buyer = request.profile
     subscription = get_object_or_404(UserSubscription, buyer=buyer, id=id)
-    subscription.is_active = False
+    with transaction.atomic():
+        cancelled = UserSubscription.objects.filter(id=subscription.id, is_active=True)
+        rows = insights.deactivation_rows(cancelled)
+        if cancelled.update(is_active=False, end_date=timezone.localdate()):
+            # churn is booked today
+            insights.subscriptions_deactivated(
+                (plan_id, creator_id, timezone.localdate(), n) for plan_id, creator_id, _, n in rows
+            )
     return Response({"status":"ok"}, status=200)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([throttling.PaymentThrottle])
 def initiate_payment(request):
     """
     Initiates payment and returns eSewa form parameters
     """
-    user = get_object_or_404(UserProfile, user=request.user)
+    user = request.profile
     plan_id = request.data.get('plan_id')
     gateway = request.data.get('gateway', 'ES') 
 
@@ -199,46 +320,50 @@ def esewa_hook(request):
     if not data:
         return Response({"error": "No data received"}, status=400)
     
-    # Decode base64 data
-    decoded_data = json.loads(base64.b64decode(data).decode('utf-8'))
-    
-    transaction_uuid = decoded_data.get('transaction_uuid')
+    try:
+        decoded_data = decode_esewa_data(data)
+    except ValueError:
+        return Response({"error": "Malformed data"}, status=400)
+
     status = decoded_data.get('status')
-    
-    payment = get_object_or_404(Payment, transaction_id=transaction_uuid)
-    
+
+    if settings.ESEWA_INGEST_MODE == 'journal':
+        # replayed into Payment/UserSubscription by `manage.py replay_esewa_journal`
+        esewa_journal().append({"data": data, "received_at": timezone.now().isoformat()})
+    elif apply_esewa_result(decoded_data.get('transaction_uuid'), status) == "missing":
+        raise Http404
+
     if status == 'COMPLETE':
-        payment.status = 'COMPLETED'
-        payment.save()
-        
-        # Active subscription
-        plan = payment.plan
-        buyer = payment.buyer
-        
-        # Calculate end_date (e.g., 30 days)
-        end_date = timezone.now() + timedelta(days=30)
-        
-        UserSubscription.objects.update_or_create(
-            buyer=buyer,
-            plan=plan,
-            defaults={'is_active': True, 'end_date': end_date}
-        )
-        
         # Redirect to success page (template view)
         return redirect('success')
         
     return redirect('landing')
 
 
+def esewa_journal():
+    return get_journal(
+        settings.ESEWA_JOURNAL_DIR,
+        segment_bytes=settings.ESEWA_JOURNAL_SEGMENT_BYTES,
+        fsync_every=settings.ESEWA_JOURNAL_FSYNC_EVERY,
+        fsync_interval=settings.ESEWA_JOURNAL_FSYNC_INTERVAL,
+    )
+
+
 @api_view(['GET'])
 def get_payment(request, id):
-    payment = get_object_or_404(Payment, id=id)
-    return Response(PaymentSerializer(payment).data, status=200)
+    """
+    Returns payment, falling back to the archive for payments moved out by guff/archive.py
+    """
+    payment = Payment.objects.filter(id=id).first()
+    if payment is not None:
+        return Response(PaymentSerializer(payment).data, status=200)
+    payment = get_object_or_404(ArchivedPayment, id=id)
+    return Response(ArchivedPaymentSerializer(payment).data, status=200)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def linkdiscord(request):
-    creator = get_object_or_404(UserProfile, user=request.user)
+    creator = request.profile
 
     if not creator.is_creator:
         return Response({"error": "not authorized"}, status=403)
@@ -256,12 +381,32 @@ def linkdiscord(request):
     serializer = DiscordSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     serializer.save(plan=plan)
+    plan_cache.invalidate_plan(plan.id, request.user.username)
 
     return Response(serializer.data, status=201) 
 
 @api_view(['POST'])
+@permission_classes([IsAuthenticated])
 def syncdiscord(request):
-    ...
+    """
+    Gives the linked discord role to active subscribers of creator's plan and removes it from everyone else
+    """
+    creator = request.profile
+    if not creator.is_creator:
+        return Response({"error": "not authorized"}, status=403)
+
+    plan = get_object_or_404(SubscriptionPlan.objects.select_related('discord'), creator=creator)
+    if not hasattr(plan, 'discord'):
+        return Response({"error": "No discord integration found"}, status=404)
+    if not settings.DISCORD_BOT_TOKEN:
+        return Response({"error": "discord bot is not configured"}, status=503)
+
+    desired = desired_members(plan)
+    try:
+        result = async_to_sync(sync_plan)(plan, desired)
+    except httpx.HTTPError:
+        return Response({"error": "discord request failed"}, status=502)
+    return Response(result.as_dict(), status=200)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
@@ -269,13 +414,14 @@ def unlinkdiscord(request):
     """
     Unlinks Discord from a creator's plan
     """
-    creator = get_object_or_404(UserProfile, user=request.user)
+    creator = request.profile
     if not creator.is_creator:
         return Response({"error": "not authorized"}, status=403)
 
-    plan = get_object_or_404(SubscriptionPlan, creator=creator)
+    plan = get_object_or_404(SubscriptionPlan.objects.select_related('discord'), creator=creator)
     if hasattr(plan, 'discord'):
         plan.discord.delete()
+        plan_cache.invalidate_plan(plan.id, request.user.username)
         return Response({"message": "Discord unlinked successfully"}, status=200)
     return Response({"error": "No discord integration found"}, status=404)
 
@@ -285,7 +431,7 @@ def linkwhatsapp(request):
     """
     Links WhatsApp group to a creator's plan
     """
-    creator = get_object_or_404(UserProfile, user=request.user)
+    creator = request.profile
 
     if not creator.is_creator:
         return Response({"error": "not authorized"}, status=403)
@@ -303,6 +449,8 @@ def linkwhatsapp(request):
     serializer = WhatsAppSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     serializer.save(plan=plan)
+    plan_cache.invalidate_plan(plan.id, request.user.username)
+    invites.forget_group_link(plan.id)
 
     return Response(serializer.data, status=201)
 
@@ -312,13 +460,87 @@ def unlinkwhatsapp(request):
     """
     Unlinks WhatsApp from a creator's plan
     """
-    creator = get_object_or_404(UserProfile, user=request.user)
+    creator = request.profile
     if not creator.is_creator:
         return Response({"error": "not authorized"}, status=403)
 
-    plan = get_object_or_404(SubscriptionPlan, creator=creator)
+    plan = get_object_or_404(SubscriptionPlan.objects.select_related('whatsapp'), creator=creator)
     if hasattr(plan, 'whatsapp'):
         plan.whatsapp.delete()
+        plan_cache.invalidate_plan(plan.id, request.user.username)
+        invites.forget_group_link(plan.id)
         return Response({"message": "WhatsApp unlinked successfully"}, status=200)
     return Response({"error": "No whatsapp integration found"}, status=404)
 
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def whatsapp_invite(request, token):
+    """
+    Redirects a signed invite to the plan's WhatsApp group, see api/invites.py | the token is the
+    credential, no session or subscription is looked up
+
+    :param token: invite token passed in URL
+    """
+    try:
+        plan_id = invites.read(token)
+    except invites.InvalidInvite as exc:
+        return Response({"error": str(exc)}, status=403)
+    link = invites.group_link(plan_id)
+    if link is None:
+        return Response({"error": "No whatsapp integration found"}, status=404)
+    return redirect(link)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    """
+    Runs several API requests in one round trip, see api/batch.py
+    """
+    try:
+        items = batches.parse(request.data)
+    except batches.InvalidBatch as exc:
+        return Response({"error": str(exc)}, status=400)
+    results = batches.run(request._request, items, parallel=bool(request.data.get("parallel")))
+    return Response({"responses": results}, status=200)
+
+
+batch.batch_view = True
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search(request):
+    """
+    Creators matching ?q=, best first | the last word is matched as a prefix, so this also
+    serves results as the user types
+    """
+    return _search(request, "results", creator_search.search)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_complete(request):
+    """
+    Creator usernames starting with ?q= for autocomplete
+    """
+    return _search(request, "usernames", creator_search.complete)
+
+
+def _search(request, key, find):
+    try:
+        limit = min(max(int(request.GET.get('limit', settings.SEARCH_DEFAULT_RESULTS)), 1), settings.SEARCH_MAX_RESULTS)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=400)
+    return Response({key: find(request.GET.get('q', ''), limit)}, status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def throttles(request):
+    """
+    Allowed and throttled request counts per scope and limiting dimension
+    """
+    return Response(throttling.counters(), status=200)
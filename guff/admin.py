@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, SubscriptionPlan, UserSubscription, DiscordIntegration, WhatsAppIntegration, Payment
+from .models import UserProfile, SubscriptionPlan, UserSubscription, DiscordIntegration, WhatsAppIntegration, Payment, ArchivedPayment, PlanStats, CreatorDailyStats
 # Register your models here.
 
 admin.site.register(UserProfile)
@@ -7,4 +7,7 @@ admin.site.register(SubscriptionPlan)
 admin.site.register(UserSubscription)
 admin.site.register(DiscordIntegration)
 admin.site.register(WhatsAppIntegration)
-admin.site.register(Payment)
\ No newline at end of file
+admin.site.register(Payment)
+admin.site.register(ArchivedPayment)
+admin.site.register(PlanStats)
+admin.site.register(CreatorDailyStats)
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Moves settled Payment rows past their retention window into ArchivedPayment
+
+FAILED attempts, abandoned PENDING attempts and old successful payments are
+copied and deleted in bounded batches, so the hot table and its transaction_id /
+status indexes only hold recent rows. Archived rows keep their id and are still
+served by the payment detail endpoint.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment, ArchivedPayment
+
+# days a payment stays in the hot table per status
+DEFAULT_RETENTION = {
+    "PENDING": 2,
+    "FAILED": 7,
+    "SUCCESS": 365,
+}
+
+FIELDS = ('id', 'buyer_id', 'plan_id', 'amount', 'gateway', 'transaction_id', 'status', 'created_at')
+
+
+def retention():
+    return {**DEFAULT_RETENTION, **getattr(settings, 'PAYMENT_RETENTION_DAYS', {})}
+
+
+def archivable(now):
+    """
+    Returns the filter matching payments past their retention window at now
+    """
+    condition = Q(pk__in=[])
+    for status, days in retention().items():
+        condition |= Q(status=status, created_at__lt=now - timedelta(days=days))
+    return condition
+
+
+def archive_payments(now=None, batch_size=1000):
+    """
+    Archives payments batch by batch, each batch in its own short transaction |
+    yields number of rows archived per batch
+
+    :param now: retention windows are measured back from this time, defaults to now
+    :param batch_size: max rows moved per transaction
+    """
+    condition = archivable(now or timezone.now())
+    while True:
+        with transaction.atomic():
+            rows = list(Payment.objects.filter(condition).order_by('id').values(*FIELDS)[:batch_size])
+            if not rows:
+                return
+            ArchivedPayment.objects.bulk_create((ArchivedPayment(**row) for row in rows), batch_size=batch_size)
+            Payment.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        yield len(rows)
@@ -0,0 +1,118 @@
+"""
+Async versions of the busiest pages, routed instead of guff/views.py ones when ASYNC_VIEWS is set |
+login and signup await their password hashing from the pool in guff/passwords.py
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate, alogin
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, redirect
+
+from .bootstrap import PROFILE_PLAN_RELATED, active_subscription, plan_data, subscription_data
+from .middleware import aget_profile, get_profile
+from .models import UserProfile, UserSubscription
+from .passwords import amake_password
+from .throttling import posted_username, throttle
+
+
+def home(profile):
+    return redirect('dashboard') if profile.is_creator else redirect('user_dashboard')
+
+
+@throttle('login', user=posted_username)
+async def login_view(request):
+    if (await request.auser()).is_authenticated:
+        return home(await aget_profile(request))
+
+    if request.method == "POST":
+        username = request.POST.get('username', '').strip()
+        password = request.POST.get('password', '').strip()
+
+        if not username or not password:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'provide both username and password correctly'
+            }, status=400)
+
+        user = await aauthenticate(request, username=username, password=password)
+        if user is None:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'invalid credentials'
+            }, status=401)
+        await alogin(request, user)
+        # ProfileBackend loaded the profile with the user
+        return home(get_profile(user))
+    return render(request, "guff/login.html")
+
+
+@throttle('signup')
+async def signup(request):
+    if (await request.auser()).is_authenticated:
+        return redirect('dashboard')
+    if request.method == "POST":
+        username = request.POST.get("username", "").strip()
+        password = request.POST.get("password", "").strip()
+        confirmed_password = request.POST.get("confirmed_password", "").strip()
+        phone_number = request.POST.get("phone", "").strip()
+        is_creator = request.POST.get("is_creator") == "on"
+
+        if not username or not password:
+            return JsonResponse({"error": "username and password required"}, status=400)
+        if password != confirmed_password:
+            return JsonResponse({"error": "passwords do not match"}, status=400)
+        # create_user() with the hashing awaited from the pool
+        encoded = await amake_password(password)
+        try:
+            user = await sync_to_async(create_account)(username, encoded, phone_number, is_creator)
+        except IntegrityError:
+            return JsonResponse({"error": "username already exists"}, status=400)
+        await alogin(request, user, backend='guff.backends.ProfileBackend')
+        return redirect('dashboard') if is_creator else redirect('user_dashboard')
+    return render(request, "guff/signup.html")
+
+
+@transaction.atomic
+def create_account(username, encoded_password, phone_number, is_creator):
+    """
+    Creates the user and its profile, both or neither
+    """
+    user = User.objects.create(username=User.normalize_username(username), password=encoded_password)
+    UserProfile.objects.create(user=user, phone_number=phone_number, is_creator=is_creator)
+    return user
+
+
+@login_required(login_url='login')
+async def user_dashboard(request):
+    profile = await aget_profile(request)
+    if profile.is_creator:
+        return redirect('dashboard')
+
+    # evaluated here, the template can't run queries from the event loop
+    subscriptions = [
+        sub async for sub in
+        UserSubscription.objects.filter(buyer=profile, is_active=True).select_related('plan', 'plan__creator__user')
+    ]
+    return render(request, "guff/user_dashboard.html", {
+        "profile": profile,
+        "subscriptions": subscriptions
+    })
+
+
+@login_required(login_url='login')
+async def creator_profile(request, username):
+    user = await UserProfile.objects.select_related(*PROFILE_PLAN_RELATED).filter(user__username=username).afirst()
+    if user is None:
+        raise Http404
+
+    if not user.is_creator:
+        return redirect('user_dashboard')
+
+    plan = getattr(user, 'plan', None)
+    subscription = await active_subscription(await aget_profile(request), plan).afirst() if plan else None
+
+    return render(request, "guff/creator_profile.html", {
+        "bootstrap": {"plan": plan_data(plan), "subscription": subscription_data(subscription)},
+    })
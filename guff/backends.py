@@ -0,0 +1,139 @@
+"""
+Authentication backend that resolves User and UserProfile together
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import UserProfile
+from .passwords import acheck_password, amake_password
+
+
+# read from the database on every request and never cached: the password (the session hash is
+# checked against it), is_active and the admin flags, so a password change, deactivation or
+# demotion applies to the next request in every worker
+AUTH_FIELDS = ('id', 'password', 'is_active', 'is_staff', 'is_superuser')
+
+
+def profile_cache_key(user_id):
+    return f"authuser:{user_id}"
+
+
+def forget_user(user_id):
+    """
+    Drops cached user/profile, called whenever either of them changes
+    """
+    cache.delete(profile_cache_key(user_id))
+
+
+def cached_fields(user):
+    """
+    Returns what is cached of a user loaded with its profile: its other columns and the
+    profile's (None without a profile)
+    """
+    profile = User.userprofile.related.get_cached_value(user)
+    return {
+        "user": {f.attname: getattr(user, f.attname) for f in User._meta.concrete_fields if f.attname not in AUTH_FIELDS},
+        "profile": None if profile is None else {
+            f.attname: getattr(profile, f.attname) for f in UserProfile._meta.concrete_fields
+        },
+    }
+
+
+def attach_cached(user, fields):
+    """
+    Completes a user loaded with AUTH_FIELDS only from cached_fields() output
+    """
+    for attname, value in fields["user"].items():
+        setattr(user, attname, value)
+    profile = None
+    if fields["profile"] is not None:
+        profile = UserProfile.from_db(user._state.db, list(fields["profile"]), list(fields["profile"].values()))
+        UserProfile.user.field.set_cached_value(profile, user)
+    User.userprofile.related.set_cached_value(user, profile)
+    return user
+
+
+class ProfileBackend(ModelBackend):
+    """
+    ModelBackend that loads the user with its profile in one joined query and caches both
+    but for AUTH_FIELDS, so once warm request.user and request.profile cost one primary key
+    lookup of AUTH_FIELDS. The session hash is verified against that row, and no password
+    hash is ever written to the cache.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.select_related('userprofile').get(**{User.USERNAME_FIELD: username})
+        except User.DoesNotExist:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        # same as authenticate(), the password rounds run in the pool (guff/passwords.py)
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        user = await User._default_manager.select_related('userprofile').filter(
+            **{User.USERNAME_FIELD: username}
+        ).afirst()
+        if user is None:
+            await amake_password(password)
+            return None
+        if await acheck_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        key = profile_cache_key(user_id)
+        fields = cache.get(key)
+        if fields is None:
+            profile = UserProfile.objects.select_related('user').filter(user_id=user_id).first()
+            if profile is not None:
+                # select_related fills the reverse side too, so user.userprofile is cached
+                user = profile.user
+            else:
+                user = User._default_manager.filter(pk=user_id).first()
+                if user is None:
+                    return None
+                # remember there is no profile (e.g. admins) so it isn't looked up again
+                User.userprofile.related.set_cached_value(user, None)
+            cache.set(key, cached_fields(user), settings.PROFILE_CACHE_TIMEOUT)
+        else:
+            user = User._default_manager.only(*AUTH_FIELDS).filter(pk=user_id).first()
+            if user is None:
+                return None
+            attach_cached(user, fields)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # same as get_user() with the async ORM and cache
+        key = profile_cache_key(user_id)
+        fields = await cache.aget(key)
+        if fields is None:
+            profile = await UserProfile.objects.select_related('user').filter(user_id=user_id).afirst()
+            if profile is not None:
+                user = profile.user
+            else:
+                user = await User._default_manager.filter(pk=user_id).afirst()
+                if user is None:
+                    return None
+                User.userprofile.related.set_cached_value(user, None)
+            await cache.aset(key, cached_fields(user), settings.PROFILE_CACHE_TIMEOUT)
+        else:
+            user = await User._default_manager.only(*AUTH_FIELDS).filter(pk=user_id).afirst()
+            if user is None:
+                return None
+            attach_cached(user, fields)
+        return user if self.user_can_authenticate(user) else None
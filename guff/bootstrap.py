@@ -0,0 +1,32 @@
+"""
+Page data inlined into the dashboard and creator profile templates with json_script, so
+script.js renders from it instead of calling /api/plans/<id>/ after the page loads.
+
+The plan is serialized with the same PlanSerializer as the API, from the row the view
+already loaded (PROFILE_PLAN_RELATED joins everything the serializer reads).
+"""
+from api.subscription_serializers import PlanSerializer
+from .models import UserSubscription
+
+# joins for PlanSerializer through a UserProfile row
+PROFILE_PLAN_RELATED = ('user', 'plan__discord', 'plan__whatsapp')
+
+
+def plan_data(plan):
+    """
+    Returns the /api/plans/<id>/ representation of plan or None
+    """
+    return dict(PlanSerializer(plan).data) if plan is not None else None
+
+
+def subscription_data(subscription):
+    """
+    :param subscription: {"end_date": ...} of the viewer's active subscription or None
+    """
+    if subscription is None:
+        return {"active": False, "end_date": None}
+    return {"active": True, "end_date": subscription["end_date"]}
+
+
+def active_subscription(viewer, plan):
+    return UserSubscription.objects.filter(buyer=viewer, plan=plan, is_active=True).values('end_date')
@@ -0,0 +1,109 @@
+"""
+Database connection setup and primary/replica routing.
+
+Every SQLite connection gets WAL (readers don't wait for the writer and the writer doesn't
+wait for readers), synchronous=NORMAL (fsync on checkpoint instead of every commit, safe
+under WAL) and a busy_timeout so a second writer queues instead of failing with
+"database is locked". Replica connections are also query_only.
+
+PrimaryReplicaRouter sends reads to DATABASE_REPLICAS and writes to default. Once a
+request (or command) writes, its reads stay on default so it reads its own writes, and
+ReplicaPinMiddleware keeps the browser on default for DATABASE_REPLICA_PIN_SECONDS so the
+redirect after a POST doesn't read from a replica that hasn't caught up.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PIN_COOKIE = "guff_primary"
+
+# True once the current request/command has written to default
+_pinned = ContextVar("guff_db_pinned", default=False)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        # in-memory databases (tests) answer "memory" and stay as they are
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        if connection.alias in settings.DATABASE_REPLICAS:
+            cursor.execute("PRAGMA query_only=ON")
+
+
+def pin_primary():
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads go to a random replica unless pinned or inside a transaction on default | writes go to default
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Scopes the router's pin to the request and carries it over to the next requests with a
+    short-lived cookie | goes first so sessions and auth are routed too
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _pinned.set(PIN_COOKIE in request.COOKIES)
+        try:
+            return self.pin_response(request, self.get_response(request))
+        finally:
+            _pinned.reset(token)
+
+    async def __acall__(self, request):
+        token = _pinned.set(PIN_COOKIE in request.COOKIES)
+        try:
+            return self.pin_response(request, await self.get_response(request))
+        finally:
+            _pinned.reset(token)
+
+    def pin_response(self, request, response):
+        if settings.DATABASE_REPLICAS and _pinned.get() and PIN_COOKIE not in request.COOKIES:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True, samesite="Lax", secure=request.is_secure(),
+            )
+        return response
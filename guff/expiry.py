@@ -0,0 +1,42 @@
+"""
+Deactivates subscriptions whose end_date has passed
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import insights
+from .models import UserSubscription
+
+
+def expired_ids(today, limit):
+    """
+    Returns up to limit ids of active subscriptions that ended before today |
+    walks the partial index usersub_active_end_idx (end_date WHERE is_active) instead of scanning the table
+    """
+    return list(
+        UserSubscription.objects
+        .filter(is_active=True, end_date__lt=today)
+        .order_by('end_date')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def expire_subscriptions(today=None, chunk_size=1000):
+    """
+    Expires subscriptions chunk by chunk, each chunk in its own short transaction |
+    yields number of rows deactivated per chunk
+
+    :param today: rows with end_date before this date are expired, defaults to today
+    :param chunk_size: max rows updated per transaction
+    """
+    today = today or timezone.localdate()
+    while True:
+        ids = expired_ids(today, chunk_size)
+        if not ids:
+            return
+        with transaction.atomic():
+            chunk = UserSubscription.objects.filter(id__in=ids, is_active=True)
+            rows = insights.deactivation_rows(chunk)
+            updated = chunk.update(is_active=False)
+            insights.subscriptions_deactivated(rows)
+        yield updated
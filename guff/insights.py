@@ -0,0 +1,157 @@
+"""
+Incrementally maintained creator insights.
+
+PlanStats holds the active subscriber count per plan and CreatorDailyStats holds
+revenue, new and churned subscribers per creator per day. Writers that change a
+subscription's state call the hooks below inside their own transaction, and the
+counters move with atomic F() increments so concurrent writers never lose updates.
+rebuild() recomputes everything from UserSubscription/Payment.
+
+Days: revenue is booked on the payment's created_at date, new subscribers on the
+subscription's start_date and churn on its end_date, so rebuild() lands on the same
+rows the hooks update.
+
+Limit: a subscription keeps one row across cancellations and reactivations, and no
+history of its earlier periods is stored. rebuild() counts one new subscriber per
+row on its latest start_date and churn only for rows inactive now, so after a
+reactivation the earlier activation and its churn drop out of the rebuilt days.
+Active counts and revenue always match the hooks, and so does new minus churned.
+"""
+from datetime import timedelta
+
+from django.db import transaction, IntegrityError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PlanStats, CreatorDailyStats, UserSubscription, SubscriptionPlan, Payment, ArchivedPayment
+
+PAID_STATUSES = ("SUCCESS",)
+
+
+def _increment(model, lookup, **deltas):
+    """
+    Adds deltas to the row matching lookup, creating it first if it doesn't exist yet
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # created concurrently, fall back to the increment
+        model.objects.filter(**lookup).update(**changes)
+
+
+def subscription_activated(plan_id, creator_id, start_date, amount, paid_on, was_active):
+    """
+    Books a successful payment for a subscription |
+    counts a new active subscriber unless the subscription was already active (renewal)
+    """
+    if was_active:
+        _increment(CreatorDailyStats, {"creator_id": creator_id, "date": paid_on}, revenue=amount)
+        return
+
+    _increment(PlanStats, {"plan_id": plan_id}, active_subscribers=1)
+    if paid_on == start_date:
+        _increment(CreatorDailyStats, {"creator_id": creator_id, "date": paid_on}, revenue=amount, new_subscribers=1)
+    else:
+        _increment(CreatorDailyStats, {"creator_id": creator_id, "date": paid_on}, revenue=amount)
+        _increment(CreatorDailyStats, {"creator_id": creator_id, "date": start_date}, new_subscribers=1)
+
+
+def subscriptions_deactivated(rows):
+    """
+    Books churn for deactivated subscriptions
+
+    :param rows: iterable of (plan_id, creator_id, end_date, count)
+    """
+    for plan_id, creator_id, end_date, count in rows:
+        _increment(PlanStats, {"plan_id": plan_id}, active_subscribers=-count)
+        _increment(CreatorDailyStats, {"creator_id": creator_id, "date": end_date}, churned_subscribers=count)
+
+
+def deactivation_rows(subscriptions):
+    """
+    Groups active subscriptions into rows for subscriptions_deactivated()
+    """
+    return list(
+        subscriptions.filter(is_active=True)
+        .values_list('plan_id', 'plan__creator_id', 'end_date')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recomputes every rollup from scratch | new and churned subscribers only cover each
+    subscription's current period, see the module docstring
+    """
+    PlanStats.objects.all().delete()
+    CreatorDailyStats.objects.all().delete()
+
+    active = dict(
+        UserSubscription.objects.filter(is_active=True)
+        .values_list('plan_id').annotate(n=Count('id')).order_by()
+    )
+    PlanStats.objects.bulk_create(
+        PlanStats(plan_id=plan_id, active_subscribers=active.get(plan_id, 0))
+        for plan_id in SubscriptionPlan.objects.values_list('id', flat=True).iterator()
+    )
+
+    days = {}
+
+    def day(creator_id, date):
+        key = (creator_id, date)
+        if key not in days:
+            days[key] = CreatorDailyStats(creator_id=creator_id, date=date)
+        return days[key]
+
+    # archived payments (guff/archive.py) still count
+    for model in (Payment, ArchivedPayment):
+        revenue = (
+            model.objects.filter(status__in=PAID_STATUSES)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('plan__creator_id', 'day').annotate(total=Sum('amount')).order_by()
+        )
+        for creator_id, date, total in revenue:
+            day(creator_id, date).revenue += total
+
+    # every subscription that has been active has an end_date
+    activated = UserSubscription.objects.filter(end_date__isnull=False)
+    for creator_id, date, n in (
+        activated.values_list('plan__creator_id', 'start_date').annotate(n=Count('id')).order_by()
+    ):
+        day(creator_id, date).new_subscribers = n
+    for creator_id, date, n in (
+        activated.filter(is_active=False)
+        .values_list('plan__creator_id', 'end_date').annotate(n=Count('id')).order_by()
+    ):
+        day(creator_id, date).churned_subscribers = n
+
+    CreatorDailyStats.objects.bulk_create(days.values(), batch_size=1000)
+    return len(active), len(days)
+
+
+def creator_insights(creator, days=30):
+    """
+    Returns rollups of creator for the last `days` days, reads only rollup rows
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    plans = PlanStats.objects.filter(plan__creator=creator).values_list('plan_id', 'active_subscribers')
+    daily = (
+        CreatorDailyStats.objects.filter(creator=creator, date__gte=since)
+        .order_by('date')
+        .values('date', 'revenue', 'new_subscribers', 'churned_subscribers')
+    )
+    plans = [{"plan_id": plan_id, "active_subscribers": n} for plan_id, n in plans]
+    return {
+        "active_subscribers": sum(p["active_subscribers"] for p in plans),
+        "plans": plans,
+        "daily": list(daily),
+    }
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from guff.archive import archive_payments
+
+
+class Command(BaseCommand):
+    help = "Moves payments past their retention window to ArchivedPayment in bounded batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="keep archiving every --interval seconds")
+        parser.add_argument('--interval', type=float, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        started = time.monotonic()
+        total = batches = 0
+        for archived in archive_payments(batch_size=batch_size):
+            total += archived
+            batches += 1
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f"archived {total} payments in {batches} batches, {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from .runbench import percentile
+from guff.models import UserProfile, SubscriptionPlan
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync views behind WSGI with the async views behind ASGI at N simultaneous requests. "
+        "Drives both handlers in-process (no sockets), each mode in its own process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help="requests in flight at once")
+        parser.add_argument('--rounds', type=int, default=3, help="bursts of --connections requests per endpoint")
+        parser.add_argument('--threads', type=int, default=32, help="WSGI worker threads (gthread style)")
+        parser.add_argument('--only', nargs='*', help="only run endpoints whose path contains one of these")
+        # internal: run a single mode in this process and print its results as json
+        parser.add_argument('--mode', choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        results = {}
+        for mode in ("wsgi", "asgi"):
+            env = {**os.environ, "GUFF_ASYNC_VIEWS": "1" if mode == "asgi" else "0"}
+            argv = [sys.executable, sys.argv[0], "bench_asgi", "--mode", mode,
+                    "--connections", str(options['connections']), "--rounds", str(options['rounds']),
+                    "--threads", str(options['threads'])]
+            if options['only']:
+                argv += ["--only", *options['only']]
+            child = subprocess.run(argv, env=env, capture_output=True, text=True)
+            if child.returncode:
+                raise CommandError(f"{mode} run failed:\n{child.stderr}")
+            results[mode] = json.loads(child.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"{options['connections']} simultaneous requests, WSGI with {options['threads']} threads")
+        for path in results["wsgi"]:
+            for mode in ("wsgi", "asgi"):
+                r = results[mode][path]
+                self.stdout.write(
+                    f"{mode} {path:<32} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:8.1f}ms  "
+                    f"p99 {r['p99_ms']:8.1f}ms  errors {r['errors']}"
+                )
+
+    def paths(self, only):
+        plan = SubscriptionPlan.objects.select_related('creator__user').order_by('id').first()
+        buyer = (
+            UserProfile.objects.filter(is_creator=False, subscriptions__isnull=False)
+            .select_related('user').order_by('id').first()
+        )
+        if plan is None or buyer is None:
+            raise CommandError("no data to benchmark, run `manage.py generate_data` first")
+        username = plan.creator.user.username
+        paths = [
+            "/api/me/",
+            f"/api/users/{username}/",
+            f"/api/creators/{username}/plans/",
+            f"/api/plans/{plan.id}/",
+            "/api/subscriptions/",
+            f"/profile/{username}/",
+            "/user/dashboard/",
+        ]
+        if only:
+            paths = [p for p in paths if any(o in p for o in only)]
+
+        client = Client()
+        client.force_login(buyer.user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        return paths, cookie
+
+    def run_mode(self, options):
+        if settings.ASYNC_VIEWS != (options['mode'] == "asgi"):
+            raise CommandError("GUFF_ASYNC_VIEWS doesn't match --mode")
+        paths, cookie = self.paths(options['only'])
+        run = self.run_wsgi if options['mode'] == "wsgi" else self.run_asgi
+        results = {}
+        for path in paths:
+            run(path, cookie, 10, options)  # warmup
+            latencies, errors, elapsed = [], 0, 0.0
+            for _ in range(options['rounds']):
+                round_latencies, round_errors, round_elapsed = run(path, cookie, options['connections'], options)
+                latencies += round_latencies
+                errors += round_errors
+                elapsed += round_elapsed
+            results[path] = {
+                "rps": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "errors": errors,
+            }
+        return results
+
+    def run_wsgi(self, path, cookie, connections, options):
+        handler = WSGIHandler()
+
+        def call(_):
+            statuses = []
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+                "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+                "HTTP_COOKIE": cookie, "REMOTE_ADDR": "127.0.0.1", "SERVER_PROTOCOL": "HTTP/1.1",
+                "wsgi.input": BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+                "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False,
+                "wsgi.run_once": False,
+            }
+            body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                body.close()
+            return time.perf_counter() - started, not statuses[0].startswith(("2", "3"))
+
+        # every request is queued at once, latency includes waiting for a free thread
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(call, range(connections)))
+            elapsed = time.perf_counter() - started
+        return [r[0] for r in results], sum(r[1] for r in results), elapsed
+
+    def run_asgi(self, path, cookie, connections, options):
+        handler = ASGIHandler()
+
+        async def call():
+            status = []
+            disconnected = asyncio.Event()
+            request_sent = False
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+                "root_path": "", "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+                "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+            }
+            await handler(scope, receive, send)
+            disconnected.set()
+            return time.perf_counter() - started, status[0] >= 400
+
+        async def burst():
+            return await asyncio.gather(*(call() for _ in range(connections)))
+
+        started = time.perf_counter()
+        results = asyncio.run(burst())
+        elapsed = time.perf_counter() - started
+        return [r[0] for r in results], sum(r[1] for r in results), elapsed
@@ -0,0 +1,134 @@
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from .runbench import percentile
+from guff.models import UserProfile, SubscriptionPlan, Payment
+
+MODES = {
+    # name: (journal mode, replicas)
+    "delete": ("DELETE", ""),
+    "wal": ("WAL", ""),
+    "wal+replicas": ("WAL", "{db},{db}"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs eSewa webhook writes and dashboard reads at the same time against db.sqlite3 and "
+        "compares SQLite journal modes and replica routing, each mode in its own process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="threads loading the dashboard")
+        parser.add_argument('--writers', type=int, default=2, help="threads confirming payments")
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--modes', nargs='*', choices=list(MODES), default=list(MODES))
+        # internal: run with the current settings and print the results as json
+        parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.run(options)))
+            return
+
+        db = str(settings.DATABASES['default']['NAME'])
+        for mode in options['modes']:
+            journal_mode, replicas = MODES[mode]
+            env = {
+                **os.environ, "GUFF_SQLITE_JOURNAL_MODE": journal_mode,
+                "GUFF_DB_REPLICAS": replicas.format(db=db),
+            }
+            argv = [sys.executable, sys.argv[0], "bench_db", "--child", "--readers", str(options['readers']),
+                    "--writers", str(options['writers']), "--seconds", str(options['seconds'])]
+            child = subprocess.run(argv, env=env, capture_output=True, text=True)
+            if child.returncode:
+                raise CommandError(f"{mode} run failed:\n{child.stderr}")
+            r = json.loads(child.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f"{mode:<13} reads {r['reads_per_s']:7.1f}/s  p50 {r['read_p50_ms']:7.1f}ms  "
+                f"p99 {r['read_p99_ms']:7.1f}ms  |  writes {r['writes_per_s']:6.1f}/s  "
+                f"p99 {r['write_p99_ms']:7.1f}ms  |  errors {r['errors']}"
+            )
+
+    def run(self, options):
+        buyers = list(
+            UserProfile.objects.filter(is_creator=False, subscriptions__isnull=False)
+            .select_related('user').order_by('id')[:options['readers'] + options['writers']]
+        )
+        plan = SubscriptionPlan.objects.order_by('id').first()
+        if plan is None or len(buyers) < options['readers'] + options['writers']:
+            raise CommandError("not enough data, run `manage.py generate_data` first")
+
+        deadline = time.perf_counter() + options['seconds']
+        results = {"read": [], "write": [], "errors": 0}
+        lock = threading.Lock()
+        created = []
+
+        def read(buyer):
+            client = Client(HTTP_HOST="localhost")
+            client.force_login(buyer.user)
+            while time.perf_counter() < deadline:
+                for path in ("/user/dashboard/", "/api/subscriptions/"):
+                    yield lambda: client.get(path)
+
+        def write(buyer):
+            client = Client(HTTP_HOST="localhost")
+            while time.perf_counter() < deadline:
+                transaction_id = str(uuid.uuid4())
+                Payment.objects.create(
+                    buyer=buyer, plan=plan, amount=plan.price, gateway="ES", transaction_id=transaction_id
+                )
+                created.append(transaction_id)
+                data = base64.b64encode(
+                    json.dumps({"transaction_uuid": transaction_id, "status": "COMPLETE"}).encode()
+                ).decode()
+                yield lambda: client.get("/api/webhook/esewa/", {"data": data})
+
+        def worker(kind, requests):
+            try:
+                for call in requests:
+                    started = time.perf_counter()
+                    try:
+                        ok = call().status_code < 400
+                    except Exception:
+                        ok = False
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        if ok:
+                            results[kind].append(elapsed)
+                        else:
+                            results["errors"] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=("read", read(b))) for b in buyers[:options['readers']]]
+        threads += [
+            threading.Thread(target=worker, args=("write", write(b))) for b in buyers[options['readers']:]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        Payment.objects.filter(transaction_id__in=created).delete()
+        seconds = options['seconds']
+        return {
+            "reads_per_s": len(results["read"]) / seconds,
+            "read_p50_ms": percentile(results["read"], 50) * 1000 if results["read"] else 0,
+            "read_p99_ms": percentile(results["read"], 99) * 1000 if results["read"] else 0,
+            "writes_per_s": len(results["write"]) / seconds,
+            "write_p99_ms": percentile(results["write"], 99) * 1000 if results["write"] else 0,
+            "errors": results["errors"],
+        }
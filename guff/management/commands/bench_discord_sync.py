@@ -0,0 +1,55 @@
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.discord_fake import FakeDiscord, FakeDiscordServer
+from api.discord_sync import DiscordClient, reconcile
+
+GUILD_ID = "100000000000000001"
+ROLE_ID = "200000000000000001"
+
+
+class Command(BaseCommand):
+    help = "Benchmarks discord role reconciliation against the local fake Discord API"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=20000, help="guild members")
+        parser.add_argument('--subscribers', type=int, default=15000, help="active subscribers in the guild")
+        parser.add_argument('--churn', type=float, default=0.02, help="fraction of subscribers changed before the second sync")
+        parser.add_argument('--rate-limit', type=int, default=50, help="requests per bucket per window")
+        parser.add_argument('--rate-period', type=float, default=1.0)
+        parser.add_argument('--latency', type=float, default=0.02, help="simulated server latency per request")
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        fake = FakeDiscord(options['rate_limit'], options['rate_period'], options['latency'])
+        members = [str(10**17 + i) for i in range(options['members'])]
+        for user_id in members:
+            fake.add_member(GUILD_ID, user_id)
+        desired = set(random.sample(members, options['subscribers']))
+
+        with FakeDiscordServer(fake) as base_url:
+            self.run_sync("initial sync", base_url, desired, fake, options['concurrency'])
+
+            changed = int(len(desired) * options['churn'])
+            desired -= set(random.sample(sorted(desired), changed))
+            desired |= set(random.sample(sorted(set(members) - desired), changed))
+            self.run_sync("churn sync", base_url, desired, fake, options['concurrency'])
+
+    def run_sync(self, label, base_url, desired, fake, concurrency):
+        fake.stats.update(requests=0, rate_limited=0)
+
+        async def run():
+            async with DiscordClient("bench", base_url=base_url, concurrency=concurrency) as client:
+                return await reconcile(client, GUILD_ID, ROLE_ID, desired)
+
+        started = time.monotonic()
+        result = asyncio.run(run())
+        elapsed = time.monotonic() - started
+        assert fake.role_holders(GUILD_ID, ROLE_ID) == desired
+        self.stdout.write(
+            f"{label}: {result.as_dict()} in {elapsed:.2f}s, "
+            f"{fake.stats['requests']} requests ({fake.stats['rate_limited']} rate limited)"
+        )
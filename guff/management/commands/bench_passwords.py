@@ -0,0 +1,70 @@
+import asyncio
+import os
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from guff.passwords import TunablePBKDF2PasswordHasher, _pool, pbkdf2
+from .runbench import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Password checks per second and event loop stalls while verifying them: in the request thread "
+        "(what a sync login does) against awaiting the process pool (async login), per PBKDF2 cost"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help="password checks per run")
+        parser.add_argument('--iterations', type=int, nargs='*', default=[PBKDF2PasswordHasher.iterations, 600000, 260000])
+
+    def handle(self, *args, **options):
+        workers = settings.PASSWORD_POOL_WORKERS
+        self.stdout.write(f"{os.cpu_count()} cores, pool of {workers}, {options['logins']} checks per run")
+        # spawn the workers before timing anything
+        list(_pool().map(pbkdf2, ["x"] * workers, ["salt"] * workers, [1] * workers, ["sha256"] * workers))
+        for iterations in options['iterations']:
+            with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations):
+                hasher = TunablePBKDF2PasswordHasher()
+                encoded = hasher.encode("secret", hasher.salt())
+                checks = [encoded] * options['logins']
+                for mode, cores, run in (("inline", 1, self.inline), ("pool", workers, self.pooled)):
+                    elapsed, stalls = async_to_sync(self.measure)(run, checks, hasher)
+                    rate = len(checks) / elapsed
+                    self.stdout.write(
+                        f"{iterations:>8} iterations {mode:<6} {rate:8.1f} logins/s  {rate / cores:7.1f}/core  "
+                        f"loop stall p99 {percentile(stalls, 99) * 1000:8.1f}ms  max {max(stalls) * 1000:8.1f}ms"
+                    )
+
+    async def measure(self, run, checks, hasher):
+        """
+        Runs the checks next to a 10ms ticker, returns (seconds, [how late each tick was])
+        """
+        stalls, done = [], asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                stalls.append(max(0.0, time.perf_counter() - started - 0.01))
+
+        tick = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await run(checks, hasher)
+        elapsed = time.perf_counter() - started
+        done.set()
+        await tick
+        return elapsed, stalls or [0.0]
+
+    async def inline(self, checks, hasher):
+        for encoded in checks:
+            assert hasher.verify("secret", encoded)
+            # a sync view yields to the loop between requests at best
+            await asyncio.sleep(0)
+
+    async def pooled(self, checks, hasher):
+        assert all(await asyncio.gather(*(hasher.averify("secret", encoded) for encoded in checks)))
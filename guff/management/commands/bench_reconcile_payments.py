@@ -0,0 +1,46 @@
+import asyncio
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from api.esewa_fake import FakeEsewa, FakeEsewaServer
+from api.esewa_status import EsewaStatusClient
+
+
+class Command(BaseCommand):
+    help = "Benchmarks eSewa status lookups of the payment reconciler against the local fake gateway"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=5000)
+        parser.add_argument('--latency', type=float, default=0.05, help="simulated gateway latency per request")
+        parser.add_argument('--fail-every', type=int, default=50, help="answer every n-th request with 503")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+
+    def handle(self, *args, **options):
+        fake = FakeEsewa(latency=options['latency'], fail_every=options['fail_every'])
+        payments = [(str(uuid.uuid4()), "100") for _ in range(options['payments'])]
+        for i, (transaction_uuid, _) in enumerate(payments):
+            fake.set_status(transaction_uuid, "COMPLETE" if i % 3 else "PENDING")
+
+        with FakeEsewaServer(fake) as status_url:
+            for concurrency in options['concurrency']:
+                self.run(fake, status_url, payments, concurrency)
+
+    def run(self, fake, status_url, payments, concurrency):
+        fake.stats.update(requests=0, failed=0)
+
+        async def run():
+            async with EsewaStatusClient(url=status_url, product_code="EPAYTEST", concurrency=concurrency,
+                                         backoff=0.01) as client:
+                return await client.statuses(payments)
+
+        started = time.monotonic()
+        results = asyncio.run(run())
+        elapsed = time.monotonic() - started
+        unresolved = sum(1 for _, status in results if status is None)
+        self.stdout.write(
+            f"concurrency {concurrency:>3}: {len(payments)} lookups in {elapsed:.2f}s "
+            f"({len(payments) / elapsed:.0f}/s), {fake.stats['requests']} requests "
+            f"({fake.stats['failed']} retried), {unresolved} unresolved"
+        )
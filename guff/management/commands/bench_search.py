@@ -0,0 +1,64 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from guff import search
+from guff.models import UserProfile, SubscriptionPlan
+from .runbench import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Latency of creator search and autocomplete over the current creators, through /api/search/ and "
+        "the index directly | fill the database with `generate_data --creators 100000` first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=2000, help="queries per kind")
+        parser.add_argument('--min-creators', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        creators = UserProfile.objects.filter(is_creator=True).count()
+        if creators < options['min_creators']:
+            raise CommandError(
+                f"{creators} creators, run `manage.py generate_data --creators {options['min_creators']}` first"
+            )
+        rng = random.Random(options['seed'])
+        usernames = list(UserProfile.objects.filter(is_creator=True).values_list('user__username', flat=True))
+        plan_names = list(SubscriptionPlan.objects.values_list('name', flat=True)[:10000])
+        buyer = UserProfile.objects.filter(is_creator=False).select_related('user').first()
+        if buyer is None:
+            raise CommandError("no subscriber to search as, run `manage.py generate_data` first")
+
+        def typed(text):
+            # somewhere between the first two letters and the whole text
+            return text[:rng.randint(2, len(text))] if len(text) > 2 else text
+
+        kinds = {
+            "username prefix": lambda: typed(rng.choice(usernames)),
+            "plan name": lambda: typed(rng.choice(plan_names)),
+            "two letters": lambda: rng.choice(usernames)[:2],
+        }
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(buyer.user)
+
+        self.stdout.write(f"{creators} creators, {options['queries']} queries per kind")
+        for kind, make in kinds.items():
+            texts = [make() for _ in range(options['queries'])]
+            for label, run in (
+                ("search()", search.search),
+                ("complete()", search.complete),
+                ("/api/search/", lambda text: client.get("/api/search/", {"q": text})),
+            ):
+                timings = []
+                for text in texts:
+                    started = time.perf_counter()
+                    run(text)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"{kind:<16} {label:<13} p50 {percentile(timings, 50) * 1000:6.2f}ms  "
+                    f"p99 {percentile(timings, 99) * 1000:6.2f}ms  max {max(timings) * 1000:6.2f}ms"
+                )
@@ -0,0 +1,76 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from guff.models import UserProfile
+from guff.querybudget import QueryBudget
+from guff.sessions import write_behind
+
+
+ENGINES = {
+    **settings.SESSION_ENGINES,
+    'django_cached_db': 'django.contrib.sessions.backends.cached_db',
+}
+
+
+class Command(BaseCommand):
+    help = "Compares database round-trips and latency of logins and authenticated requests per session engine"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="logins per engine")
+        parser.add_argument('--requests', type=int, default=10, help="authenticated requests per user")
+        parser.add_argument('--path', default="/api/me/")
+        parser.add_argument('--engines', nargs='*', choices=list(ENGINES), default=list(ENGINES))
+
+    def handle(self, *args, **options):
+        users = [
+            p.user for p in UserProfile.objects.select_related('user').order_by('id')[:options['users']]
+        ]
+        if len(users) < options['users']:
+            raise CommandError("not enough users, run `manage.py generate_data` first")
+
+        # flushed explicitly below so its queries are counted
+        interval, write_behind.interval = write_behind.interval, 3600
+        try:
+            for name in options['engines']:
+                with override_settings(SESSION_ENGINE=ENGINES[name]):
+                    self.run(name, users, options['requests'], options['path'])
+        finally:
+            write_behind.interval = interval
+
+    def run(self, name, users, requests, path):
+        cache.clear()
+        clients, keys = [], []
+
+        started = time.perf_counter()
+        with QueryBudget() as logins:
+            for user in users:
+                client = Client(HTTP_HOST="localhost")
+                client.force_login(user)
+                clients.append(client)
+            write_behind.flush()
+        login_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with QueryBudget() as reads:
+            for _ in range(requests):
+                for client in clients:
+                    if client.get(path).status_code != 200:
+                        raise CommandError(f"{name}: GET {path} failed")
+            write_behind.flush()
+        read_time = time.perf_counter() - started
+
+        for client in clients:
+            if settings.SESSION_COOKIE_NAME in client.cookies:
+                keys.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        Session.objects.filter(session_key__in=keys).delete()
+
+        total = len(clients) * requests
+        self.stdout.write(
+            f"{name:<17} login {logins.count / len(users):5.2f} queries ({login_time / len(users) * 1000:6.2f}ms)  "
+            f"request {reads.count / total:5.2f} queries ({read_time / total * 1000:6.2f}ms)"
+        )
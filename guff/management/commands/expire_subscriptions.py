@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from guff.expiry import expire_subscriptions
+
+
+class Command(BaseCommand):
+    help = "Deactivates subscriptions past their end_date in bounded chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="keep sweeping every --interval seconds")
+        parser.add_argument('--interval', type=float, default=300)
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['chunk_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, chunk_size):
+        started = time.monotonic()
+        total = chunks = 0
+        for updated in expire_subscriptions(chunk_size=chunk_size):
+            total += updated
+            chunks += 1
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f"expired {total} subscriptions in {chunks} chunks, {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
@@ -0,0 +1,159 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from guff import insights
+from guff import search
+from guff.models import (
+    UserProfile, SubscriptionPlan, UserSubscription, DiscordIntegration, WhatsAppIntegration, Payment
+)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Fills the database with synthetic creators, subscribers, subscriptions and payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--creators', type=int, default=1000)
+        parser.add_argument('--subscribers', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=5, help="subscriptions per subscriber")
+        parser.add_argument('--payments', type=int, default=2, help="payments per subscription")
+        parser.add_argument('--integrations', type=float, default=0.5, help="fraction of plans with discord/whatsapp")
+        parser.add_argument('--expired', type=float, default=0.2, help="fraction of subscriptions already ended")
+        parser.add_argument(
+            '--unswept', type=float, default=0.5,
+            help="fraction of the ended subscriptions still active, left for `manage.py expire_subscriptions`",
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--prefix', default="gen", help="username prefix, must be unused")
+        parser.add_argument('--password', default="benchpass", help="password of every generated user")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.password = make_password(options['password'])
+        self.started = time.monotonic()
+        prefix = options['prefix']
+
+        creator_ids = self.create_profiles(f"{prefix}c", options['creators'], is_creator=True)
+        plan_ids = self.create_plans(creator_ids, f"{prefix}c")
+        self.create_integrations(plan_ids, options['integrations'])
+        buyer_ids = self.create_profiles(f"{prefix}s", options['subscribers'], is_creator=False)
+        self.create_subscriptions(
+            buyer_ids, plan_ids, options['subscriptions'], options['expired'], options['unswept']
+        )
+        self.create_payments(options['payments'], f"{prefix}s")
+        # bulk_create skips the signals that keep the search index and the insights rollups in sync
+        self.stdout.write(f"search index: {search.rebuild()} creators ({time.monotonic() - self.started:.1f}s)")
+        plans, days = insights.rebuild()
+        self.stdout.write(f"insights: {plans} active plans, {days} creator days ({time.monotonic() - self.started:.1f}s)")
+
+        self.stdout.write(self.style.SUCCESS(f"done in {time.monotonic() - self.started:.1f}s"))
+
+    def bulk(self, model, objs, label):
+        created = 0
+        for chunk in chunked(objs, self.chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.chunk_size)
+            created += len(chunk)
+        self.stdout.write(f"{label}: {created} rows ({time.monotonic() - self.started:.1f}s)")
+        return created
+
+    def create_profiles(self, prefix, count, is_creator):
+        self.bulk(User, (
+            User(username=f"{prefix}{i}", password=self.password) for i in range(count)
+        ), f"users {prefix}*")
+        user_ids = User.objects.filter(username__startswith=prefix).values_list('id', flat=True)
+        self.bulk(UserProfile, (
+            UserProfile(
+                user_id=user_id,
+                is_creator=is_creator,
+                phone_number=f"98{self.rng.randrange(10**8):08d}",
+                discord_id=str(10**17 + user_id),
+            ) for user_id in user_ids.iterator(chunk_size=self.chunk_size)
+        ), "profiles")
+        return list(
+            UserProfile.objects.filter(user__username__startswith=prefix).values_list('id', flat=True)
+        )
+
+    def create_plans(self, creator_ids, prefix):
+        self.bulk(SubscriptionPlan, (
+            SubscriptionPlan(
+                creator_id=creator_id,
+                name=f"plan {creator_id}",
+                subscription_bio=f"community of creator {creator_id}",
+                price=Decimal(self.rng.choice([100, 250, 500, 1000])),
+                interval=self.rng.choice("MY"),
+            ) for creator_id in creator_ids
+        ), "plans")
+        return list(
+            SubscriptionPlan.objects.filter(creator__user__username__startswith=prefix).values_list('id', flat=True)
+        )
+
+    def create_integrations(self, plan_ids, ratio):
+        linked = [p for p in plan_ids if self.rng.random() < ratio]
+        self.bulk(DiscordIntegration, (
+            DiscordIntegration(plan_id=p, guild_id=str(10**17 + p), role_id=str(2 * 10**17 + p)) for p in linked
+        ), "discord integrations")
+        self.bulk(WhatsAppIntegration, (
+            WhatsAppIntegration(plan_id=p, group_link=f"https://chat.whatsapp.com/gen{p}") for p in linked
+        ), "whatsapp integrations")
+
+    def create_subscriptions(self, buyer_ids, plan_ids, per_buyer, expired_ratio, unswept_ratio):
+        per_buyer = min(per_buyer, len(plan_ids))
+        today = timezone.localdate()
+
+        def rows():
+            for buyer_id in buyer_ids:
+                for plan_id in self.rng.sample(plan_ids, per_buyer):
+                    # 30 day periods, ended some time in the last year or running until the next 30 days
+                    if self.rng.random() < expired_ratio:
+                        end = today - timedelta(days=self.rng.randrange(1, 365))
+                        is_active = self.rng.random() < unswept_ratio
+                    else:
+                        end = today + timedelta(days=self.rng.randrange(30))
+                        is_active = True
+                    yield UserSubscription(
+                        buyer_id=buyer_id, plan_id=plan_id, start_date=end - timedelta(days=30), end_date=end,
+                        is_active=is_active,
+                    )
+
+        self.bulk(UserSubscription, rows(), "subscriptions")
+
+    def create_payments(self, per_subscription, prefix):
+        prices = dict(SubscriptionPlan.objects.values_list('id', 'price'))
+        subscriptions = (
+            UserSubscription.objects.filter(buyer__user__username__startswith=prefix)
+            .values_list('buyer_id', 'plan_id').iterator(chunk_size=self.chunk_size)
+        )
+        statuses = ["SUCCESS"] * 8 + ["PENDING", "FAILED"]
+
+        def rows():
+            for buyer_id, plan_id in subscriptions:
+                for _ in range(per_subscription):
+                    yield Payment(
+                        buyer_id=buyer_id, plan_id=plan_id, amount=prices[plan_id], gateway="ES",
+                        transaction_id=str(uuid.UUID(int=self.rng.getrandbits(128))),
+                        status=self.rng.choice(statuses),
+                    )
+
+        self.bulk(Payment, rows(), "payments")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from guff.sessions import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Deletes expired database sessions in bounded batches (clearsessions in one statement locks SQLite)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="keep purging every --interval seconds")
+        parser.add_argument('--interval', type=float, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options['batch_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, batch_size):
+        started = time.monotonic()
+        total = batches = 0
+        for deleted in purge_expired(batch_size=batch_size):
+            total += deleted
+            batches += 1
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f"purged {total} expired sessions in {batches} batches, {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from guff import insights
+
+
+class Command(BaseCommand):
+    help = "Recomputes creator insights rollups from subscriptions and payments"
+
+    def handle(self, *args, **options):
+        plans, days = insights.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"rebuilt stats of {plans} active plans and {days} creator days"))
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from guff import search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the creator search index from scratch, run after bulk writes that skip signals"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = search.rebuild()
+        self.stdout.write(f"indexed {indexed} creators in {time.monotonic() - started:.2f}s")
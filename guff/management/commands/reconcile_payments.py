@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from api.esewa_status import EsewaStatusClient, reconcile_pending
+
+
+class Command(BaseCommand):
+    help = "Resolves stale PENDING payments by asking the eSewa transaction status API"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=30, help="minutes a payment must be PENDING for")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, help="parallel status requests (ESEWA_RECONCILE_CONCURRENCY)")
+        parser.add_argument('--status-url', help="status endpoint (ESEWA_STATUS_URL)")
+        parser.add_argument('--loop', action='store_true', help="keep reconciling every --interval seconds")
+        parser.add_argument('--interval', type=float, default=300)
+
+    def handle(self, *args, **options):
+        while True:
+            # async_to_sync keeps the ORM work on this thread's connection
+            async_to_sync(self.sweep)(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    async def sweep(self, options):
+        started = time.monotonic()
+        totals = {}
+        async with EsewaStatusClient(url=options['status_url'], concurrency=options['concurrency']) as client:
+            async for outcomes in reconcile_pending(
+                client, timedelta(minutes=options['older_than']), options['batch_size']
+            ):
+                for outcome, n in outcomes.items():
+                    totals[outcome] = totals.get(outcome, 0) + n
+                self.stdout.write(f"batch {outcomes}")
+        elapsed = time.monotonic() - started
+        total = sum(totals.values())
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f"reconciled {total} payments {totals} in {elapsed:.2f}s ({rate:.0f} payments/s)")
@@ -0,0 +1,122 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from guff.models import UserProfile, SubscriptionPlan, Payment
+from guff.querybudget import QueryBudget
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Drives the real URL routes through the test client and reports latency and queries per request"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="measured requests per endpoint")
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--only', nargs='*', help="only run endpoints whose name contains one of these")
+        parser.add_argument('--output', help="write results as json to this file")
+
+    def handle(self, *args, **options):
+        scenarios = self.scenarios()
+        if options['only']:
+            scenarios = [s for s in scenarios if any(o in s[0] for o in options['only'])]
+
+        results = []
+        for name, user, method, path in scenarios:
+            result = self.run(name, user, method, path, options['warmup'], options['requests'])
+            results.append(result)
+            self.stdout.write(
+                f"{name:<28} p50 {result['p50_ms']:7.2f}ms  p95 {result['p95_ms']:7.2f}ms  "
+                f"p99 {result['p99_ms']:7.2f}ms  {result['rps']:8.1f} req/s  "
+                f"{result['queries_per_request']:5.1f} queries/req"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    "revision": git_revision(),
+                    "timestamp": time.time(),
+                    "requests": options['requests'],
+                    "results": results,
+                }, f, indent=2)
+            self.stdout.write(f"wrote {options['output']}")
+
+    def scenarios(self):
+        """
+        Returns [(name, user or None, method, path)] built from rows already in the database
+        """
+        plan = SubscriptionPlan.objects.select_related('creator__user').order_by('id').first()
+        payment = Payment.objects.select_related('buyer__user').order_by('id').first()
+        if plan is None or payment is None:
+            raise CommandError("no data to benchmark, run `manage.py generate_data` first")
+        creator = plan.creator.user
+        buyer = (
+            UserProfile.objects.filter(is_creator=False, subscriptions__isnull=False)
+            .select_related('user').order_by('id').first().user
+        )
+        username = creator.username
+
+        return [
+            ("api me", buyer, "get", "/api/me/"),
+            ("api users", buyer, "get", f"/api/users/{username}/"),
+            ("api creator plans", buyer, "get", f"/api/creators/{username}/plans/"),
+            ("api plan details", buyer, "get", f"/api/plans/{plan.id}/"),
+            ("api subscriptions", buyer, "get", "/api/subscriptions/"),
+            ("api payment", buyer, "get", f"/api/payments/{payment.id}/"),
+            ("page landing", None, "get", "/"),
+            ("page creator profile", buyer, "get", f"/profile/{username}/"),
+            ("page user dashboard", buyer, "get", "/user/dashboard/"),
+            ("page creator dashboard", creator, "get", "/dashboard/"),
+            ("page success", buyer, "get", "/success/"),
+        ]
+
+    def run(self, name, user, method, path, warmup, requests):
+        client = Client(HTTP_HOST="localhost")
+        if user is not None:
+            client.force_login(user)
+        send = getattr(client, method)
+
+        for _ in range(warmup):
+            send(path)
+
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with QueryBudget() as budget:
+                request_started = time.perf_counter()
+                response = send(path)
+                latencies.append(time.perf_counter() - request_started)
+            queries.append(budget.count)
+            if response.status_code >= 400:
+                raise CommandError(f"{name}: {method.upper()} {path} returned {response.status_code}")
+        elapsed = time.perf_counter() - started
+
+        return {
+            "name": name,
+            "method": method.upper(),
+            "path": path,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "rps": requests / elapsed,
+            "queries_per_request": statistics.mean(queries),
+        }
@@ -0,0 +1,26 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.discord_sync import desired_members, sync_plan
+from guff.models import SubscriptionPlan
+
+
+class Command(BaseCommand):
+    help = "Reconciles discord roles of every plan with a discord integration"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', type=int, help="only sync this plan id")
+
+    def handle(self, *args, **options):
+        if not settings.DISCORD_BOT_TOKEN:
+            raise CommandError("DISCORD_BOT_TOKEN is not set")
+
+        plans = SubscriptionPlan.objects.filter(discord__isnull=False).select_related('discord')
+        if options['plan']:
+            plans = plans.filter(id=options['plan'])
+
+        for plan in plans:
+            result = asyncio.run(sync_plan(plan, desired_members(plan)))
+            self.stdout.write(f"plan {plan.id} guild {plan.discord.guild_id}: {result.as_dict()}")
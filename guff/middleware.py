@@ -0,0 +1,58 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.models import User
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+
+def get_profile(user):
+    """
+    Returns profile of user, raises Http404 like the get_object_or_404 lookups it replaces
+    """
+    try:
+        return user.userprofile
+    except (AttributeError, UserProfile.DoesNotExist):
+        raise Http404("No UserProfile matches the given query.")
+
+
+async def aget_profile(request):
+    """
+    Async views' request.profile: resolves the user with request.auser() and returns its profile |
+    raises Http404 like get_profile()
+    """
+    user = await request.auser()
+    if user.is_authenticated and not User.userprofile.related.is_cached(user):
+        # user didn't come through ProfileBackend's cache
+        profile = await UserProfile.objects.filter(user=user).afirst()
+        if profile is not None:
+            profile.user = user
+        User.userprofile.related.set_cached_value(user, profile)
+    return get_profile(user)
+
+
+class ProfileMiddleware:
+    """
+    Exposes the authenticated user's UserProfile as request.profile, resolved lazily |
+    must come after AuthenticationMiddleware. Async views use `await aget_profile(request)`,
+    this middleware only stays out of their way (no thread hop under ASGI).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # sync views running under ASGI still get the lazy attribute
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return await self.get_response(request)
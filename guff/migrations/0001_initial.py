@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subscription_bio', models.CharField(default='not provided', max_length=80)),
+                ('name', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('interval', models.CharField(choices=[('M', 'Monthly'), ('Y', 'Yearly')], max_length=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DiscordIntegration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guild_id', models.CharField(db_index=True, max_length=20)),
+                ('role_id', models.CharField(max_length=20)),
+                ('plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='discord', to='guff.subscriptionplan')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_creator', models.BooleanField(db_index=True, default=False)),
+                ('phone_number', models.CharField(max_length=15)),
+                ('discord_id', models.CharField(default='0', max_length=18)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='creator',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='plan', to='guff.userprofile'),
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('gateway', models.CharField(choices=[('ES', 'eSewa'), ('KH', 'Khalti')], max_length=2)),
+                ('transaction_id', models.CharField(max_length=50, unique=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SUCCESS', 'Success'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guff.subscriptionplan')),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='guff.userprofile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WhatsAppIntegration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_link', models.URLField()),
+                ('plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='whatsapp', to='guff.subscriptionplan')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(db_index=True, default=django.utils.timezone.now)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(db_index=True, default=False)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='guff.userprofile')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guff.subscriptionplan')),
+            ],
+            options={
+                'unique_together': {('buyer', 'plan')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guff', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['end_date'], name='usersub_active_end_idx'),
+        ),
+    ]
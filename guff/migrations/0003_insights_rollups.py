@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guff', '0002_usersubscription_active_end_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_subscribers', models.IntegerField(default=0)),
+                ('plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='guff.subscriptionplan')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CreatorDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('new_subscribers', models.IntegerField(default=0)),
+                ('churned_subscribers', models.IntegerField(default=0)),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='guff.userprofile')),
+            ],
+            options={
+                'unique_together': {('creator', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guff', '0003_insights_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['buyer', 'start_date', 'id'], name='usersub_buyer_start_idx'),
+        ),
+    ]
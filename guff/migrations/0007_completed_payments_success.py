@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def completed_to_success(apps, schema_editor):
+    # eSewa confirmations used to store "COMPLETED", which isn't a Payment status
+    for name in ("Payment", "ArchivedPayment"):
+        apps.get_model("guff", name).objects.filter(status="COMPLETED").update(status="SUCCESS")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guff', '0006_payment_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(completed_to_success, migrations.RunPython.noop),
+    ]
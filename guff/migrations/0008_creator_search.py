@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# guff/search.py | username, plan_name and bio are searched, plan_id is only returned. Usernames
+# get a table of their own so a username-only match doesn't scan plan and bio hits. Prefix
+# indexes make the usual type-ahead lengths a single doclist lookup.
+TOKENIZE = """tokenize = "unicode61 remove_diacritics 2", prefix = '2 3 4 6'"""
+CREATE = [
+    f"CREATE VIRTUAL TABLE guff_creator_search USING fts5(username, plan_name, bio, plan_id UNINDEXED, {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE guff_creator_search_usernames USING fts5(username, {TOKENIZE})",
+]
+FILL = [
+    """
+    INSERT INTO guff_creator_search (rowid, username, plan_name, bio, plan_id)
+    SELECT p.id, u.username, COALESCE(sp.name, ''), COALESCE(sp.subscription_bio, ''), sp.id
+    FROM guff_userprofile p
+    JOIN auth_user u ON u.id = p.user_id
+    LEFT JOIN guff_subscriptionplan sp ON sp.creator_id = p.id
+    WHERE p.is_creator
+    """,
+    "INSERT INTO guff_creator_search_usernames (rowid, username) SELECT rowid, username FROM guff_creator_search",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('guff', '0007_completed_payments_success'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE + FILL, ["DROP TABLE guff_creator_search_usernames", "DROP TABLE guff_creator_search"],
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# guff/search.py | usernames rowid = length(username) * 2**32 + profile id, so FTS5 returns the
+# shortest matching usernames first
+FORWARDS = [
+    "DELETE FROM guff_creator_search_usernames",
+    """
+    INSERT INTO guff_creator_search_usernames (rowid, username)
+    SELECT length(username) * 4294967296 + rowid, username FROM guff_creator_search
+    """,
+]
+BACKWARDS = [
+    "DELETE FROM guff_creator_search_usernames",
+    "INSERT INTO guff_creator_search_usernames (rowid, username) SELECT rowid, username FROM guff_creator_search",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guff', '0008_creator_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARDS, BACKWARDS),
+    ]
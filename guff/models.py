@@ -54,6 +54,13 @@ class UserSubscription(models.Model):
 
     class Meta:
         unique_together = ("buyer", "plan")
+        indexes = [
+            # range scan over active rows used by the expiry sweeper (guff/expiry.py) |
+            # partial rather than (is_active, end_date) since sqlite can't seek on a bare boolean
+            models.Index(fields=["end_date"], condition=models.Q(is_active=True), name="usersub_active_end_idx"),
+            # keyset pagination of a buyer's subscriptions (api/pagination.py)
+            models.Index(fields=["buyer", "start_date", "id"], name="usersub_buyer_start_idx"),
+        ]
 
     def __str__(self):
         return f"{self.buyer.user.username} → {self.plan.name}"
@@ -117,10 +124,70 @@ class Payment(models.Model):
     status = models.CharField(
         max_length=10,
         choices=STATUS_CHOICES,
-        default="PENDING",
-        db_index=True
+        default="PENDING"
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # stale PENDING scan of the reconciler (api/esewa_status.py), also covers lookups by status
+            models.Index(fields=["status", "created_at"], name="payment_status_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.buyer.user.username} paid {self.amount} via {self.gateway}"
+
+class ArchivedPayment(models.Model):
+    """
+    Cold copy of a Payment moved out of the hot table by guff/archive.py, keeps the original id
+    """
+    id = models.BigIntegerField(primary_key=True)
+    buyer = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="archived_payments"
+    )
+    plan = models.ForeignKey(SubscriptionPlan, on_delete=models.CASCADE, related_name="+")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    gateway = models.CharField(max_length=2, choices=Payment.GATEWAY_CHOICES)
+    transaction_id = models.CharField(max_length=50, unique=True)
+    status = models.CharField(max_length=10, choices=Payment.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.buyer.user.username} paid {self.amount} via {self.gateway} (archived)"
+
+class PlanStats(models.Model):
+    """
+    rollup of plan's active subscriber count, maintained by guff/insights.py
+    """
+    plan = models.OneToOneField(
+        SubscriptionPlan,
+        on_delete=models.CASCADE,
+        related_name="stats"
+    )
+    active_subscribers = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.plan.name}: {self.active_subscribers} active"
+
+class CreatorDailyStats(models.Model):
+    """
+    per creator, per day rollup of revenue, new and churned subscribers, maintained by guff/insights.py
+    """
+    creator = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name="daily_stats"
+    )
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    new_subscribers = models.IntegerField(default=0)
+    churned_subscribers = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("creator", "date")
+
+    def __str__(self):
+        return f"{self.creator.user.username} {self.date}"
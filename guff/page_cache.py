@@ -0,0 +1,103 @@
+"""
+Full-page cache for anonymous visitors of pages without per-user content.
+
+Views opt in with @cache_anonymous. PageCacheMiddleware sits in front of sessions, auth,
+csrf and messages and answers a GET from a client without a session (or messages) cookie
+straight from PAGE_CACHE_ALIAS, so marketing traffic never reaches the template engine.
+
+A response is only stored if nothing about it depends on the visitor: 200, no cookies set
+(a csrf token in the page sets one), no Vary: Cookie and nothing private. Keys carry
+DEPLOY_VERSION and the staticfiles manifest hash, so a deploy (new templates, new hashed
+asset names) starts from an empty cache without flushing anything.
+"""
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import cc_delim_re
+
+MESSAGES_COOKIE = "messages"
+
+
+def cache_anonymous(view):
+    """
+    Marks view as cacheable for anonymous visitors by PageCacheMiddleware
+    """
+    view.cache_anonymous = True
+    return view
+
+
+class PageCacheMiddleware:
+    """
+    Serves and stores @cache_anonymous pages | goes after SecurityMiddleware and before
+    SessionMiddleware, security headers are added to hits on the way out
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[settings.PAGE_CACHE_ALIAS]
+        self.version = f"{settings.DEPLOY_VERSION}:{getattr(staticfiles_storage, 'manifest_hash', '')}"
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def key(self, request):
+        return "page:" + hashlib.md5(f"{self.version}|{request.path}".encode(), usedforsecurity=False).hexdigest()
+
+    def anonymous(self, request):
+        return (
+            request.method in ("GET", "HEAD")
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and MESSAGES_COOKIE not in request.COOKIES
+        )
+
+    def cacheable(self, request, response):
+        view = getattr(request.resolver_match, "func", None)
+        if not getattr(view, "cache_anonymous", False):
+            return False
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        vary = {v.lower() for v in cc_delim_re.split(response.get("Vary", "")) if v}
+        cache_control = response.get("Cache-Control", "").lower()
+        return "cookie" not in vary and "*" not in vary and "private" not in cache_control and "no-store" not in cache_control
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.anonymous(request):
+            return self.get_response(request)
+        key = self.key(request)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return self.replay(hit)
+        response = self.get_response(request)
+        if self.cacheable(request, response):
+            self.cache.set(key, self.entry(response), settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    async def __acall__(self, request):
+        if not self.anonymous(request):
+            return await self.get_response(request)
+        key = self.key(request)
+        hit = await self.cache.aget(key)
+        if hit is not None:
+            return self.replay(hit)
+        response = await self.get_response(request)
+        if self.cacheable(request, response):
+            await self.cache.aset(key, self.entry(response), settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def entry(self, response):
+        return response.content, list(response.items())
+
+    def replay(self, entry):
+        content, headers = entry
+        response = HttpResponse(content)
+        for name, value in headers:
+            response.headers[name] = value
+        return response
@@ -0,0 +1,142 @@
+"""
+Password hashing off the event loop.
+
+PBKDF2 is tens of milliseconds of CPU per login or signup. Async views await averify_password()
+and amake_password(), which run the PBKDF2 rounds in a process pool of PASSWORD_POOL_WORKERS,
+so the loop keeps serving other requests and logins use every core instead of one worker's.
+Sync views keep using django's hashers in the request thread.
+
+TunablePBKDF2PasswordHasher takes its cost from PASSWORD_PBKDF2_ITERATIONS. Django's
+check_password (and averify_password here) rehash a stored password on the next successful
+login whenever its iteration count differs, so changing the setting migrates users as they log in.
+"""
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_SUFFIX_LENGTH, PBKDF2PasswordHasher, get_hasher, identify_hasher,
+    is_password_usable, make_password,
+)
+from django.utils.crypto import constant_time_compare, get_random_string
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pbkdf2(password, salt, iterations, digest):
+    """
+    Runs in the pool | same result as PBKDF2PasswordHasher.encode's hash part
+    """
+    dk = hashlib.pbkdf2_hmac(digest, password.encode(), salt.encode(), iterations)
+    return base64.b64encode(dk).decode("ascii").strip()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawned, forked children would inherit the parent's threads and db connections
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _executor
+
+
+def _discard(executor):
+    """
+    Drops a broken pool so the next _pool() starts a new one
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def offload(func, *args):
+    executor = _pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # a worker died (killed, out of memory): every pending call fails, retry once in a new pool
+        _discard(executor)
+        return await asyncio.get_running_loop().run_in_executor(_pool(), func, *args)
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    pbkdf2_sha256 with PASSWORD_PBKDF2_ITERATIONS rounds (django's default when unset),
+    verifies hashes of any iteration count and has async variants that run in the pool
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+    async def aencode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        hash = await offload(pbkdf2, password, salt, iterations, self.digest().name)
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
+
+    async def averify(self, password, encoded):
+        decoded = self.decode(encoded)
+        encoded_2 = await self.aencode(password, decoded["salt"], decoded["iterations"])
+        return constant_time_compare(encoded, encoded_2)
+
+
+async def amake_password(password):
+    """
+    make_password() with the default hasher's rounds in the pool
+    """
+    hasher = get_hasher("default")
+    if password is None or not hasattr(hasher, "aencode"):
+        return await sync_to_async(make_password)(password)
+    return await hasher.aencode(password, hasher.salt())
+
+
+async def averify_password(password, encoded):
+    """
+    django's verify_password() with the rounds in the pool | returns (is_correct, must_update)
+    """
+    fake_runtime = password is None or not is_password_usable(encoded)
+    preferred = get_hasher("default")
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        fake_runtime = True
+
+    if fake_runtime:
+        # same time as checking a real password, see django's verify_password
+        await amake_password(get_random_string(UNUSABLE_PASSWORD_SUFFIX_LENGTH))
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    if hasattr(hasher, "averify"):
+        is_correct = await hasher.averify(password, encoded)
+    else:
+        is_correct = await sync_to_async(hasher.verify)(password, encoded)
+
+    if not is_correct and not hasher_changed and must_update:
+        await sync_to_async(hasher.harden_runtime)(password, encoded)
+    return is_correct, must_update
+
+
+async def acheck_password(user, password):
+    """
+    user.check_password() for async views: verifies in the pool and stores a rehash with the
+    current cost when the stored one is outdated
+    """
+    is_correct, must_update = await averify_password(password, user.password)
+    if is_correct and must_update:
+        user.password = await amake_password(password)
+        await user.asave(update_fields=["password"])
+    return is_correct
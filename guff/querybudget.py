@@ -0,0 +1,116 @@
+"""
+Records SQL run on the database connections and enforces query budgets.
+
+    with QueryBudget(max_queries=3) as budget:
+        client.get('/api/me/')
+    budget.count, budget.duplicates, budget.total_time
+
+    @query_budget(max_queries=3)
+    def test_me(self): ...
+"""
+import functools
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+# transaction bookkeeping, not round trips a view asked for
+IGNORED_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget:
+    """
+    Context manager that records every query run on `using` |
+    raises QueryBudgetExceeded on exit if max_queries, max_duplicates or max_time (seconds) is exceeded
+
+    :param using: database alias, defaults to every alias in settings.DATABASES (replicas included)
+    """
+
+    def __init__(self, max_queries=None, max_duplicates=None, max_time=None, using=None, label=None):
+        self.max_queries = max_queries
+        self.max_duplicates = max_duplicates
+        self.max_time = max_time
+        self.using = using
+        self.label = label
+        self.queries = []
+        self._wrappers = None
+
+    def _record(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not sql.lstrip().upper().startswith(IGNORED_PREFIXES):
+                self.queries.append((sql, repr(params), time.perf_counter() - started))
+
+    def __enter__(self):
+        aliases = [self.using] if self.using is not None else list(connections)
+        wrapped = []
+        self._wrappers = ExitStack()
+        for alias in aliases:
+            connection = connections[alias]
+            # test mirrors can share the default connection, count their queries once
+            if any(connection is other for other in wrapped):
+                continue
+            wrapped.append(connection)
+            self._wrappers.enter_context(connection.execute_wrapper(self._record))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._wrappers.__exit__(exc_type, exc, tb)
+        if exc_type is None:
+            self.check()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(q[2] for q in self.queries)
+
+    @property
+    def duplicates(self):
+        """
+        Returns {sql: times executed} for statements run more than once with the same params
+        """
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return {sql: n for (sql, _), n in counts.items() if n > 1}
+
+    def report(self):
+        lines = [
+            f"{self.label or 'queries'}: {self.count} queries, "
+            f"{len(self.duplicates)} duplicated, {self.total_time * 1000:.2f}ms"
+        ]
+        lines += [f"  {i}. {sql}" for i, (sql, _, _) in enumerate(self.queries, start=1)]
+        lines += [f"  duplicated x{n}: {sql}" for sql, n in self.duplicates.items()]
+        return "\n".join(lines)
+
+    def check(self):
+        errors = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            errors.append(f"{self.count} queries > budget of {self.max_queries}")
+        if self.max_duplicates is not None and len(self.duplicates) > self.max_duplicates:
+            errors.append(f"{len(self.duplicates)} duplicated queries > budget of {self.max_duplicates}")
+        if self.max_time is not None and self.total_time > self.max_time:
+            errors.append(f"{self.total_time:.3f}s db time > budget of {self.max_time}s")
+        if errors:
+            raise QueryBudgetExceeded("; ".join(errors) + "\n" + self.report())
+
+
+def query_budget(max_queries=None, max_duplicates=None, max_time=None, using=None):
+    """
+    Decorator that runs the wrapped test (or function) inside a QueryBudget
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with QueryBudget(max_queries, max_duplicates, max_time, using, label=func.__qualname__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
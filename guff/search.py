@@ -0,0 +1,173 @@
+"""
+Creator discovery: an SQLite FTS5 index over creators' usernames, plan names and bios.
+
+One row per creator in guff_creator_search (rowid = UserProfile.id) and in
+guff_creator_search_usernames (rowid = length(username) * SHORTNESS + UserProfile.id, see
+migration 0009), created by migration 0008.
+The signals in guff/signals.py reindex a creator whenever their user, profile or plan is saved
+or deleted, in the same transaction as the write. Bulk writes skip signals, run
+`manage.py rebuild_search_index` after them.
+
+Every query is a prefix query on its last word, so the same search serves full results and
+autocomplete as the user types. Results are ranked by where the words matched (username, then
+plan name, then bio) and then by username length, so the closest usernames come first.
+
+bm25 isn't used: its idf pass reads the whole doclist of every term, tens of milliseconds for a
+two letter prefix over 100k creators. Each query ranks a bounded set of candidates instead,
+`manage.py bench_search` measures it:
+- the creator whose username is the text, if any
+- the MAX_CANDIDATES shortest usernames matching, FTS5 returns them first since the usernames
+  table's rowid starts with the username's length
+- the first MAX_CANDIDATES plan name or bio matches in index order, so with more of those a
+  better plan name match can be left out
+"""
+import re
+
+from django.db import connections, router
+
+from .models import UserProfile
+
+TABLE = "guff_creator_search"
+USERNAMES = "guff_creator_search_usernames"
+# username and plan name/bio matches ranked per query, see above
+MAX_CANDIDATES = 200
+# USERNAMES rowid = length(username) * SHORTNESS + profile id
+SHORTNESS = 1 << 32
+
+_WORDS = re.compile(r"\w+")
+
+_INDEX_SQL = f"""
+    INSERT INTO {TABLE} (rowid, username, plan_name, bio, plan_id)
+    SELECT p.id, u.username, COALESCE(sp.name, ''), COALESCE(sp.subscription_bio, ''), sp.id
+    FROM guff_userprofile p
+    JOIN auth_user u ON u.id = p.user_id
+    LEFT JOIN guff_subscriptionplan sp ON sp.creator_id = p.id
+    WHERE p.is_creator
+"""
+_INDEX_USERNAMES_SQL = (
+    f"INSERT INTO {USERNAMES} (rowid, username) SELECT length(username) * {SHORTNESS} + rowid, username FROM {TABLE}"
+)
+_UNINDEX_USERNAMES_SQL = (
+    f"DELETE FROM {USERNAMES} WHERE rowid IN (SELECT length(username) * {SHORTNESS} + rowid FROM {TABLE} WHERE rowid IN"
+)
+
+
+def match_expression(text):
+    """
+    Returns the FTS5 query for text, every word must match and the last one as a prefix | None
+    when text has no words
+    """
+    words = _WORDS.findall(text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def _cursor(for_write=False):
+    alias = (router.db_for_write if for_write else router.db_for_read)(UserProfile)
+    return connections[alias].cursor()
+
+
+def _reindex(condition, params):
+    profiles = f"SELECT p.id FROM guff_userprofile p WHERE {condition}"
+    with _cursor(for_write=True) as cursor:
+        # the usernames rows are found through the old usernames, before those are gone
+        cursor.execute(f"{_UNINDEX_USERNAMES_SQL} ({profiles}))", params)
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({profiles})", params)
+        cursor.execute(f"{_INDEX_SQL} AND {condition}", params)
+        cursor.execute(f"{_INDEX_USERNAMES_SQL} WHERE rowid IN ({profiles})", params)
+
+
+def index_creator(profile_id):
+    """
+    Replaces the index rows of a profile with its current user, profile and plan, drops them when
+    the profile isn't a creator
+    """
+    _reindex("p.id = %s", [profile_id])
+
+
+def index_user(user_id):
+    """
+    Same as index_creator() for the profile of user_id, if it has one
+    """
+    _reindex("p.user_id = %s", [user_id])
+
+
+def unindex_creator(profile_id):
+    with _cursor(for_write=True) as cursor:
+        cursor.execute(f"{_UNINDEX_USERNAMES_SQL} (%s))", [profile_id])
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [profile_id])
+
+
+def rebuild():
+    """
+    Reindexes every creator, returns how many there are
+    """
+    with _cursor(for_write=True) as cursor:
+        for table, fill in ((TABLE, _INDEX_SQL), (USERNAMES, _INDEX_USERNAMES_SQL)):
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(fill)
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search(text, limit=10):
+    """
+    Returns the best limit creators for text as [{"username", "plan", "plan_name", "bio"}]
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    # highlight() marks matched words with \x01, tier 0 = username, 1 = plan name, 2 = bio
+    with _cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT username, plan_id, plan_name, bio FROM (
+                SELECT c.rowid AS id, c.username, c.plan_id, c.plan_name, c.bio, 0 AS tier
+                FROM auth_user u
+                JOIN guff_userprofile p ON p.user_id = u.id
+                JOIN {TABLE} c ON c.rowid = p.id
+                WHERE u.username IN (%s, %s)
+                UNION ALL
+                SELECT * FROM (
+                    SELECT c.rowid AS id, c.username, c.plan_id, c.plan_name, c.bio, 0 AS tier
+                    FROM (SELECT rowid FROM {USERNAMES} WHERE {USERNAMES} MATCH %s ORDER BY rowid LIMIT %s) u
+                    JOIN {TABLE} c ON c.rowid = u.rowid %% {SHORTNESS}
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT rowid AS id, username, plan_id, plan_name, bio, CASE
+                        WHEN instr(highlight({TABLE}, 0, char(1), ''), char(1)) THEN 0
+                        WHEN instr(highlight({TABLE}, 1, char(1), ''), char(1)) THEN 1
+                        ELSE 2 END AS tier
+                    FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT %s
+                )
+            ) GROUP BY id ORDER BY MIN(tier), length(username), username LIMIT %s
+            """,
+            [text.strip(), text.strip().lower(), expression, MAX_CANDIDATES, expression, MAX_CANDIDATES, limit],
+        )
+        return [
+            {"username": username, "plan": plan_id, "plan_name": plan_name, "bio": bio}
+            for username, plan_id, plan_name, bio in cursor.fetchall()
+        ]
+
+
+def complete(text, limit=10):
+    """
+    Returns up to limit creator usernames matching text, shortest first | "alice_draws" is the
+    words alice and draws, so "ali" and "draw" both complete to it
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    with _cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT username FROM (
+                SELECT username FROM {USERNAMES} WHERE {USERNAMES} MATCH %s ORDER BY rowid LIMIT %s
+            ) ORDER BY length(username), username LIMIT %s
+            """,
+            [expression, MAX_CANDIDATES, limit],
+        )
+        return [username for username, in cursor.fetchall()]
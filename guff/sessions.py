@@ -0,0 +1,225 @@
+"""
+Cached sessions with write-behind to the database.
+
+Reads are served from the cache like django's cached_db engine, but writes don't hit
+the database in the request: the cache is updated right away and the row is queued,
+then a background flush upserts (or deletes) every queued session in one statement
+every SESSION_WRITE_BEHIND_INTERVAL seconds or SESSION_WRITE_BEHIND_BATCH sessions.
+Logins stop contending for SQLite's single writer and authenticated requests with a
+warm cache cost no session query.
+
+The cache is the source of truth until a flush, so it must be shared by all workers
+(see CACHES), and a crash loses at most one interval of session writes, which only
+means those users log in again.
+
+purge_expired() deletes expired rows in bounded batches for `manage.py purge_sessions`.
+
+usage: SESSION_ENGINE = "guff.sessions"
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, VALID_KEY_CHARS
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger("django.contrib.sessions")
+
+KEY_PREFIX = "guff.sessions"
+NOT_QUEUED = object()
+
+
+class WriteBehind:
+    """
+    Queue of session writes, last write per key wins | None queued for a key means delete
+    """
+
+    def __init__(self, interval, batch):
+        self.interval = interval
+        self.batch = batch
+        self.pending = {}
+        self.lock = threading.Lock()
+        # flushes run one at a time so an older write never lands after a newer one
+        self.flush_lock = threading.Lock()
+        self.timer = None
+
+    def put(self, session_key, row):
+        # the flush always runs on a timer thread, never in the request (or on the event loop)
+        with self.lock:
+            self.pending[session_key] = row
+            full = len(self.pending) >= self.batch
+            if self.timer is not None and full:
+                self.timer.cancel()
+                self.timer = None
+            self._schedule(0 if full else self.interval)
+
+    def _schedule(self, delay):
+        # called with self.lock held
+        if self.timer is None:
+            self.timer = threading.Timer(delay, self.flush_in_thread)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def queued(self, session_key):
+        """
+        Returns the queued row of session_key, None for a queued delete, NOT_QUEUED if there is neither
+        """
+        with self.lock:
+            return self.pending.get(session_key, NOT_QUEUED)
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return pending
+
+    def flush(self):
+        """
+        Writes every queued session, returns number of sessions written or deleted
+        """
+        with self.flush_lock:
+            pending = self.take()
+            if not pending:
+                return 0
+            deleted = [key for key, row in pending.items() if row is None]
+            saved = [
+                Session(session_key=key, session_data=row[0], expire_date=row[1])
+                for key, row in pending.items() if row is not None
+            ]
+            try:
+                if saved:
+                    Session.objects.bulk_create(
+                        saved, update_conflicts=True, unique_fields=['session_key'],
+                        update_fields=['session_data', 'expire_date'],
+                    )
+                if deleted:
+                    Session.objects.filter(session_key__in=deleted).delete()
+            except Exception:
+                logger.exception("Error flushing %d sessions, requeued", len(pending))
+                with self.lock:
+                    for key, row in pending.items():
+                        self.pending.setdefault(key, row)
+                    # retried without waiting for another put
+                    self._schedule(self.interval)
+                raise
+            return len(pending)
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            # requeued and rescheduled by flush()
+            pass
+        finally:
+            connection.close()
+
+
+write_behind = WriteBehind(
+    getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', 1.0),
+    getattr(settings, 'SESSION_WRITE_BEHIND_BATCH', 500),
+)
+atexit.register(write_behind.flush_in_thread)
+
+
+class SessionStore(CachedDBStore):
+    """
+    cached_db session store whose database writes go through write_behind
+    """
+    cache_key_prefix = KEY_PREFIX
+
+    def create(self):
+        # cache.add() claims a fresh key atomically, skipping cached_db's exists() query
+        while True:
+            self._session_key = get_random_string(32, VALID_KEY_CHARS)
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def load(self):
+        row = write_behind.queued(self.session_key)
+        if row is NOT_QUEUED:
+            return super().load()
+        return self._load_queued(row)
+
+    def exists(self, session_key):
+        row = write_behind.queued(session_key)
+        if row is NOT_QUEUED:
+            return super().exists(session_key)
+        return row is not None
+
+    def _load_queued(self, row):
+        # a queued write is newer than the database row and than a cache miss: a queued delete
+        # (logout) must not be brought back from the row it is about to remove
+        if row is None or row[1] <= timezone.now():
+            self._session_key = None
+            return {}
+        return self.decode(row[0])
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        age = self.get_expiry_age()
+        if must_create:
+            if not self._cache.add(self.cache_key, data, age):
+                raise CreateError
+        else:
+            self._cache.set(self.cache_key, data, age)
+        write_behind.put(self.session_key, (self.encode(data), self.get_expiry_date()))
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+        write_behind.put(session_key, None)
+
+    async def aload(self):
+        row = write_behind.queued(self.session_key)
+        if row is NOT_QUEUED:
+            return await super().aload()
+        return self._load_queued(row)
+
+    async def aexists(self, session_key):
+        row = write_behind.queued(session_key)
+        if row is NOT_QUEUED:
+            return await super().aexists(session_key)
+        return row is not None
+
+    # cache and queue only, nothing here blocks the event loop on the database
+    async def acreate(self):
+        return self.create()
+
+    async def asave(self, must_create=False):
+        return self.save(must_create)
+
+    async def adelete(self, session_key=None):
+        return self.delete(session_key)
+
+
+def purge_expired(now=None, batch_size=1000):
+    """
+    Deletes expired sessions batch by batch on the expire_date index | yields rows deleted per batch
+    """
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .order_by('expire_date').values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                return
+            Session.objects.filter(session_key__in=keys).delete()
+        yield len(keys)
@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from api import plan_cache
+
+from . import search
+from .backends import forget_user
+from .models import UserProfile, SubscriptionPlan
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    forget_user(instance.user_id)
+
+
+# creator search index (guff/search.py), updated in the writing transaction
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # a new user has no profile yet, logins only touch last_login
+    if not created and (update_fields is None or "username" in update_fields):
+        search.index_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "is_creator" in update_fields:
+        search.index_creator(instance.pk)
+
+
+@receiver(post_delete, sender=UserProfile)
+def profile_deleted(sender, instance, **kwargs):
+    search.unindex_creator(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=SubscriptionPlan)
+def plan_changed(sender, instance, **kwargs):
+    search.index_creator(instance.creator_id)
+
+
+# plan reads (api/plan_cache.py) cache whether a profile is a creator and the creator's username
+@receiver(pre_save, sender=User)
+def user_renaming(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and "username" not in update_fields):
+        return
+    old = User.objects.filter(pk=instance.pk).values_list('username', 'userprofile__plan__id').first()
+    if old is None or old[0] == instance.username:
+        return
+    username, plan_id = old
+    keys = [plan_cache.creator_key(username), plan_cache.creator_key(instance.username)]
+    if plan_id is not None:
+        keys.append(plan_cache.plan_key(plan_id))
+    plan_cache.invalidate(*keys)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved_plans(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "is_creator" in update_fields:
+        plan_cache.invalidate(plan_cache.creator_key(instance.user.username))
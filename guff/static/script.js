@@ -40,6 +40,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(message || `HTTP error! status: ${response.status}`);
             }
             return response.json();
+        },
+
+        // Several API calls in one round trip (POST /api/batch/), resolves to [{status, body}] in order
+        async batch(requests, { parallel = false } = {}) {
+            const data = await this.request('/api/batch/', {
+                method: 'POST',
+                body: JSON.stringify({ requests, parallel })
+            });
+            return data.responses;
         }
     };
 
@@ -175,8 +184,15 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// Page data rendered by the view with json_script, saves a round trip to the API
+function readBootstrap() {
+    const el = document.getElementById('bootstrap-data');
+    return el ? JSON.parse(el.textContent) : {};
+}
+
 async function initDashboard(apiClient) {
-    const planId = window.DASHBOARD_DATA ? window.DASHBOARD_DATA.planId : null;
+    const plan = readBootstrap().plan;
+    const planId = plan ? plan.id : null;
 
     let integrationStates = { discord: false, whatsapp: false };
 
@@ -244,14 +260,13 @@ async function initDashboard(apiClient) {
         document.getElementById(id).classList.add('active');
     }
 
-    // Initialize Plan Display if ID exists
-    if (planId) {
-        loadAndDisplayPlan(planId);
+    // Initialize Plan Display if plan exists
+    if (plan) {
+        displayPlan(plan);
     }
 
-    async function loadAndDisplayPlan(id) {
+    function displayPlan(plan) {
         try {
-            const plan = await apiClient.request(`/api/plans/${id}/`);
             document.getElementById('display-plan-name').textContent = plan.name;
             document.getElementById('display-plan-bio').textContent = plan.subscription_bio;
             document.getElementById('display-plan-price').textContent = plan.price;
@@ -502,11 +517,11 @@ async function initSignup(apiClient) {
     });
 }
 async function initCreatorProfileV2(apiClient) {
-    const planId = document.body.getAttribute('data-plan-id');
-    if (!planId) return;
+    const { plan: data, subscription } = readBootstrap();
+    if (!data) return;
+    const planId = data.id;
 
     try {
-        const data = await apiClient.request(`/api/plans/${planId}/`);
 
         // Update header
         const titleEl = document.getElementById('community-name-title');
@@ -578,6 +593,11 @@ async function initCreatorProfileV2(apiClient) {
     // eSewa Subscribe Action
     const subscribeBtn = document.getElementById('subscribe-btn');
     if (subscribeBtn) {
+        // Already subscribed, paying again renews
+        if (subscription && subscription.active) {
+            subscribeBtn.textContent = `Subscribed until ${subscription.end_date} · Renew via esewa`;
+        }
+
         subscribeBtn.addEventListener('click', async () => {
             subscribeBtn.classList.add('loading');
             subscribeBtn.disabled = true;
@@ -0,0 +1,235 @@
+"""
+Static asset pipeline: minified, content-hashed and precompressed files served with immutable caching.
+
+`manage.py collectstatic` runs CompressedManifestStorage over STATIC_ROOT:
+css and js are minified, every file gets a content hash in its name (styles.css ->
+styles.3f1c9a.css, url()s inside css are rewritten too) and text assets get .gz and .br
+siblings. {% static %} resolves to the hashed names through the manifest.
+
+StaticFilesMiddleware serves STATIC_ROOT without going through the rest of the stack:
+the precompressed variant the client accepts, hashed names with a year long immutable
+Cache-Control so browsers never revalidate them, anything else with a short max-age.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    # in requirements.txt, an environment without it only loses the .br variants
+    brotli = None
+
+MINIFIED = (".css", ".js")
+COMPRESSED = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map", ".xml")
+# skip a compressed variant that saves less than this
+MIN_SAVING = 0.05
+EXTENSIONS = {"gzip": ".gz", "br": ".br"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/|\s+', re.S)
+# no space is dropped before ":", "a :hover" and "a:hover" are different selectors
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*|(:)\s+")
+
+
+def minify_css(css):
+    """
+    Drops comments and collapses whitespace, strings are left alone
+    """
+    def token(match):
+        if match.group(1):
+            return match.group(1)
+        return "" if match.group(0).startswith("/*") else " "
+
+    # only the parts outside strings get their punctuation tightened
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', _CSS_TOKENS.sub(token, css))
+    css = "".join(part if i % 2 else _CSS_PUNCTUATION.sub(r"\1\2", part) for i, part in enumerate(parts))
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    """
+    Line based, so ASI and regex literals are never touched: strips indentation, blank lines and
+    whole-line // comments, template literals are kept verbatim
+    """
+    lines, in_template = [], False
+    for line in js.splitlines():
+        if in_template:
+            lines.append(line)
+        elif (stripped := line.strip()) and not stripped.startswith("//"):
+            lines.append(stripped)
+        if len(re.findall(r"(?<!\\)`", line)) % 2:
+            in_template = not in_template
+    return "\n".join(lines) + "\n"
+
+
+def compress(content):
+    """
+    Returns {encoding: compressed bytes} for the encodings that are worth serving
+    """
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, quality=11)
+    return {
+        encoding: data for encoding, data in variants.items()
+        if len(data) <= len(content) * (1 - MIN_SAVING)
+    }
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that minifies before hashing and writes precompressed variants after
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name in paths:
+            if name.endswith(MINIFIED):
+                self.minify(name)
+                # hash (and rewrite urls in) the minified copy, not the source file
+                paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSED) and self.exists(name):
+                for encoding in self.precompress(name):
+                    yield name, name + EXTENSIONS[encoding], True
+
+    def minify(self, name):
+        with self.open(name) as f:
+            source = f.read().decode()
+        minified = (minify_css if name.endswith(".css") else minify_js)(source)
+        self.delete(name)
+        self._save(name, ContentFile(minified.encode()))
+
+    def precompress(self, name):
+        with self.open(name) as f:
+            variants = compress(f.read())
+        for encoding, data in variants.items():
+            compressed = name + EXTENSIONS[encoding]
+            if self.exists(compressed):
+                self.delete(compressed)
+            self._save(compressed, ContentFile(data))
+        return variants
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic hasn't run (tests, fresh checkout), fall back to the plain name
+            return name
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.mtime = int(os.stat(path).st_mtime)
+        self.immutable = immutable
+        self.encodings = [e for e in ("br", "gzip") if os.path.exists(path + EXTENSIONS[e])]
+
+    def pick(self, accept_encoding):
+        """
+        Returns (path, encoding or None) of the best variant for an Accept-Encoding header
+        """
+        accepted = {
+            token.split(";")[0].strip() for token in accept_encoding.split(",")
+            if not token.replace(" ", "").endswith(";q=0")
+        }
+        for encoding in self.encodings:
+            if encoding in accepted:
+                return self.path + EXTENSIONS[encoding], encoding
+        return self.path, None
+
+
+def index_static_root(root, immutable_names):
+    """
+    Returns {url name: StaticFile} for every file in root, precompressed variants are
+    attached to the file they belong to
+    """
+    files = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(tuple(EXTENSIONS.values())):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            files[name] = StaticFile(path, name in immutable_names)
+    return files
+
+
+class StaticFilesMiddleware:
+    """
+    Serves collected files under STATIC_URL straight from STATIC_ROOT | goes right after
+    SecurityMiddleware. Indexes STATIC_ROOT once at startup, restart after collectstatic.
+    Not used without a collected STATIC_ROOT or with STATIC_URL on another host (a CDN).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        root, url = settings.STATIC_ROOT, settings.STATIC_URL
+        if not root or not os.path.isdir(root) or "://" in url or url.startswith("//"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = "/" + url.strip("/") + "/"
+        hashed = getattr(staticfiles_storage, "hashed_files", {})
+        self.files = index_static_root(root, set(hashed.values()))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def find(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return None
+        return self.files.get(request.path[len(self.prefix):])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        static_file = self.find(request)
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(request, static_file, lambda path: FileResponse(open(path, "rb")))
+
+    async def __acall__(self, request):
+        static_file = self.find(request)
+        if static_file is None:
+            return await self.get_response(request)
+        # FileResponse's sync iterator would be drained in a thread anyway, read the file there in one go
+        return await sync_to_async(self.serve)(
+            request, static_file, lambda path: HttpResponse(open(path, "rb").read())
+        )
+
+    def serve(self, request, static_file, respond):
+        not_modified = get_conditional_response(request, last_modified=static_file.mtime)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            path, encoding = static_file.pick(request.headers.get("Accept-Encoding", ""))
+            response = respond(path)
+            response.headers.pop("Content-Disposition", None)
+            response.headers["Content-Type"] = static_file.content_type
+            response.headers["Content-Length"] = str(os.path.getsize(path))
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+        if static_file.encodings:
+            response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Last-Modified"] = http_date(static_file.mtime)
+        response.headers["Cache-Control"] = (
+            IMMUTABLE if static_file.immutable else f"public, max-age={settings.STATIC_MAX_AGE}"
+        )
+        return response
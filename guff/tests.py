@@ -1,3 +1,781 @@
-from django.test import TestCase
+import base64
+import contextvars
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from api import invites
+from api import urls as api_urls
+from api.discord_fake import FakeDiscord, FakeDiscordServer
+from guff import urls as guff_urls
+from guff import insights
+from guff.archive import archive_payments
+from guff.backends import profile_cache_key
+from guff.db import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinMiddleware
+from guff.expiry import expire_subscriptions
+from guff.models import (
+    UserProfile, SubscriptionPlan, UserSubscription, DiscordIntegration, WhatsAppIntegration, Payment,
+    ArchivedPayment, PlanStats, CreatorDailyStats
+)
+from guff.querybudget import QueryBudget
+from guff import search
+from guff import passwords
+from guff.passwords import amake_password, averify_password
+from guff.sessions import SessionStore, purge_expired, write_behind
+from guff import throttling
+from guff.throttling import take
+
+# past api/pagination.py's DEFAULT_LIMIT, an extra query per row blows every budget many times over
+CREATORS = 120
+SUBSCRIBERS = 150
+PAYMENTS = 200
+
+# "<METHOD> <route>": max queries with cold caches against the dataset in setUpTestData |
+# list endpoints must not grow with CREATORS / SUBSCRIBERS / PAYMENTS
+BUDGETS = {
+    "GET api/test/": 0,
+    "POST api/batch/": 5,
+    # the group link, once per plan and process
+    "GET api/integrations/whatsapp/invite/<str:token>/": 1,
+    "GET api/search/": 3,
+    "GET api/search/complete/": 3,
+    "GET api/throttles/": 2,
+    "GET api/me/": 2,
+    "GET api/users/<str:username>/": 3,
+    "GET api/creators/<str:username>/plans/": 4,
+    "GET api/creators/<str:username>/insights/": 4,
+    "GET api/exports/subscribers.<str:fmt>": 3,
+    "GET api/exports/payments.<str:fmt>": 4,
+    # plan writes reindex the creator for search (guff/search.py)
+    "POST api/plans/": 10,
+    "GET api/plans/<str:plan_id>/": 3,
+    "PATCH api/plans/<str:plan_id>/": 8,
+    "GET api/subscriptions/": 3,
+    "POST api/subscriptions/": 5,
+    "DELETE api/subscriptions/<str:id>/": 9,
+    "POST api/payments/initiate/": 4,
+    "GET api/payments/<str:id>/": 1,
+    "POST api/integrations/discord/link/": 4,
+    "POST api/integrations/discord/sync/": 4,
+    "DELETE api/integrations/discord/unlink/": 4,
+    "POST api/integrations/whatsapp/link/": 4,
+    "DELETE api/integrations/whatsapp/unlink/": 4,
+    "GET api/webhook/esewa/": 9,
+    "GET main/": 0,
+    "GET signup/": 0,
+    "GET login/": 0,
+    "POST login/": 5,
+    "POST logout/": 4,
+    "GET contacts/": 0,
+    "GET dashboard/": 3,
+    "GET ": 0,
+    # plan and subscription status are inlined (guff/bootstrap.py) instead of fetched by script.js
+    "GET profile/<str:username>/": 4,
+    "GET user/dashboard/": 3,
+    "GET subscription/": 2,
+    "GET tos/": 0,
+    "GET privacy/": 0,
+    "GET success/": 3,
+}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.password = make_password("pass")
+        cls.creator = cls.make_profile("creator", is_creator=True)
+        cls.plan = SubscriptionPlan.objects.create(creator=cls.creator, name="club", price=100, interval="M")
+        DiscordIntegration.objects.create(plan=cls.plan, guild_id="1", role_id="9")
+        WhatsAppIntegration.objects.create(plan=cls.plan, group_link="https://chat.whatsapp.com/x")
+
+        cls.new_creator = cls.make_profile("newcreator", is_creator=True)
+        cls.buyer = cls.make_profile("buyer")
+
+        plans = []
+        for i in range(CREATORS):
+            profile = cls.make_profile(f"creator{i}", is_creator=True)
+            plans.append(SubscriptionPlan.objects.create(creator=profile, name=f"plan{i}", price=10, interval="M"))
+        UserSubscription.objects.bulk_create(
+            UserSubscription(buyer=cls.buyer, plan=plan, is_active=True) for plan in plans
+        )
+        Payment.objects.bulk_create(
+            Payment(buyer=cls.buyer, plan=plans[i % CREATORS], amount=10, gateway="ES",
+                    transaction_id=f"tx{i}", status="SUCCESS")
+            for i in range(PAYMENTS)
+        )
+        cls.pending = Payment.objects.create(
+            buyer=cls.buyer, plan=cls.plan, amount=100, gateway="ES", transaction_id="pending"
+        )
+
+        subscribers = [cls.make_profile(f"sub{i}", discord_id=str(1000 + i)) for i in range(SUBSCRIBERS)]
+        UserSubscription.objects.bulk_create(
+            UserSubscription(buyer=profile, plan=cls.plan, is_active=True) for profile in subscribers
+        )
+
+    @classmethod
+    def make_profile(cls, username, **fields):
+        user = User.objects.create(username=username, password=cls.password)
+        return UserProfile.objects.create(user=user, phone_number="9800000000", **fields)
+
+    def setUp(self):
+        cache.clear()
+
+    def check(self, key, user=None, path=None, data=None, **extra):
+        method, route = key.split(" ", 1)
+        if user is not None:
+            self.client.force_login(user.user)
+            cache.clear()
+        path = "/" + (path or route)
+        send = getattr(self.client, method.lower())
+        if method in ("POST", "PATCH", "DELETE") and path.startswith("/api/"):
+            extra.setdefault("content_type", "application/json")
+            data = json.dumps(data or {})
+
+        with QueryBudget(max_queries=BUDGETS[key], max_duplicates=0, label=key) as budget:
+            response = send(path, data, **extra) if data is not None else send(path, **extra)
+            if response.streaming:
+                # streamed bodies query while they are consumed
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{key} -> {response.status_code}\n{budget.report()}")
+        return response
+
+    def test_every_route_has_a_budget(self):
+        routes = {f"api/{p.pattern}" for p in api_urls.urlpatterns} | {str(p.pattern) for p in guff_urls.urlpatterns}
+        budgeted = {key.split(" ", 1)[1] for key in BUDGETS}
+        self.assertEqual(routes - budgeted, set())
+
+    def test_throttles(self):
+        admin = self.make_profile("admin")
+        User.objects.filter(pk=admin.user_id).update(is_staff=True)
+        self.check("GET api/throttles/", admin)
+
+    def test_search(self):
+        self.check("GET api/search/", self.buyer, "api/search/?q=creator")
+
+    def test_search_complete(self):
+        self.check("GET api/search/complete/", self.buyer, "api/search/complete/?q=cre")
+
+    def test_whatsapp_invite(self):
+        token = invites.issue(UserSubscription(plan=self.plan, buyer=self.buyer))
+        invites.clear_local()
+        self.check("GET api/integrations/whatsapp/invite/<str:token>/", path=f"api/integrations/whatsapp/invite/{token}/")
+
+    def test_api_test(self):
+        self.check("GET api/test/")
+
+    def test_batch(self):
+        # the dashboard's reads in one request, the session and profile are loaded once
+        self.check("POST api/batch/", self.creator, data={"requests": [
+            {"path": "/api/me/"},
+            {"path": f"/api/plans/{self.plan.id}/"},
+            {"path": "/api/creators/creator/plans/"},
+        ]})
+
+    def test_me(self):
+        self.check("GET api/me/", self.buyer)
+
+    def test_getuser(self):
+        self.check("GET api/users/<str:username>/", self.buyer, "api/users/creator/")
+
+    def test_getplans(self):
+        self.check("GET api/creators/<str:username>/plans/", self.buyer, "api/creators/creator/plans/")
+
+    def test_insights(self):
+        self.check("GET api/creators/<str:username>/insights/", self.creator, "api/creators/creator/insights/")
+
+    def test_export_subscribers(self):
+        self.check("GET api/exports/subscribers.<str:fmt>", self.creator, "api/exports/subscribers.csv")
+
+    def test_export_payments(self):
+        self.check("GET api/exports/payments.<str:fmt>", self.creator, "api/exports/payments.ndjson")
+
+    def test_create_plan(self):
+        self.check("POST api/plans/", self.new_creator, data={"name": "new", "price": "5", "interval": "M"})
+
+    def test_plan_details(self):
+        self.check("GET api/plans/<str:plan_id>/", self.buyer, f"api/plans/{self.plan.id}/")
+
+    def test_update_plan(self):
+        self.check("PATCH api/plans/<str:plan_id>/", self.creator, f"api/plans/{self.plan.id}/", {"name": "renamed"})
+
+    def test_list_subscriptions(self):
+        self.check("GET api/subscriptions/", self.buyer)
+
+    def test_subscribe(self):
+        self.check("POST api/subscriptions/", self.buyer, data={"plan": self.plan.id})
+
+    def test_cancel_subscription(self):
+        sub = UserSubscription.objects.filter(buyer=self.buyer).first()
+        self.check("DELETE api/subscriptions/<str:id>/", self.buyer, f"api/subscriptions/{sub.id}/")
+
+    def test_initiate_payment(self):
+        self.check("POST api/payments/initiate/", self.buyer, data={"plan_id": self.plan.id})
+
+    def test_get_payment(self):
+        self.check("GET api/payments/<str:id>/", path=f"api/payments/{self.pending.id}/")
+
+    def test_link_discord(self):
+        plan = SubscriptionPlan.objects.get(name="plan0")
+        self.check("POST api/integrations/discord/link/", plan.creator,
+                   data={"plan_id": plan.id, "guild_id": "2", "role_id": "3"})
+
+    def test_sync_discord(self):
+        fake = FakeDiscord()
+        with FakeDiscordServer(fake) as base_url, override_settings(DISCORD_API_BASE=base_url, DISCORD_BOT_TOKEN="t"):
+            self.check("POST api/integrations/discord/sync/", self.creator)
+
+    def test_unlink_discord(self):
+        self.check("DELETE api/integrations/discord/unlink/", self.creator)
+
+    def test_link_whatsapp(self):
+        plan = SubscriptionPlan.objects.get(name="plan0")
+        self.check("POST api/integrations/whatsapp/link/", plan.creator,
+                   data={"plan_id": plan.id, "group_link": "https://chat.whatsapp.com/y"})
+
+    def test_unlink_whatsapp(self):
+        self.check("DELETE api/integrations/whatsapp/unlink/", self.creator)
+
+    def test_esewa_hook(self):
+        data = base64.b64encode(json.dumps({"transaction_uuid": "pending", "status": "COMPLETE"}).encode()).decode()
+        self.check("GET api/webhook/esewa/", path=f"api/webhook/esewa/?data={data}")
+
+    def test_main(self):
+        self.check("GET main/")
+
+    def test_signup_page(self):
+        self.check("GET signup/")
+
+    def test_login_page(self):
+        self.check("GET login/")
+
+    def test_login(self):
+        self.check("POST login/", data={"username": "buyer", "password": "pass"})
+
+    def test_logout(self):
+        self.check("POST logout/", self.buyer)
+
+    def test_contacts(self):
+        self.check("GET contacts/")
+
+    def test_dashboard(self):
+        self.check("GET dashboard/", self.creator)
+
+    def test_landing(self):
+        self.check("GET ")
+
+    def test_creator_profile(self):
+        self.check("GET profile/<str:username>/", self.buyer, "profile/creator/")
+
+    def test_user_dashboard(self):
+        self.check("GET user/dashboard/", self.buyer)
+
+    def test_subscription(self):
+        self.check("GET subscription/", self.buyer)
+
+    def test_tos(self):
+        self.check("GET tos/")
+
+    def test_privacy(self):
+        self.check("GET privacy/")
+
+    def test_success(self):
+        self.check("GET success/", self.buyer)
+
+
+def esewa_data(transaction_uuid, status="COMPLETE"):
+    return base64.b64encode(json.dumps({"transaction_uuid": transaction_uuid, "status": status}).encode()).decode()
+
+
+class InsightsTests(TestCase):
+    def setUp(self):
+        self.creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(creator=self.creator, name="club", price=100, interval="M")
+        self.buyers = [UserProfile.objects.create(user=User.objects.create(username=f"b{i}")) for i in range(2)]
+
+    def pay(self, buyer, transaction_id):
+        Payment.objects.create(buyer=buyer, plan=self.plan, amount=100, gateway="ES", transaction_id=transaction_id)
+        self.client.get("/api/webhook/esewa/", {"data": esewa_data(transaction_id)})
+
+    def snapshot(self):
+        return (
+            list(PlanStats.objects.values_list('plan_id', 'active_subscribers')),
+            list(CreatorDailyStats.objects.order_by('date').values_list(
+                'date', 'revenue', 'new_subscribers', 'churned_subscribers')),
+        )
+
+    def test_rollups_follow_payments_cancellation_and_expiry(self):
+        today = timezone.localdate()
+        self.pay(self.buyers[0], "t1")
+        self.pay(self.buyers[1], "t2")
+        self.pay(self.buyers[0], "t3")
+        self.assertEqual(self.snapshot(), ([(self.plan.id, 2)], [(today, 300, 2, 0)]))
+
+        self.client.force_login(self.buyers[1].user)
+        sub = UserSubscription.objects.get(buyer=self.buyers[1])
+        self.client.delete(f"/api/subscriptions/{sub.id}/")
+        UserSubscription.objects.filter(buyer=self.buyers[0]).update(end_date=today - timedelta(days=1))
+        self.assertEqual(sum(expire_subscriptions()), 1)
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental, (
+            [(self.plan.id, 0)],
+            [(today - timedelta(days=1), 0, 0, 1), (today, 300, 2, 1)],
+        ))
+        insights.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        self.client.force_login(self.creator.user)
+        response = self.client.get("/api/creators/creator/insights/?days=7")
+        self.assertEqual(response.json()["active_subscribers"], 0)
+        self.assertEqual(response.json()["daily"][-1]["revenue"], "300.00")
+        self.assertEqual(self.client.get("/api/creators/b0/insights/").status_code, 403)
+
+    def test_rebuild_keeps_only_the_current_period_of_a_reactivated_subscription(self):
+        today = timezone.localdate()
+        self.pay(self.buyers[0], "t1")
+        self.client.force_login(self.buyers[0].user)
+        sub = UserSubscription.objects.get(buyer=self.buyers[0])
+        self.client.delete(f"/api/subscriptions/{sub.id}/")
+        self.pay(self.buyers[0], "t2")
+        self.assertEqual(self.snapshot(), ([(self.plan.id, 1)], [(today, 200, 2, 1)]))
+
+        # the first activation and its cancellation are not on record anymore
+        insights.rebuild()
+        self.assertEqual(self.snapshot(), ([(self.plan.id, 1)], [(today, 200, 1, 0)]))
+
+
+class GenerateDataTests(TestCase):
+    def test_expired_share_follows_the_flags(self):
+        call_command(
+            "generate_data", creators=10, subscribers=300, subscriptions=4, payments=0, expired=0.3, unswept=0.25,
+            stdout=io.StringIO(),
+        )
+        today = timezone.localdate()
+        subscriptions = UserSubscription.objects.all()
+        ended = subscriptions.filter(end_date__lt=today)
+        self.assertEqual(subscriptions.count(), 1200)
+        self.assertAlmostEqual(ended.count() / 1200, 0.3, delta=0.05)
+        self.assertAlmostEqual(ended.filter(is_active=True).count() / ended.count(), 0.25, delta=0.07)
+        self.assertFalse(subscriptions.filter(end_date__gte=today, is_active=False).exists())
+        self.assertFalse(subscriptions.exclude(end_date=F("start_date") + timedelta(days=30)).exists())
+
+
+class ArchiveTests(TestCase):
+    def test_moves_payments_past_retention_in_batches(self):
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        now = timezone.now()
+        ages = {
+            "old-failed": ("FAILED", 8), "new-failed": ("FAILED", 1),
+            "abandoned": ("PENDING", 3), "pending": ("PENDING", 0),
+            "old-paid": ("SUCCESS", 400), "paid": ("SUCCESS", 30),
+        }
+        for transaction_id, (status, days) in ages.items():
+            payment = Payment.objects.create(
+                buyer=buyer, plan=plan, amount=100, gateway="ES", transaction_id=transaction_id, status=status
+            )
+            Payment.objects.filter(id=payment.id).update(created_at=now - timedelta(days=days))
+        insights.rebuild()
+        before = list(CreatorDailyStats.objects.order_by('date').values_list('date', 'revenue'))
+
+        self.assertEqual(list(archive_payments(now=now, batch_size=2)), [2, 1])
+        self.assertEqual(
+            set(Payment.objects.values_list('transaction_id', flat=True)), {"new-failed", "pending", "paid"}
+        )
+        archived = ArchivedPayment.objects.get(transaction_id="old-paid")
+        self.assertEqual(self.client.get(f"/api/payments/{archived.id}/").json()["status"], "SUCCESS")
+
+        insights.rebuild()
+        self.assertEqual(list(CreatorDailyStats.objects.order_by('date').values_list('date', 'revenue')), before)
+
+
+@override_settings(SESSION_ENGINE="guff.sessions")
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # flushed by hand on this thread, a timer thread wouldn't see the test transaction
+        interval, write_behind.interval = write_behind.interval, 3600
+        self.addCleanup(setattr, write_behind, "interval", interval)
+        self.addCleanup(write_behind.take)
+
+    def test_writes_are_batched_and_reads_skip_the_database(self):
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        self.client.force_login(buyer.user)
+        self.assertFalse(Session.objects.exists())
+        # login cycles the key, the old one is queued as a delete
+        self.assertEqual(write_behind.flush(), 2)
+
+        key = self.client.session.session_key
+        self.assertEqual(Session.objects.get(session_key=key).get_decoded()["_auth_user_id"], str(buyer.user.id))
+        self.client.get("/api/me/")
+        with QueryBudget() as budget:
+            self.assertEqual(self.client.get("/api/me/").status_code, 200)
+        # the session comes from the cache, only the user's auth columns are read (guff/backends.py)
+        self.assertEqual([sql.split(" FROM ")[1].split()[0] for sql, _, _ in budget.queries], ['"auth_user"'])
+
+        # the cache is lost, the store falls back to the flushed row
+        cache.clear()
+        self.assertEqual(SessionStore(key).load()["_auth_user_id"], str(buyer.user.id))
+
+        self.client.logout()
+        write_behind.flush()
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+
+    def test_logout_ends_the_session_before_and_after_the_flush(self):
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        self.client.force_login(buyer.user)
+        write_behind.flush()
+        key = self.client.session.session_key
+
+        # the delete is queued, the row is still there and the cache entry is gone
+        self.client.logout()
+        self.assertTrue(Session.objects.filter(session_key=key).exists())
+        self.assertEqual(SessionStore(key).load(), {})
+        self.assertFalse(SessionStore().exists(key))
+        self.assertEqual(async_to_sync(SessionStore(key).aload)(), {})
+
+        write_behind.flush()
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        self.assertEqual(SessionStore(key).load(), {})
+
+    def test_sessions_logged_in_with_model_backend_stay_logged_in(self):
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        self.client.force_login(buyer.user, backend="django.contrib.auth.backends.ModelBackend")
+        self.assertEqual(self.client.get("/api/me/").json()["username"], "buyer")
+
+    def test_failed_flush_is_rescheduled(self):
+        write_behind.put("k" * 32, None)
+        write_behind.take()
+        write_behind.pending["k" * 32] = ("", timezone.now())
+        with mock.patch.object(Session.objects, "bulk_create", side_effect=DatabaseError("locked")):
+            with self.assertRaises(DatabaseError):
+                write_behind.flush()
+        self.assertIn("k" * 32, write_behind.pending)
+        self.assertIsNotNone(write_behind.timer)
+
+    def test_purge_expired_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(session_key=f"s{i}", session_data="", expire_date=now + timedelta(days=i - 5)) for i in range(8)
+        )
+        self.assertEqual(list(purge_expired(now=now, batch_size=2)), [2, 2, 1])
+        self.assertEqual(Session.objects.count(), 3)
+
+
+class ProfileBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = UserProfile.objects.create(user=User.objects.create_user(username="buyer", password="old"))
+        self.client.force_login(self.buyer.user)
+        self.assertEqual(self.client.get("/api/me/").status_code, 200)
+
+    def test_cache_holds_no_password_and_sessions_follow_the_database(self):
+        fields = cache.get(profile_cache_key(self.buyer.user_id))
+        self.assertEqual(fields["user"]["username"], "buyer")
+        self.assertEqual(fields["profile"]["id"], self.buyer.id)
+        self.assertNotIn("password", fields["user"])
+
+        # another worker changes the password, this one's cache entry is left as it was
+        User.objects.filter(id=self.buyer.user_id).update(password=make_password("new"))
+        self.assertEqual(cache.get(profile_cache_key(self.buyer.user_id)), fields)
+        self.assertEqual(self.client.get("/api/me/").status_code, 403)
+
+    def test_deactivation_applies_while_cached(self):
+        User.objects.filter(id=self.buyer.user_id).update(is_active=False)
+        self.assertEqual(self.client.get("/api/me/").status_code, 403)
+
+
+class QueryBudgetDatabasesTests(TestCase):
+    # replicas (GUFF_DB_REPLICAS) included
+    databases = "__all__"
+
+    def test_counts_queries_on_every_database(self):
+        with QueryBudget() as budget:
+            for alias in connections:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("SELECT %s", [alias])
+        self.assertEqual([params for _, params, _ in budget.queries], [repr([alias]) for alias in connections])
+        with QueryBudget(using="default") as budget:
+            for alias in connections:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("SELECT %s", [alias])
+        self.assertEqual(budget.count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica0"])
+class DatabaseRouterTests(SimpleTestCase):
+    def run_request(self, view, path="/", **cookies):
+        request = RequestFactory().get(path)
+        request.COOKIES.update(cookies)
+        return contextvars.copy_context().run(ReplicaPinMiddleware(view), request)
+
+    def test_reads_follow_writes_to_default(self):
+        router = PrimaryReplicaRouter()
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(User))
+            if "write" in request.GET:
+                router.db_for_write(User)
+            seen.append(router.db_for_read(User))
+            return HttpResponse()
+
+        response = self.run_request(view, "/?write")
+        self.assertEqual(seen, ["replica0", "default"])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # the next request of the same client is pinned, another client's isn't
+        seen.clear()
+        self.run_request(view, **{PIN_COOKIE: "1"})
+        self.run_request(view)
+        self.assertEqual(seen, ["default", "default", "replica0", "replica0"])
+
+
+class SQLiteSetupTests(TestCase):
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(STATIC_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_hashed_minified_precompressed_and_immutable(self):
+        page = self.client.get("/").content.decode()
+        path = next(p for p in page.split('"') if p.startswith("/static/styles.") and p.endswith(".css"))
+        self.assertNotEqual(path, "/static/styles.css")
+
+        plain = self.client.get(path)
+        source = open("guff/static/styles.css", "rb").read()
+        body = b"".join(plain.streaming_content)
+        self.assertLess(len(body), len(source))
+        self.assertNotIn(b"/*", body)
+        self.assertEqual(plain["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(plain["Vary"], "Accept-Encoding")
+
+        compressed = self.client.get(path, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(compressed["Content-Type"], "text/css")
+        self.assertEqual(gzip.decompress(b"".join(compressed.streaming_content)), body)
+
+        self.assertEqual(self.client.get("/static/styles.css")["Cache-Control"], "public, max-age=60")
+        self.assertEqual(self.client.get("/static/missing.css").status_code, 404)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_rendered_once_per_deploy(self):
+        first = self.client.get("/tos/")
+        self.assertTemplateUsed(first, "guff/tos.html")
+        second = self.client.get("/tos/?utm_source=ad")
+        self.assertEqual(second.templates, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["X-Frame-Options"], first["X-Frame-Options"])
+
+        # pages with a csrf token or a session never come from the cache
+        self.client.get("/login/")
+        self.assertTemplateUsed(self.client.get("/login/"), "guff/login.html")
+        self.client.force_login(User.objects.create(username="buyer"))
+        self.assertTemplateUsed(self.client.get("/tos/"), "guff/tos.html")
+
+        with override_settings(DEPLOY_VERSION="next"):
+            self.assertTemplateUsed(Client().get("/tos/"), "guff/tos.html")
+
+
+class BootstrapTests(TestCase):
+    def test_pages_inline_plan_and_subscription(self):
+        cache.clear()
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        WhatsAppIntegration.objects.create(plan=plan, group_link="https://chat.whatsapp.com/x")
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        UserSubscription.objects.create(
+            buyer=buyer, plan=plan, is_active=True, end_date=timezone.localdate() + timedelta(days=30)
+        )
+
+        self.client.force_login(buyer.user)
+        response = self.client.get("/profile/creator/")
+        self.assertEqual(response.context["bootstrap"]["plan"], self.client.get(f"/api/plans/{plan.id}/").json())
+        self.assertTrue(response.context["bootstrap"]["subscription"]["active"])
+        self.assertContains(response, '<script id="bootstrap-data" type="application/json">')
+
+        self.client.force_login(creator.user)
+        plan_data = self.client.get("/dashboard/").context["bootstrap"]["plan"]
+        self.assertEqual((plan_data["id"], plan_data["whatsapp_state"], plan_data["discord_state"]), (plan.id, True, False))
+
+
+@override_settings(THROTTLES={
+    "login": {"ip": (20, 60), "user": (5, 60)},
+    "payment": {"user": (2, 60)},
+    "burst": {"ip": (3, 3), "global": (10, 1)},
+})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills_at_its_rate(self):
+        idents = {"ip": "10.0.0.1", "global": ""}
+        self.assertEqual([take("burst", idents, now=100) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(take("burst", idents, now=100), 1.0)
+        # a token a second, the refused request didn't take one
+        self.assertEqual(take("burst", idents, now=101), 0)
+        self.assertAlmostEqual(take("burst", idents, now=101), 1.0)
+        # another address has its own bucket
+        self.assertEqual(take("burst", {"ip": "10.0.0.2", "global": ""}, now=101), 0)
+
+    def test_counter_evicted_between_add_and_incr(self):
+        throttle_cache = throttling._cache()
+        with mock.patch.object(throttle_cache, "add", return_value=False):
+            throttling._count(throttle_cache, "login", "allowed")
+        self.assertEqual(throttling.counters()["login"]["allowed"], 1)
+
+    def test_login_is_throttled_per_username(self):
+        User.objects.create_user(username="buyer", password="pass")
+        for _ in range(5):
+            response = self.client.post("/login/", {"username": "Buyer", "password": "wrong"})
+            self.assertEqual(response.status_code, 401)
+        response = self.client.post("/login/", {"username": "buyer ", "password": "pass"})
+        self.assertEqual(response.status_code, 429)
+        # 5 tokens a minute, one every 12s
+        self.assertIn(int(response["Retry-After"]), range(1, 13))
+        self.assertEqual(self.client.post("/login/", {"username": "other", "password": "x"}).status_code, 401)
+        self.assertEqual(self.client.get("/login/").status_code, 200)
+
+    def test_payment_initiation_is_throttled_per_user(self):
+        creator = UserProfile.objects.create(user=User.objects.create(username="creator"), is_creator=True)
+        plan = SubscriptionPlan.objects.create(creator=creator, name="club", price=100, interval="M")
+        buyer = UserProfile.objects.create(user=User.objects.create(username="buyer"))
+        self.client.force_login(buyer.user)
+        statuses = [
+            self.client.post("/api/payments/initiate/", {"plan_id": plan.id}, content_type="application/json").status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses[2], 429)
+        self.assertNotIn(429, statuses[:2])
+
+        admin = User.objects.create(username="admin", is_staff=True)
+        self.client.force_login(admin)
+        counts = self.client.get("/api/throttles/").json()
+        self.assertEqual(counts["payment"]["allowed"], 2)
+        self.assertEqual(counts["payment"]["throttled:user"], 1)
+        self.assertEqual(counts["login"]["allowed"], 0)
+
+
+class PasswordTests(TestCase):
+    def test_cost_change_rehashes_on_next_login(self):
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = User.objects.create_user(username="buyer", password="secret")
+        UserProfile.objects.create(user=user)
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(async_to_sync(averify_password)("secret", user.password), (True, True))
+            self.assertEqual(async_to_sync(averify_password)("wrong", user.password), (False, True))
+            self.client.post("/login/", {"username": "buyer", "password": "secret"})
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(user.check_password("secret"))
+
+
+    def test_broken_pool_is_replaced(self):
+        async_to_sync(amake_password)("secret")
+        broken = passwords._pool()
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        self.assertTrue(async_to_sync(amake_password)("secret").startswith("pbkdf2_sha256$"))
+        self.assertIsNot(passwords._pool(), broken)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.alice = UserProfile.objects.create(user=User.objects.create(username="alice_draws"), is_creator=True)
+        self.plan = SubscriptionPlan.objects.create(
+            creator=self.alice, name="Sketch club", subscription_bio="weekly drawing lessons", price=100, interval="M"
+        )
+        bob = UserProfile.objects.create(user=User.objects.create(username="bob"), is_creator=True)
+        SubscriptionPlan.objects.create(creator=bob, name="Drawing tips", price=50, interval="M")
+        UserProfile.objects.create(user=User.objects.create(username="alicefan"))
+
+    def usernames(self, text):
+        return [hit["username"] for hit in search.search(text)]
+
+    def test_ranked_prefix_search(self):
+        # a username hit outranks a plan name hit, which outranks a bio hit
+        self.assertEqual(self.usernames("draw"), ["alice_draws", "bob"])
+        self.assertEqual(self.usernames("Sketch cl"), ["alice_draws"])
+        self.assertEqual(search.search("lessons")[0], {
+            "username": "alice_draws", "plan": self.plan.id, "plan_name": "Sketch club", "bio": "weekly drawing lessons",
+        })
+        # subscribers aren't creators
+        self.assertEqual(search.complete("ali"), ["alice_draws"])
+        # only usernames, bob's plan says drawing
+        self.assertEqual(search.complete("draw"), ["alice_draws"])
+        self.assertEqual(self.usernames('" OR *'), [])
+
+    def test_exact_and_short_usernames_beyond_the_candidates(self):
+        # created first, so the first MAX_CANDIDATES matches in profile order are all alice_NNN
+        profiles = UserProfile.objects.bulk_create(
+            UserProfile(user=user, is_creator=True) for user in User.objects.bulk_create(
+                User(username=f"alice_{i:03}") for i in range(search.MAX_CANDIDATES + 50)
+            )
+        )
+        UserProfile.objects.create(user=User.objects.create(username="alice"), is_creator=True)
+        UserProfile.objects.create(user=User.objects.create(username="alicia"), is_creator=True)
+        search.rebuild()
+        self.assertGreater(UserProfile.objects.get(user__username="alice").id, profiles[-1].id)
+
+        self.assertEqual(self.usernames("alice")[:1], ["alice"])
+        self.assertEqual(self.usernames("Alice")[:1], ["alice"])
+        self.assertEqual(self.usernames("ali")[:2], ["alice", "alicia"])
+        self.assertEqual(search.complete("ali", limit=3), ["alice", "alicia", "alice_000"])
+
+        # a rename moves the creator along the shortness order
+        user = User.objects.get(username="alice_249")
+        user.username = "al"
+        user.save()
+        self.assertEqual(search.complete("al", limit=2), ["al", "alice"])
+        self.assertNotIn("alice_249", search.complete("alice_2", limit=100))
+
+    def test_index_follows_writes(self):
+        self.plan.name = "Ink club"
+        self.plan.save()
+        self.assertEqual(self.usernames("ink"), ["alice_draws"])
+        self.alice.user.username = "alice_inks"
+        self.alice.user.save()
+        self.assertEqual(search.complete("alice"), ["alice_inks"])
+        self.plan.delete()
+        self.assertEqual(self.usernames("ink"), ["alice_inks"])
+        self.alice.delete()
+        self.assertEqual(self.usernames("alice"), [])
+
+        UserProfile.objects.filter(user__username="alicefan").update(is_creator=True)
+        self.assertEqual(search.rebuild(), 2)
+        self.assertEqual(search.complete("alice"), ["alicefan"])
@@ -0,0 +1,175 @@
+"""
+Token bucket throttles for the expensive entry points: login and signup (password hashing)
+and payment initiation (a Payment row per call).
+
+THROTTLES maps a scope to buckets per dimension, each (capacity, period in seconds): a bucket
+holds up to capacity tokens and refills at capacity/period per second, so bursts up to capacity
+pass and the sustained rate is capped.
+
+    'login': {'ip': (20, 60), 'user': (5, 60), 'global': (100, 1)}
+
+A request takes one token from every bucket it falls in (its ip, its user, the global one) or
+none at all, and gets a 429 with Retry-After when one of them is empty. Buckets live in
+THROTTLE_CACHE_ALIAS; the read-modify-write is serialized per process, so with a cache shared
+by several workers a burst can overshoot by at most one token per worker.
+
+DRF views use a ScopedBucketThrottle subclass in @throttle_classes, plain views @throttle(scope).
+Allowed/throttled counts per scope and dimension are kept in the same cache, see counters().
+"""
+import functools
+import logging
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "throttle:"
+DIMENSIONS = ("ip", "user", "global")
+
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def client_ip(request):
+    """
+    Returns the client's address, taken from X-Forwarded-For only behind THROTTLE_NUM_PROXIES proxies
+    """
+    num_proxies = settings.THROTTLE_NUM_PROXIES
+    if num_proxies:
+        forwarded = [a.strip() for a in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if a.strip()]
+        if len(forwarded) >= num_proxies:
+            return forwarded[-num_proxies]
+    return request.META.get("REMOTE_ADDR")
+
+
+def _count(cache, scope, outcome):
+    key = f"{KEY_PREFIX}count:{scope}:{outcome}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # evicted since the add
+            cache.set(key, 1, None)
+
+
+def take(scope, idents, now=None):
+    """
+    Takes a token from each of scope's buckets, all or none | returns seconds until the request
+    would be allowed, 0 if it is
+
+    :param idents: {dimension: ident}, dimensions without a limit or with a None ident are skipped
+    """
+    limits = settings.THROTTLES.get(scope, {})
+    buckets = {
+        dim: (f"{KEY_PREFIX}{scope}:{dim}:{ident}", *limits[dim])
+        for dim, ident in idents.items() if dim in limits and ident is not None
+    }
+    if not buckets:
+        return 0
+    now = time.time() if now is None else now
+    cache = _cache()
+
+    with _lock:
+        states = cache.get_many([key for key, _, _ in buckets.values()])
+        wait, blocked, updated = 0.0, [], {}
+        for dim, (key, capacity, period) in buckets.items():
+            rate = capacity / period
+            tokens, stamp = states.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / rate)
+                blocked.append(dim)
+            updated[key] = (tokens - 1, now)
+        if not blocked:
+            # an untouched bucket is full again after its period
+            cache.set_many(updated, max(period for _, _, period in buckets.values()))
+        for outcome in [f"throttled:{dim}" for dim in blocked] or ["allowed"]:
+            _count(cache, scope, outcome)
+
+    if blocked:
+        logger.warning("throttled %s on %s, retry in %.1fs", scope, ", ".join(blocked), wait)
+    return wait
+
+
+def counters():
+    """
+    Returns {scope: {"allowed": n, "throttled:<dimension>": n}} since the cache was last cleared
+    """
+    outcomes = ["allowed"] + [f"throttled:{dim}" for dim in DIMENSIONS]
+    keys = {f"{KEY_PREFIX}count:{scope}:{o}": (scope, o) for scope in settings.THROTTLES for o in outcomes}
+    values = _cache().get_many(list(keys))
+    stats = {scope: dict.fromkeys(outcomes, 0) for scope in settings.THROTTLES}
+    for key, value in values.items():
+        scope, outcome = keys[key]
+        stats[scope][outcome] = value
+    return stats
+
+
+def posted_username(request):
+    """
+    Per-user ident of login attempts: the account being logged into, whoever tries it
+    """
+    return request.POST.get("username", "").strip().lower()
+
+
+def too_many_requests(wait):
+    response = JsonResponse({"status": "error", "message": "too many requests, try again later"}, status=429)
+    response.headers["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def throttle(scope, user=None):
+    """
+    Throttles POSTs to a plain django view, GETs (rendering the form) are never throttled
+
+    :param user: callable returning the per-user ident of a request, e.g. the username being logged into
+    """
+    def refused(request):
+        if request.method == "POST":
+            wait = take(scope, {"ip": client_ip(request), "user": user(request) if user else None, "global": ""})
+            if wait:
+                return too_many_requests(wait)
+        return None
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            # async views (guff/async_views.py) | take() holds a lock around cache calls that may go
+            # over the network, so it runs in a thread instead of on the event loop
+            @functools.wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                return await sync_to_async(refused)(request) or await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapped(request, *args, **kwargs):
+                return refused(request) or view(request, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
+class ScopedBucketThrottle(BaseThrottle):
+    """
+    DRF throttle over THROTTLES[scope], per ip, per authenticated user and global
+    """
+    scope = None
+
+    def allow_request(self, request, view):
+        user = request.user.pk if request.user and request.user.is_authenticated else None
+        self.retry_after = take(self.scope, {"ip": client_ip(request), "user": user, "global": ""})
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class PaymentThrottle(ScopedBucketThrottle):
+    scope = "payment"
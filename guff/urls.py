@@ -1,16 +1,20 @@
+from django.conf import settings
 from django.urls import path
 from . import views 
+from . import async_views
+
+pages = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('main/', views.main, name="main"),
-    path('signup/', views.signup, name="signup"),
-    path('login/', views.login_view, name="login"),
+    path('signup/', pages.signup, name="signup"),
+    path('login/', pages.login_view, name="login"),
     path('logout/', views.logout_view, name="logout"),
     path('contacts/', views.contacts, name="contacts"),
     path('dashboard/', views.dashboard, name="dashboard"),
     path('', views.landing, name="landing"),
-    path('profile/<str:username>/', views.creator_profile, name="creator_profile"),
-    path('user/dashboard/', views.user_dashboard, name="user_dashboard"),
+    path('profile/<str:username>/', pages.creator_profile, name="creator_profile"),
+    path('user/dashboard/', pages.user_dashboard, name="user_dashboard"),
     path('subscription/', views.subscription, name="subscription"),
     path('tos/', views.tos, name="tos"),
     path('privacy/', views.privacy, name="privacy"),
@@ -5,14 +5,20 @@ from django.contrib.auth.models import User
 from .models import UserProfile, SubscriptionPlan, WhatsAppIntegration, DiscordIntegration
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
+from api import invites
+from .bootstrap import PROFILE_PLAN_RELATED, active_subscription, plan_data, subscription_data
+from .page_cache import cache_anonymous
+from .throttling import posted_username, throttle
 
 # Create your views here.
+@cache_anonymous
 def main(request):
     return render(request, 'guff/main.html')
 
+@throttle('login', user=posted_username)
 def login_view(request):
     if request.user.is_authenticated:
-        profile = get_object_or_404(UserProfile, user=request.user)
+        profile = request.profile
         if profile.is_creator:
             return redirect('dashboard')
         else:
@@ -35,7 +41,7 @@ def login_view(request):
                 'message': 'invalid credentials'
             }, status=401)
         login(request, user)
-        profile = get_object_or_404(UserProfile, user=user)
+        profile = request.profile
         if profile.is_creator:
             return redirect('dashboard')
         else:
@@ -50,6 +56,7 @@ def logout_view(request):
             return redirect('landing')
     return redirect('login')
 
+@throttle('signup')
 def signup(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
@@ -80,7 +87,7 @@ def signup(request):
                 phone_number=phone_number,
                 is_creator=is_creator
             )
-            login(request, user)
+            login(request, user, backend='guff.backends.ProfileBackend')
             if is_creator:
                 return redirect('dashboard')
             else:
@@ -99,12 +106,13 @@ def user_profile(request, id):
 
 def subscribe(request):
     ...
+@cache_anonymous
 def contacts(request):
     return render(request, "guff/contacts.html")
 
 @login_required(login_url='login')
 def user_dashboard(request):
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = request.profile
     if profile.is_creator:
         return redirect('dashboard')
     
@@ -118,34 +126,40 @@ def user_dashboard(request):
     
 @login_required(login_url='login')
 def dashboard(request):
-    creator = get_object_or_404(UserProfile, user=request.user)
+    creator = request.profile
     if creator.is_creator:
-        plan = getattr(creator, 'plan', None)
+        plan = (
+            SubscriptionPlan.objects.select_related('creator__user', 'discord', 'whatsapp')
+            .filter(creator=creator).first()
+        )
         return render(request, 'guff/dashboard.html', {
-            'plan_id': plan.id if plan else None
+            'plan_id': plan.id if plan else None,
+            'bootstrap': {"plan": plan_data(plan)},
         })
     else:
         return redirect('user_dashboard')
 
+@cache_anonymous
 def landing(request):
     return render(request, "guff/landing.html")
 
 @login_required(login_url='login')
 def creator_profile(request, username):
-    user = get_object_or_404(UserProfile, user__username=username)
+    user = get_object_or_404(UserProfile.objects.select_related(*PROFILE_PLAN_RELATED), user__username=username)
 
     if not user.is_creator:
         return redirect('user_dashboard')
 
-    plan = SubscriptionPlan.objects.filter(creator=user).first()
+    plan = getattr(user, 'plan', None)
+    subscription = active_subscription(request.profile, plan).first() if plan else None
 
     return render(request, "guff/creator_profile.html", {
-        "plan": plan.id if plan else None,
+        "bootstrap": {"plan": plan_data(plan), "subscription": subscription_data(subscription)},
     })
 
 @login_required(login_url='login')
 def subscription(request):
-    creator = get_object_or_404(UserProfile, user=request.user)
+    creator = request.profile
     if not creator.is_creator:
         return render(request, "guff/subscription.html", {
             "user":request.user 
@@ -153,20 +167,25 @@ def subscription(request):
     else:
         return redirect('dashboard')
 
+@cache_anonymous
 def tos(request):
     return render(request, "guff/tos.html")
 
+@cache_anonymous
 def privacy(request):
     return render(request, "guff/privacy.html")
 
 @login_required(login_url='login')
 def success(request):
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = request.profile
     from .models import UserSubscription
-    latest_sub = UserSubscription.objects.filter(buyer=profile, is_active=True).select_related('plan__creator__user').last()
+    latest_sub = UserSubscription.objects.filter(buyer=profile, is_active=True).select_related('plan__creator__user', 'plan__whatsapp').last()
     
     creator_username = latest_sub.plan.creator.user.username if latest_sub else request.user.username
+    # the subscription just activated, hand out its signed group invite (api/invites.py)
+    whatsapp_invite = invites.invite_path(latest_sub) if latest_sub and hasattr(latest_sub.plan, 'whatsapp') else None
     
     return render(request, "guff/success.html", {
-        "creator_username": creator_username
+        "creator_username": creator_username,
+        "whatsapp_invite": whatsapp_invite,
     })
\ No newline at end of file
@@ -46,17 +46,25 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'guff.db.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'guff.staticfiles.StaticFilesMiddleware',
+    'guff.page_cache.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'guff.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'guffgaff.urls'
 
+# route the hot read endpoints to their native async views (api/async_views.py, guff/async_views.py) |
+# opt-in, set GUFF_ASYNC_VIEWS=1 when serving guffgaff/asgi.py, sync workers keep the sync views
+ASYNC_VIEWS = os.getenv('GUFF_ASYNC_VIEWS', '0') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,9 +91,136 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep connections open between requests, SQLite connections are cheap but not free
+        'CONN_MAX_AGE': int(os.getenv('GUFF_DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# read replicas: GUFF_DB_REPLICAS is a comma separated list of SQLite files kept in sync with the
+# primary (litestream, LiteFS), or the primary's own path for a pool of read-only connections |
+# guff/db.py routes reads there and writes (plus the reads after them) to default
+for i, name in enumerate(filter(None, os.getenv('GUFF_DB_REPLICAS', '').split(','))):
+    DATABASES[f'replica{i}'] = {**DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['guff.db.PrimaryReplicaRouter']
+# how long a client keeps reading from default after it wrote
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+# applied to every SQLite connection by guff/db.py
+SQLITE_JOURNAL_MODE = os.getenv('GUFF_SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# locmem is per process, use a shared backend (redis/memcached) when running several workers
+# so invalidations reach every process
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # sessions and cached profiles take an entry per active user, the default 300 culls them
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
+# @cache_anonymous pages for visitors without a session (guff/page_cache.py) | set
+# GUFF_DEPLOY_VERSION per deploy so new templates don't serve old cached pages
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = 60 * 10
+DEPLOY_VERSION = os.getenv('GUFF_DEPLOY_VERSION', '')
+
+# POST /api/batch/ (api/batch.py): sub-requests per batch, threads for "parallel" reads
+BATCH_MAX_REQUESTS = 20
+BATCH_CONCURRENCY = 4
+
+# GET /api/search/ and /api/search/complete/ (guff/search.py)
+SEARCH_DEFAULT_RESULTS = 10
+SEARCH_MAX_RESULTS = 50
+
+# signed WhatsApp invites (api/invites.py): seconds a link works at most, plan -> group link
+# entries kept per process
+WHATSAPP_INVITE_MAX_AGE = 60 * 60 * 24
+WHATSAPP_LINKS_LOCAL_SIZE = 4096
+
+# token buckets per scope (guff/throttling.py): {dimension: (capacity, period in seconds)},
+# a dimension left out isn't limited | THROTTLE_NUM_PROXIES trusted proxies set X-Forwarded-For
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_NUM_PROXIES = int(os.getenv('GUFF_THROTTLE_NUM_PROXIES', '0'))
+THROTTLES = {
+    'login': {'ip': (20, 60), 'user': (5, 60), 'global': (100, 1)},
+    'signup': {'ip': (5, 60 * 60), 'global': (20, 1)},
+    'payment': {'ip': (30, 60), 'user': (10, 60), 'global': (50, 1)},
+}
+
+# plan reads (api/plan_cache.py): in-process LRU entries in front of CACHES['default']
+PLAN_CACHE_LOCAL_SIZE = 1024
+PLAN_CACHE_TIMEOUT = 60 * 15
+
+
+# eSewa webhook ingestion: 'inline' applies payments on the redirect request,
+# 'journal' appends them to ESEWA_JOURNAL_DIR for `manage.py replay_esewa_journal`
+ESEWA_INGEST_MODE = os.getenv('ESEWA_INGEST_MODE', 'inline')
+ESEWA_JOURNAL_DIR = BASE_DIR / 'var' / 'esewa-journal'
+ESEWA_JOURNAL_SEGMENT_BYTES = 8 * 1024 * 1024
+ESEWA_JOURNAL_FSYNC_EVERY = 32
+ESEWA_JOURNAL_FSYNC_INTERVAL = 0.05
+
+# transaction status API polled by `manage.py reconcile_payments` (api/esewa_status.py)
+ESEWA_STATUS_URL = os.getenv('ESEWA_STATUS_URL', 'https://rc.esewa.com.np/api/epay/transaction/status/')
+ESEWA_PRODUCT_CODE = os.getenv('ESEWA_PRODUCT_CODE', 'EPAYTEST')
+ESEWA_RECONCILE_CONCURRENCY = 16
+# a payment eSewa doesn't know about stays PENDING this long before the reconciler fails it
+ESEWA_NOT_FOUND_FAIL_AFTER_HOURS = 24
+
+
+# Discord role sync (api/discord_sync.py)
+DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
+DISCORD_API_BASE = os.getenv('DISCORD_API_BASE', 'https://discord.com/api/v10')
+DISCORD_SYNC_CONCURRENCY = 16
+
+
+# SESSION_BACKEND picks the session storage:
+#   db            django's database sessions, one session read per authenticated request
+#   cached_db     guff/sessions.py, cached reads and batched write-behind to the database |
+#                 needs a cache shared by all workers
+#   signed_cookies  no server-side storage, the session lives in a signed cookie
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'guff.sessions',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.getenv('SESSION_BACKEND', 'db')]
+SESSION_WRITE_BEHIND_INTERVAL = 1.0
+SESSION_WRITE_BEHIND_BATCH = 500
+
+# loads User and UserProfile in one query and caches them (guff/backends.py) | ModelBackend stays
+# listed so sessions logged in before ProfileBackend keep resolving their user
+AUTHENTICATION_BACKENDS = ['guff.backends.ProfileBackend', 'django.contrib.auth.backends.ModelBackend']
+PROFILE_CACHE_TIMEOUT = 300
+
+# PBKDF2 rounds per password (guff/passwords.py), django's default when unset | stored hashes
+# are rehashed with the new count on each user's next login. Async login/signup hash in a pool
+# of PASSWORD_POOL_WORKERS processes.
+PASSWORD_HASHERS = [
+    'guff.passwords.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('GUFF_PASSWORD_ITERATIONS', '0')) or None
+PASSWORD_POOL_WORKERS = int(os.getenv('GUFF_PASSWORD_POOL_WORKERS', '0')) or os.cpu_count()
+
+# days a payment stays in the hot table per status before `manage.py archive_payments`
+# moves it to ArchivedPayment (guff/archive.py)
+PAYMENT_RETENTION_DAYS = {
+    "PENDING": 2,
+    "FAILED": 7,
+    "SUCCESS": 365,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -122,6 +257,15 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# `manage.py collectstatic` minifies, hashes and precompresses into STATIC_ROOT,
+# guff.staticfiles.StaticFilesMiddleware serves it (guff/staticfiles.py)
+STATIC_ROOT = BASE_DIR / 'var' / 'static'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'guff.staticfiles.CompressedManifestStorage'},
+}
+# Cache-Control max-age of static files without a content hash in their name
+STATIC_MAX_AGE = 60
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field